@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Profile, ServiceListing, ProjectListing, Message, Review
+from .models import Profile, ServiceListing, ProjectListing, Message, Conversation, Review
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
@@ -21,10 +21,15 @@ class ProjectListingAdmin(admin.ModelAdmin):
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ('sender', 'receiver', 'is_read', 'created_at')
-    list_filter = ('is_read',)
+    list_display = ('sender', 'receiver', 'created_at')
     search_fields = ('sender__username', 'receiver__username', 'content')
 
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ('user_a', 'user_b', 'last_activity', 'user_a_unread', 'user_b_unread')
+    search_fields = ('user_a__username', 'user_b__username')
+    raw_id_fields = ('user_a', 'user_b', 'last_message')
+
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('project', 'reviewer', 'reviewee', 'rating', 'created_at')
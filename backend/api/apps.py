@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api'
+
+    def ready(self):
+        # Connect the signal receivers that keep derived data in sync
+        from . import authentication, cache, matching, realtime, search  # noqa: F401
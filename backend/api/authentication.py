@@ -0,0 +1,175 @@
+"""
+JWT authentication without a user query per request.
+
+Tokens carry ``username``, ``is_assembler`` and ``generation`` claims next
+to the user id.
+:class:`ClaimsJWTAuthentication` builds ``request.user`` from them as a
+``User`` whose other columns are deferred, so they are only read from the
+database if a view touches them. Whether the account is still active (and
+staff) comes from :data:`user_states`, a per-process cache that re-reads
+each user at most every ``AUTH_USER_CACHE_TTL`` seconds. A deactivated user
+is therefore locked out within that window, and at once in the process that
+saved the change. The same holds for "log out everywhere", which bumps the
+user's :class:`~api.models.TokenGeneration` so that older tokens no longer
+match it. Single tokens are revoked through :mod:`api.revocation`.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .revocation import revocations
+
+STATE_FIELDS = ('is_active', 'is_staff', 'is_superuser')
+
+
+class UserStateCache:
+    """
+    ``user id -> (is_active, is_staff, is_superuser, token generation)``, or
+    None for a missing user.
+    """
+
+    def __init__(self, ttl=30, max_size=100_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, user_id):
+        now = time.monotonic()
+        entry = self.entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        state = User.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).values_list(
+            *STATE_FIELDS, 'token_generation__generation'
+        ).first()
+        with self.lock:
+            if len(self.entries) >= self.max_size:
+                self.entries = {key: value for key, value in self.entries.items() if value[0] > now}
+                if len(self.entries) >= self.max_size:
+                    self.entries.clear()
+            self.entries[user_id] = (now + self.ttl, state)
+        return state
+
+    def invalidate(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(user_id, None)
+
+
+user_states = UserStateCache(ttl=getattr(settings, 'AUTH_USER_CACHE_TTL', 30))
+
+
+def user_claims(user_id):
+    """``(is_active, claims)`` for the user, or None if there is no such user."""
+    row = User.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).values_list(
+        'is_active', 'username', 'profile__is_assembler', 'token_generation__generation'
+    ).first()
+    if row is None:
+        return None
+    is_active, username, is_assembler, generation = row
+    return is_active, {'username': username, 'is_assembler': bool(is_assembler), 'generation': generation or 0}
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token carrying :func:`user_claims`, copied into its access tokens."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        _, claims = user_claims(user.pk)
+        for claim, value in claims.items():
+            token[claim] = value
+        return token
+
+    def verify(self):
+        super().verify()
+        if revocations.is_revoked(self.get(jwt_settings.JTI_CLAIM)):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        # Called by TokenRefreshSerializer after rotation. Revoking is one
+        # INSERT on a unique column, so of two refreshes racing with the
+        # same token only one succeeds.
+        if not revocations.revoke(self[jwt_settings.JTI_CLAIM], self['exp']):
+            raise TokenError(_('Token is blacklisted'))
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        # Claims are re-read on refresh, so they are never older than an access token
+        refresh = self.token_class(attrs['refresh'])
+        loaded = user_claims(refresh.get(jwt_settings.USER_ID_CLAIM))
+        if loaded is None or not loaded[0]:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if refresh.get('generation', 0) != loaded[1]['generation']:
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_not_valid')
+        for claim, value in loaded[1].items():
+            refresh[claim] = value
+        attrs['refresh'] = str(refresh)
+        return super().validate(attrs)
+
+
+def token_user_state(validated_token):
+    """
+    ``(user id, state)`` for an access token that is still live: not revoked,
+    of the user's current generation, and for an active user. Raises
+    :class:`AuthenticationFailed` otherwise.
+    """
+    try:
+        user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_('Token contained no recognizable user identification'))
+    if revocations.is_revoked(validated_token.get(jwt_settings.JTI_CLAIM)):
+        raise AuthenticationFailed(_('Token is blacklisted'), code='token_not_valid')
+
+    state = user_states.get(user_id)
+    if state is None:
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+    if not state[0]:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    if validated_token.get('generation', 0) != (state[-1] or 0):
+        raise AuthenticationFailed(_('Token has been revoked'), code='token_not_valid')
+    return user_id, state
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id, state = token_user_state(validated_token)
+        if 'username' not in validated_token or jwt_settings.CHECK_REVOKE_TOKEN \
+                or jwt_settings.USER_ID_FIELD != User._meta.pk.attname:
+            # Issued before the claims existed, or needs the password hash
+            return super().get_user(validated_token)
+
+        loaded = dict(zip(STATE_FIELDS, state), id=user_id, username=validated_token['username'])
+        # from_db() takes the values in column order and defers the rest
+        user = User.from_db(DEFAULT_DB_ALIAS, list(loaded), [
+            loaded[field.attname] for field in User._meta.concrete_fields if field.attname in loaded
+        ])
+        user.is_assembler = validated_token.get('is_assembler', False)
+        return user
+
+
+def forget_user(sender, instance, **kwargs):
+    user_states.invalidate(instance.pk)
+
+
+post_save.connect(forget_user, sender=User, dispatch_uid='authentication_forget_user_saved')
+post_delete.connect(forget_user, sender=User, dispatch_uid='authentication_forget_user_deleted')
@@ -0,0 +1,232 @@
+"""
+Response cache for read endpoints.
+
+Cached responses are keyed on the request path, the normalized query
+string, the auth scope (anonymous or a user id), the negotiated format and
+the current generation of every model the view depends on. A generation is
+the time of the last write to that model; ``post_save``/``post_delete``
+bump it once the writing transaction commits (earlier, a concurrent reader
+could still cache the old rows under the new generation), so stale entries
+are simply never looked up again and expire on their own. Writes that bypass
+the signals, such as ``QuerySet.update()`` in management commands, bump the
+generations themselves. The generations also provide the ``ETag`` and
+``Last-Modified`` of a response. While the response is cached, revalidation
+returns 304 without running the view; otherwise the view runs first, so that
+only a successful response is ever answered with 304.
+
+Views that only show the requesting user's own data set ``cache_per_user``
+and depend on a per-user generation instead. It is bumped for the users a
+row belongs to (see ``USER_SCOPED_MODELS``), so one user's writes leave
+everyone else's entries valid.
+
+Entries live in the ``API_RESPONSE_CACHE`` cache alias and generations in
+``API_GENERATION_CACHE``, so that culling responses never drops a
+generation. Local memory is only correct for a single process; production
+should point both at a shared store so that every worker sees the same
+generations.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import record_cache
+from .models import Message, Profile, ProjectListing, Review, ServiceListing, messages_read
+
+# Models whose writes invalidate cached responses, with fields whose
+# changes never show up in a response
+INVALIDATING_MODELS = {
+    User: {'last_login'},
+    Profile: set(),
+    ServiceListing: set(),
+    ProjectListing: set(),
+    Review: set(),
+}
+# Models whose writes invalidate per-user entries, with the fields holding
+# the ids of the users concerned
+USER_SCOPED_MODELS = {
+    User: ('id',),
+    Profile: ('user_id',),
+    ServiceListing: ('provider_id',),
+    ProjectListing: ('creator_id', 'assigned_to_id'),
+    Message: ('sender_id', 'receiver_id'),
+    # Changes the reviewee's rating
+    Review: ('reviewee_id',),
+}
+# Response headers replayed from the cache
+CACHED_HEADERS = ('Link',)
+
+
+def response_cache():
+    return caches[getattr(settings, 'API_RESPONSE_CACHE', 'default')]
+
+
+def generation_cache():
+    return caches[getattr(settings, 'API_GENERATION_CACHE', getattr(settings, 'API_RESPONSE_CACHE', 'default'))]
+
+
+def generation_key(model):
+    return f'api:generation:{model._meta.label_lower}'
+
+
+def bump_generation(model):
+    generation_cache().set(generation_key(model), time.time_ns(), timeout=None)
+
+
+def user_generation_key(user_id):
+    return f'api:generation:user:{user_id}'
+
+
+def bump_user_generations(user_ids):
+    now = time.time_ns()
+    generation_cache().set_many(
+        {user_generation_key(user_id): now for user_id in set(user_ids) if user_id is not None}, timeout=None
+    )
+
+
+def generations(keys):
+    cache = generation_cache()
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def cache_key(request, models, per_user=False):
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values if value != ''
+    )
+    scope = f'user:{request.user.pk}' if request.user.is_authenticated else 'anon'
+    fmt = request.accepted_renderer.format if getattr(request, 'accepted_renderer', None) else ''
+    keys = [generation_key(model) for model in models]
+    if per_user:
+        keys.append(user_generation_key(request.user.pk))
+    versions = generations(keys)
+    material = '|'.join([request.path, urlencode(params), scope, fmt] + [str(version) for version in versions])
+    return hashlib.sha1(material.encode()).hexdigest(), max(versions)
+
+
+def not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def set_validators(request, response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ['Authorization'])
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def cached_response(view, handler, request, *args, **kwargs):
+    """
+    Serve ``handler`` through the response cache, keyed on the view's
+    ``cache_dependencies``.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return handler(request, *args, **kwargs)
+
+    digest, generation = cache_key(request, view.cache_dependencies, getattr(view, 'cache_per_user', False))
+    etag = f'W/"{digest}"'
+    # Generations are in nanoseconds, HTTP dates in whole seconds
+    last_modified = generation // 1_000_000_000
+
+    cache = response_cache()
+    key = f'api:response:{digest}'
+    entry = cache.get(key)
+    response = None
+    if entry is None:
+        record_cache('miss')
+        response = handler(request, *args, **kwargs)
+        # Errors are neither cached nor answered with 304
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+        cache.set(key, {'data': response.data, 'headers': headers})
+
+    if not_modified(request, etag, last_modified):
+        record_cache('not_modified')
+        return set_validators(request, Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+    if response is None:
+        response = Response(entry['data'], headers=entry['headers'])
+        response['X-Cache'] = 'hit'
+        record_cache('hit')
+    else:
+        response['X-Cache'] = 'miss'
+    return set_validators(request, response, etag, last_modified)
+
+
+def cache_response(method):
+    """Cache a custom ``@action`` of a :class:`CachedResponseMixin` view."""
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        return cached_response(self, lambda *a, **kw: method(self, *a, **kw), request, *args, **kwargs)
+    return wrapper
+
+
+class CachedResponseMixin:
+    """
+    Cache ``list`` and ``retrieve``. ``cache_dependencies`` lists every
+    model whose data appears in the responses.
+    """
+    cache_dependencies = ()
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(self, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(self, super().retrieve, request, *args, **kwargs)
+
+
+def invalidate(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= INVALIDATING_MODELS[sender]:
+        return
+    transaction.on_commit(lambda: bump_generation(sender))
+
+
+def invalidate_users(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= INVALIDATING_MODELS.get(sender, set()):
+        return
+    user_ids = [getattr(instance, field) for field in USER_SCOPED_MODELS[sender]]
+    if sender is ProjectListing:
+        # The previous assignee loses the project
+        user_ids.append(instance.saved_value('assigned_to'))
+    transaction.on_commit(lambda: bump_user_generations(user_ids))
+
+
+def invalidate_readers(sender, reader_id, other_id, **kwargs):
+    # The read state shows on both sides of the conversation
+    transaction.on_commit(lambda: bump_user_generations([reader_id, other_id]))
+
+
+for cached_model in INVALIDATING_MODELS:
+    post_save.connect(invalidate, sender=cached_model, dispatch_uid=f'cache_invalidate_saved_{cached_model.__name__}')
+    post_delete.connect(invalidate, sender=cached_model, dispatch_uid=f'cache_invalidate_deleted_{cached_model.__name__}')
+
+for scoped_model in USER_SCOPED_MODELS:
+    name = scoped_model.__name__
+    post_save.connect(invalidate_users, sender=scoped_model, dispatch_uid=f'cache_invalidate_users_saved_{name}')
+    post_delete.connect(invalidate_users, sender=scoped_model, dispatch_uid=f'cache_invalidate_users_deleted_{name}')
+messages_read.connect(invalidate_readers, dispatch_uid='cache_invalidate_readers')
@@ -0,0 +1,143 @@
+"""
+Read-only serialization straight from ``values()`` rows.
+
+:func:`compile_serializer` turns a ``ModelSerializer`` class into a
+:class:`CompiledSerializer`: the ORM lookup for each field, and an encoder
+that reproduces the field's ``to_representation`` for the values the
+database returns. Lists are then built from ``values()`` dicts without model
+instances or DRF field machinery. Serializers with fields that cannot be
+reproduced exactly (method fields, nested serializers, properties, custom
+field classes) are not compiled, and their views keep the regular path.
+"""
+import datetime
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework.relations import PrimaryKeyRelatedField
+
+# Serializer fields whose representation of a value read from one of the
+# model fields is the value itself
+PASSTHROUGH_FIELDS = {
+    serializers.CharField: (models.CharField, models.TextField),
+    serializers.EmailField: (models.CharField,),
+    serializers.IntegerField: (models.IntegerField,),
+    serializers.FloatField: (models.FloatField,),
+    serializers.BooleanField: (models.BooleanField,),
+    PrimaryKeyRelatedField: (models.ForeignKey, models.OneToOneField),
+}
+
+
+def datetime_encoder(field):
+    if hasattr(field, 'timezone') or getattr(field, 'format', api_settings.DATETIME_FORMAT).lower() != 'iso-8601':
+        return lambda: field.to_representation
+
+    def bind():
+        # Resolved per call: the current timezone can differ per request
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+        def encode(value):
+            if tz is not None:
+                value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+            elif timezone.is_aware(value):
+                value = timezone.make_naive(value, datetime.timezone.utc)
+            value = value.isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return encode
+    return bind
+
+
+def decimal_encoder(field):
+    exponent = -field.decimal_places if field.decimal_places is not None else None
+    plain = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) and not field.localize
+
+    def encode(value):
+        # Database values normally come back at the column's scale already
+        if plain and value.as_tuple().exponent == exponent:
+            return '{:f}'.format(value)
+        return field.to_representation(value)
+    return lambda: encode
+
+
+def field_encoder(field, model_field):
+    """
+    Return a factory for the field's encoder, ``None`` when values pass
+    through unchanged, or raise ``TypeError`` if the field is not supported.
+    """
+    kind = type(field)
+    if kind in PASSTHROUGH_FIELDS:
+        return None if isinstance(model_field, PASSTHROUGH_FIELDS[kind]) else lambda: field.to_representation
+    if kind is serializers.ChoiceField:
+        if all(isinstance(choice, str) for choice in field.choices):
+            return None
+        return lambda: field.to_representation
+    if kind is serializers.DecimalField:
+        return decimal_encoder(field)
+    if kind is serializers.DateTimeField:
+        return datetime_encoder(field)
+    raise TypeError(f'{kind.__name__} is not supported')
+
+
+def field_lookup(model, field):
+    """The ``values()`` lookup for ``field``'s source, and the model field it reads."""
+    path = field.source_attrs
+    for index, attr in enumerate(path):
+        model_field = model._meta.get_field(attr)
+        last = index == len(path) - 1
+        if model_field.many_to_many or model_field.one_to_many:
+            raise TypeError(f'{attr} is a to-many relation')
+        if last:
+            if model_field.is_relation and not isinstance(field, PrimaryKeyRelatedField):
+                raise TypeError(f'{attr} is read as an object')
+            break
+        if not model_field.is_relation:
+            raise TypeError(f'{attr} has no attributes')
+        if model_field.concrete and model_field.null and not field.allow_null:
+            # DRF skips the field when the relation is empty; values() gives None
+            raise TypeError(f'{attr} can be empty')
+        model = model_field.related_model
+    return '__'.join(path), model_field
+
+
+class CompiledSerializer:
+    def __init__(self, serializer_class):
+        model = serializer_class.Meta.model
+        self.columns = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)) \
+                    or field.source == '*':
+                raise TypeError(f'{name} cannot be compiled')
+            lookup, model_field = field_lookup(model, field)
+            self.columns.append((name, lookup, field_encoder(field, model_field)))
+        self.lookups = list(dict.fromkeys(lookup for _, lookup, _ in self.columns))
+
+    def values(self, queryset):
+        # The pagination cursor reads the ordering field, which may be an
+        # annotation such as search_rank or distance_km
+        ordering = [term.lstrip('-') for term in queryset.query.order_by if isinstance(term, str) and term != '?']
+        return queryset.values(*dict.fromkeys([*self.lookups, *queryset.query.annotations, *ordering]))
+
+    def serialize(self, rows):
+        columns = [(name, lookup, factory() if factory else None) for name, lookup, factory in self.columns]
+        return [
+            {
+                name: row[lookup] if encode is None or row[lookup] is None else encode(row[lookup])
+                for name, lookup, encode in columns
+            }
+            for row in rows
+        ]
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    """The :class:`CompiledSerializer` for ``serializer_class``, or ``None``."""
+    try:
+        return CompiledSerializer(serializer_class)
+    except (TypeError, FieldDoesNotExist, AttributeError):
+        return None
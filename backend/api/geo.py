@@ -0,0 +1,203 @@
+"""
+Offline geocoding and proximity search.
+
+Free-text locations are resolved against the bundled gazetteer at write
+time and stored as coordinates plus a geohash. Radius queries first narrow
+the candidates to the few geohash cells covering the search area (an
+indexed prefix scan), then compute exact great-circle distances.
+"""
+import csv
+import math
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.db.models import F, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'gazetteer.csv'
+EARTH_RADIUS_KM = 6371.0
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Trailing parts of a location string that say nothing about the place
+_IGNORED_PARTS = {'uk', 'gb', 'united kingdom', 'great britain', 'england', 'scotland', 'wales',
+                  'northern ireland', 'ireland'}
+_CLEAN_RE = re.compile(r'[^a-z0-9\s-]')
+
+
+def normalize(location):
+    return ' '.join(_CLEAN_RE.sub(' ', location.lower()).split())
+
+
+@lru_cache(maxsize=1)
+def gazetteer():
+    places = {}
+    with open(GAZETTEER_PATH, newline='', encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            point = (float(row['latitude']), float(row['longitude']))
+            for name in [row['name']] + [alias for alias in row['aliases'].split(';') if alias]:
+                places[normalize(name)] = point
+    return places
+
+
+@lru_cache(maxsize=4096)
+def geocode(location):
+    """Return ``(latitude, longitude)`` for a free-text location, or None."""
+    if not location:
+        return None
+    places = gazetteer()
+    parts = [normalize(part) for part in location.split(',')]
+    parts = [part for part in parts if part and part not in _IGNORED_PARTS]
+    candidates = [' '.join(parts)] + parts
+    for candidate in candidates:
+        if candidate in places:
+            return places[candidate]
+    # "Central Leeds", "Leeds LS1" and similar: try every run of words
+    for part in parts:
+        words = part.split()
+        for size in range(len(words), 0, -1):
+            for start in range(len(words) - size + 1):
+                candidate = ' '.join(words[start:start + size])
+                if candidate in places:
+                    return places[candidate]
+    return None
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            rng[0] = middle
+        else:
+            rng[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """Height and width in degrees of a geohash cell."""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    lng_delta = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+    return latitude - lat_delta, latitude + lat_delta, longitude - lng_delta, longitude + lng_delta
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the search circle. The
+    precision is the finest at which a cell is at least as large as the
+    bounding box, so only a handful of cells are needed.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(candidate)
+        if height >= max_lat - min_lat and width >= max_lng - min_lng:
+            precision = candidate
+            break
+    height, width = geohash_cell_size(precision)
+
+    cells = set()
+    lat = max(min_lat, -90.0)
+    while True:
+        lng = min_lng
+        while True:
+            cells.add(geohash_encode(min(lat, 90.0), ((lng + 180.0) % 360.0) - 180.0, precision))
+            if lng >= max_lng:
+                break
+            lng = min(lng + width, max_lng)
+        if lat >= min(max_lat, 90.0):
+            break
+        lat = min(lat + height, max_lat, 90.0)
+    return sorted(cells)
+
+
+def distance_expression(latitude, longitude):
+    """Great-circle distance in km from the given point, as an ORM expression."""
+    d_lat = Radians(F('latitude') - Value(latitude)) / 2
+    d_lng = Radians(F('longitude') - Value(longitude)) / 2
+    a = Power(Sin(d_lat), 2) + (
+        Value(math.cos(math.radians(latitude))) * Cos(Radians(F('latitude'))) * Power(Sin(d_lng), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
+
+
+def nearby(queryset, latitude, longitude, radius_km):
+    """
+    Filter ``queryset`` to rows within ``radius_km`` of the point and
+    annotate them with ``distance_km``.
+    """
+    cells = Q()
+    for cell in covering_cells(latitude, longitude, radius_km):
+        cells |= Q(geohash__startswith=cell)
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    return queryset.filter(
+        cells,
+        latitude__range=(min_lat, max_lat),
+        longitude__range=(min_lng, max_lng),
+    ).annotate(
+        distance_km=distance_expression(latitude, longitude)
+    ).filter(distance_km__lte=radius_km)
+
+
+class ProximityFilter(BaseFilterBackend):
+    """
+    ``near=<lat>,<lng>&radius_km=<km>`` filtering. Results are ordered by
+    distance unless the client asks for an explicit ``ordering``.
+    """
+    near_param = 'near'
+    radius_param = 'radius_km'
+    default_radius_km = 15.0
+    max_radius_km = 200.0
+    ordering_param = api_settings.ORDERING_PARAM
+
+    def parse_point(self, value):
+        try:
+            latitude, longitude = (float(part) for part in value.split(','))
+        except ValueError:
+            raise ValidationError({self.near_param: 'Expected "<latitude>,<longitude>".'})
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValidationError({self.near_param: 'Coordinates are out of range.'})
+        return latitude, longitude
+
+    def parse_radius(self, value):
+        if value is None:
+            return self.default_radius_km
+        try:
+            radius = float(value)
+        except ValueError:
+            raise ValidationError({self.radius_param: 'A number is required.'})
+        if not 0 < radius <= self.max_radius_km:
+            raise ValidationError({self.radius_param: f'Must be between 0 and {self.max_radius_km:g}.'})
+        return radius
+
+    def filter_queryset(self, request, queryset, view):
+        near = request.query_params.get(self.near_param)
+        if not near:
+            return queryset
+        latitude, longitude = self.parse_point(near)
+        radius = self.parse_radius(request.query_params.get(self.radius_param))
+        queryset = nearby(queryset, latitude, longitude, radius)
+        if not request.query_params.get(self.ordering_param):
+            queryset = queryset.order_by('distance_km')
+        return queryset
@@ -0,0 +1,357 @@
+import csv
+import json
+import os
+from collections import defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.validators import UniqueValidator
+
+from api.cache import bump_generation
+from api.models import ImportCheckpoint, Profile, ProjectListing, Review, ServiceListing
+from api.search import SEARCH_FIELDS, index_instance
+from api.serializers import (
+    ProfileSerializer, ProjectListingSerializer, ReviewSerializer, ServiceListingSerializer, UserSerializer
+)
+
+
+class Batch:
+    """Rows of one chunk, with the users they reference looked up in one query."""
+
+    def __init__(self, rows, user_columns):
+        self.rows = rows
+        keys = {row[column] for _, row in rows for column in user_columns if row.get(column)}
+        ids = {int(key) for key in keys if key.isdigit()}
+        names = keys - {str(user_id) for user_id in ids}
+        self.users = {}
+        for user_id, username in User.objects.filter(Q(id__in=ids) | Q(username__in=names)).values_list('id', 'username'):
+            self.users[str(user_id)] = user_id
+            self.users[username] = user_id
+
+    def user_id(self, row, column, errors, required=True):
+        value = row.pop(column, None)
+        if not value:
+            if required:
+                errors[column] = ['This field is required.']
+            return None
+        if value not in self.users:
+            errors[column] = [f'Unknown user "{value}".']
+        return self.users.get(value)
+
+
+def validate(serializer_class, data, skip_fields=()):
+    """
+    Run the serializer's field rules without per-row queries: relations and
+    uniqueness are checked for the whole batch by the importers.
+    """
+    serializer = serializer_class(data=data)
+    for name in skip_fields:
+        serializer.fields.pop(name, None)
+    for field in serializer.fields.values():
+        field.validators = [validator for validator in field.validators if not isinstance(validator, UniqueValidator)]
+    serializer.is_valid()
+    return serializer.validated_data, dict(serializer.errors)
+
+
+class UserImporter:
+    model = User
+    user_columns = ()
+
+    def __init__(self, batch):
+        usernames = [row.get('username') for _, row in batch.rows if row.get('username')]
+        self.taken = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        self.profiles = []
+
+    def build(self, batch, row):
+        user_data, errors = validate(UserSerializer, row)
+        profile_data, profile_errors = validate(ProfileSerializer, row)
+        errors.update(profile_errors)
+        username = user_data.get('username')
+        if username in self.taken:
+            errors['username'] = ['A user with that username already exists.']
+        if errors:
+            return None, errors
+        self.taken.add(username)
+        password = row.get('password')
+        # Rows without a password get an unusable one and must reset it
+        user = User(password=make_password(password or None), **user_data)
+        profile_data.pop('user', None)
+        self.profiles.append((user, Profile(**profile_data)))
+        return user, None
+
+    def created(self, objects):
+        profiles = []
+        for user, profile in self.profiles:
+            profile.user_id = user.pk
+            profile.update_coordinates()
+            profiles.append(profile)
+        Profile.objects.bulk_create(profiles)
+
+
+class ServiceImporter:
+    model = ServiceListing
+    user_columns = ('provider',)
+
+    def __init__(self, batch):
+        self.providers = set()
+
+    def build(self, batch, row):
+        errors = {}
+        provider_id = batch.user_id(row, 'provider', errors)
+        data, field_errors = validate(ServiceListingSerializer, row)
+        errors.update(field_errors)
+        if errors:
+            return None, errors
+        self.providers.add(provider_id)
+        return ServiceListing(provider_id=provider_id, **data), None
+
+    def created(self, objects):
+        ensure_profiles(self.providers, is_assembler=True)
+
+
+class ProjectImporter:
+    model = ProjectListing
+    user_columns = ('creator', 'assigned_to')
+
+    def __init__(self, batch):
+        self.creators = set()
+
+    def build(self, batch, row):
+        errors = {}
+        creator_id = batch.user_id(row, 'creator', errors)
+        assigned_to_id = batch.user_id(row, 'assigned_to', errors, required=False)
+        data, field_errors = validate(ProjectListingSerializer, row, skip_fields=['assigned_to'])
+        errors.update(field_errors)
+        if errors:
+            return None, errors
+        if creator_id == assigned_to_id:
+            return None, {'assigned_to': ['The creator cannot be assigned to their own project.']}
+        self.creators.add(creator_id)
+        project = ProjectListing(creator_id=creator_id, assigned_to_id=assigned_to_id, **data)
+        project.update_coordinates()
+        return project, None
+
+    def created(self, objects):
+        ensure_profiles(self.creators)
+
+
+class ReviewImporter:
+    model = Review
+    user_columns = ('reviewer', 'reviewee')
+
+    def __init__(self, batch):
+        project_ids = [row['project'] for _, row in batch.rows if str(row.get('project', '')).isdigit()]
+        self.projects = {
+            project_id: (status, creator_id, assigned_to_id)
+            for project_id, status, creator_id, assigned_to_id in ProjectListing.objects.filter(
+                id__in=project_ids
+            ).values_list('id', 'status', 'creator_id', 'assigned_to_id')
+        }
+        self.reviewed = set(Review.objects.filter(project_id__in=project_ids).values_list('project_id', 'reviewer_id'))
+        self.ratings = defaultdict(lambda: [0, 0])
+
+    def build(self, batch, row):
+        # The same rules ReviewViewSet.create applies to a single review
+        errors = {}
+        reviewer_id = batch.user_id(row, 'reviewer', errors)
+        reviewee_id = batch.user_id(row, 'reviewee', errors)
+        project_value = str(row.pop('project', ''))
+        data, field_errors = validate(ReviewSerializer, row, skip_fields=['project', 'reviewee'])
+        errors.update(field_errors)
+        project = self.projects.get(int(project_value)) if project_value.isdigit() else None
+        if project is None:
+            errors['project'] = [f'Unknown project "{project_value}".']
+        if errors:
+            return None, errors
+
+        status, creator_id, assigned_to_id = project
+        if status != 'completed':
+            return None, {'project': ['You can only review completed projects.']}
+        participants = {creator_id, assigned_to_id}
+        if reviewer_id not in participants or reviewee_id not in participants or reviewer_id == reviewee_id:
+            return None, {'reviewee': ['Reviewer and reviewee must be the two people involved in the project.']}
+        if (int(project_value), reviewer_id) in self.reviewed:
+            return None, {'project': ['This reviewer has already reviewed this project.']}
+        self.reviewed.add((int(project_value), reviewer_id))
+        self.ratings[reviewee_id][0] += data['rating']
+        self.ratings[reviewee_id][1] += 1
+        return Review(project_id=int(project_value), reviewer_id=reviewer_id, reviewee_id=reviewee_id, **data), None
+
+    def created(self, objects):
+        # bulk_create skips Review.save(), so apply the rating totals here
+        ensure_profiles(self.ratings)
+        for user_id, (rating_sum, rating_count) in self.ratings.items():
+            Profile.apply_rating(user_id, rating_sum, rating_count)
+
+
+IMPORTERS = {
+    'users': UserImporter,
+    'services': ServiceImporter,
+    'projects': ProjectImporter,
+    'reviews': ReviewImporter,
+}
+
+
+def ensure_profiles(user_ids, is_assembler=False):
+    existing = set(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    Profile.objects.bulk_create([
+        Profile(user_id=user_id, is_assembler=is_assembler) for user_id in set(user_ids) - existing
+    ])
+    if is_assembler:
+        Profile.objects.filter(user_id__in=existing, is_assembler=False).update(is_assembler=True)
+
+
+def read_lines(handle):
+    """Yield ``(text, offset_after)`` for every line of a binary file."""
+    while True:
+        line = handle.readline()
+        if not line:
+            return
+        yield line.decode('utf-8-sig'), handle.tell()
+
+
+def read_records(handle, file_format, offset, line_number):
+    """
+    Yield ``(line_number, row, offset_after)`` from ``offset`` on. Offsets are
+    byte positions, so a run can resume exactly where a previous one stopped.
+    """
+    if file_format == 'jsonl':
+        handle.seek(offset)
+        for text, end in read_lines(handle):
+            line_number += 1
+            if text.strip():
+                try:
+                    row = json.loads(text)
+                except ValueError as error:
+                    row = error
+                yield line_number, row, end
+        return
+
+    handle.seek(0)
+    header = next(csv.reader([handle.readline().decode('utf-8-sig')]), None)
+    if header is None:
+        return
+    if offset == 0:
+        offset, line_number = handle.tell(), 1
+    handle.seek(offset)
+    position = {'offset': offset}
+
+    def lines():
+        # csv.reader pulls more than one line for quoted newlines
+        nonlocal line_number
+        for text, end in read_lines(handle):
+            line_number += 1
+            position['offset'] = end
+            yield text
+
+    for values in csv.reader(lines()):
+        if values:
+            yield line_number, dict(zip(header, values)), position['offset']
+
+
+def clean(row):
+    # Empty cells fall back to the model defaults
+    if not isinstance(row, dict):
+        return None
+    return {key.strip(): str(value).strip() for key, value in row.items()
+            if key and value is not None and str(value).strip() != ''}
+
+
+class Command(BaseCommand):
+    help = 'Stream users, services, projects or reviews from CSV/JSONL into the database in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help='CSV file with a header row, or JSON Lines (.jsonl).')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'jsonl'],
+                            help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--rejects', help='Where rejected rows are written (default: <path>.rejects.jsonl).')
+        parser.add_argument('--checkpoint', help='Name of the saved progress used to resume (default: the absolute path).')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist.')
+        file_format = options['file_format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        checkpoint = options['checkpoint'] or os.path.abspath(path)
+        rejects_path = options['rejects'] or f'{path}.rejects.jsonl'
+        importer_class = IMPORTERS[options['kind']]
+
+        state = {'kind': options['kind'], 'offset': 0, 'line': 0, 'created': 0, 'rejected': 0}
+        saved = None if options['restart'] else ImportCheckpoint.objects.filter(name=checkpoint).values(*state).first()
+        if saved is not None:
+            if saved['kind'] != options['kind'] or saved['offset'] > os.path.getsize(path):
+                raise CommandError(f'Checkpoint {checkpoint} belongs to another import; pass --restart to ignore it.')
+            state.update(saved)
+            self.stdout.write(f'Resuming after line {state["line"]}.')
+        elif options['restart']:
+            ImportCheckpoint.objects.filter(name=checkpoint).delete()
+            if os.path.exists(rejects_path):
+                os.remove(rejects_path)
+
+        with open(path, 'rb') as source, open(rejects_path, 'a', encoding='utf-8') as rejects:
+            batch = []
+            for line_number, row, end in read_records(source, file_format, state['offset'], state['line']):
+                batch.append((line_number, row))
+                if len(batch) == options['batch_size']:
+                    self.import_batch(importer_class, batch, rejects, state, end, line_number, checkpoint)
+                    batch = []
+            if batch:
+                self.import_batch(importer_class, batch, rejects, state, end, line_number, checkpoint)
+
+        ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        bump_generation(importer_class.model)
+        if importer_class.model is not User:
+            bump_generation(Profile)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {state["created"]} {options["kind"]}, rejected {state["rejected"]} rows.'
+        ))
+        if state['rejected']:
+            self.stdout.write(f'Rejected rows are listed in {rejects_path}.')
+
+    def import_batch(self, importer_class, rows, rejects, state, offset, line_number, checkpoint):
+        rows = [(number, clean(row), row) for number, row in rows]
+        rejected = [(number, {'non_field_errors': ['Malformed row.']}, raw) for number, row, raw in rows if row is None]
+        valid_rows = [(number, row) for number, row, _ in rows if row is not None]
+        raw_rows = {number: raw for number, _, raw in rows}
+
+        batch = Batch(valid_rows, importer_class.user_columns)
+        importer = importer_class(batch)
+        objects = []
+        for number, row in valid_rows:
+            instance, errors = importer.build(batch, dict(row))
+            if errors:
+                rejected.append((number, errors, raw_rows[number]))
+            else:
+                objects.append(instance)
+
+        # Rejects go out first: a crash before the commit below repeats them
+        # on resume, which is harmless, while the rows are never imported twice
+        for number, errors, raw in sorted(rejected, key=lambda reject: reject[0]):
+            rejects.write(json.dumps({
+                'line': number,
+                'errors': errors,
+                'row': raw if isinstance(raw, dict) else str(raw),
+            }, default=str) + '\n')
+        rejects.flush()
+
+        state.update(
+            offset=offset,
+            line=line_number,
+            created=state['created'] + len(objects),
+            rejected=state['rejected'] + len(rejected),
+        )
+        with transaction.atomic():
+            importer.model.objects.bulk_create(objects)
+            importer.created(objects)
+            if importer.model in SEARCH_FIELDS:
+                for instance in objects:
+                    index_instance(importer.model, instance)
+            # The checkpoint commits with the batch, so both or neither are kept
+            ImportCheckpoint.record(checkpoint, state)
+        self.stdout.write(f'Line {line_number}: {state["created"]} imported, {state["rejected"]} rejected.')
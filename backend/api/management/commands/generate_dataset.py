@@ -0,0 +1,314 @@
+import math
+import random
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.cache import INVALIDATING_MODELS, bump_generation
+from api.geo import geocode, geohash_encode, gazetteer
+from api.models import Message, Profile, ProjectListing, Review, ServiceListing
+
+FURNITURE_TYPES = [
+    ('Wardrobe', 18), ('Bed', 16), ('Desk', 14), ('Chest of Drawers', 12), ('Bookshelf', 10),
+    ('Dining Set', 8), ('Sofa', 6), ('Office Furniture', 6), ('TV Unit', 5), ('Kitchen Units', 3),
+    ('Garden Furniture', 2),
+]
+PROJECT_STATUSES = [('open', 40), ('in_progress', 20), ('completed', 32), ('cancelled', 8)]
+RATINGS = [(5, 46), (4, 30), (3, 11), (2, 6), (1, 7)]
+SERVICE_TITLES = [
+    'Flat-pack furniture assembly', 'IKEA assembly specialist', 'Bedroom furniture fitting',
+    'Office furniture installation', 'Same-day furniture assembly', 'Kitchen and wardrobe fitting',
+]
+PROJECT_DESCRIPTIONS = [
+    'Needs assembling as soon as possible, all parts and instructions included.',
+    'Large flat-pack item, two people may be needed.',
+    'Please bring your own tools. Parking is available outside.',
+    'Bought online, still in boxes. Flexible on timing.',
+    'Several pieces to build in the same room.',
+]
+MESSAGE_LINES = [
+    'Hi, is this still available?', 'Yes, I can do it this week.', 'What time suits you?',
+    'Could you send a photo of the boxes?', 'Great, see you then.', 'Running ten minutes late.',
+    'All done, thanks!', 'How long do you think it will take?', 'Do I need to provide tools?',
+]
+
+
+class Distribution:
+    """Weighted choice with the cumulative weights computed once."""
+
+    def __init__(self, values, weights):
+        self.values = list(values)
+        self.cum_weights = list(accumulate(weights))
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        values, weights = zip(*pairs)
+        return cls(values, weights)
+
+    def pick(self, rng, k=None):
+        picked = rng.choices(self.values, cum_weights=self.cum_weights, k=k or 1)
+        return picked if k else picked[0]
+
+
+FURNITURE = Distribution.from_pairs(FURNITURE_TYPES)
+STATUSES = Distribution.from_pairs(PROJECT_STATUSES)
+RATING = Distribution.from_pairs(RATINGS)
+SERVICES_PER_ASSEMBLER = Distribution.from_pairs([(1, 60), (2, 30), (3, 10)])
+
+
+def chunks(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic dataset with batched bulk_create.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of users to create.')
+        parser.add_argument('--assembler-ratio', type=float, default=0.3)
+        parser.add_argument('--projects-per-customer', type=float, default=1.5, help='Mean projects per customer.')
+        parser.add_argument('--threads-per-user', type=float, default=2.0, help='Mean message threads per customer.')
+        parser.add_argument('--messages-per-thread', type=float, default=8.0, help='Mean messages per thread.')
+        parser.add_argument('--days', type=float, default=365.0,
+                            help='Rows are dated across this many days before now.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--prefix', default='gen_', help='Username prefix of generated users.')
+        parser.add_argument('--password', default='password123', help='Password of every generated user.')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--clear', action='store_true', help='Delete users previously generated with the prefix.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('--users must be at least 2.')
+        if not 0 < options['assembler_ratio'] < 1:
+            raise CommandError('--assembler-ratio must be between 0 and 1.')
+
+        if options['days'] <= 0:
+            raise CommandError('--days must be positive.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options['days'])
+        # When each user joined; nothing of theirs is dated before it
+        self.joined = {}
+        prefix = options['prefix']
+
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=prefix).delete()
+            self.stdout.write(f'Deleted {deleted} rows from a previous run.')
+        elif User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Users with prefix "{prefix}" already exist; pass --clear or another --prefix.')
+
+        places = self.places()
+        assemblers, customers = self.create_users(options, places)
+        self.stdout.write(f'Created {len(assemblers)} assemblers and {len(customers)} customers.')
+
+        services = self.create_services(assemblers)
+        self.stdout.write(f'Created {services} services.')
+
+        # Popular assemblers get most of the work
+        popularity = Distribution(assemblers, [1.0 / (rank + 1) ** 0.8 for rank in range(len(assemblers))])
+        projects, completed = self.create_projects(customers, popularity, places, options)
+        self.stdout.write(f'Created {projects} projects.')
+
+        reviews = self.create_reviews(completed)
+        self.stdout.write(f'Created {reviews} reviews.')
+
+        messages = self.create_messages(customers, popularity, options)
+        self.stdout.write(f'Created {messages} messages.')
+
+        # bulk_create skips save() and signals, so rebuild the derived data
+        call_command('reconcile_ratings', stdout=self.stdout)
+        call_command('rebuild_conversations', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        for model in INVALIDATING_MODELS:
+            bump_generation(model)
+        self.stdout.write(self.style.SUCCESS('Dataset generated.'))
+
+    def places(self):
+        # Zipf-like weights: a few busy cities and a long tail of towns
+        names = sorted({name.title() for name in gazetteer() if len(name) > 3})
+        self.rng.shuffle(names)
+        return Distribution([f'{name}, UK' for name in names], [1.0 / (rank + 1) for rank in range(len(names))])
+
+    def located(self, location):
+        point = geocode(location)
+        if point is None:
+            return {'latitude': None, 'longitude': None, 'geohash': None}
+        return {'latitude': point[0], 'longitude': point[1], 'geohash': geohash_encode(*point)}
+
+    def between(self, earliest, latest=None):
+        latest = latest or self.now
+        if earliest >= latest:
+            return latest
+        return earliest + (latest - earliest) * self.rng.random()
+
+    def bulk_create(self, model, objects, dated=()):
+        # auto_now(_add) fields are overwritten with the current time on
+        # insert, so the generated ``dated`` values are written back after
+        total = 0
+        for batch in chunks(objects, self.batch_size):
+            dates = [[getattr(instance, field) for field in dated] for instance in batch]
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+                if dated:
+                    for instance, values in zip(batch, dates):
+                        for field, value in zip(dated, values):
+                            setattr(instance, field, value)
+                    model.objects.bulk_update(batch, dated, batch_size=self.batch_size)
+            total += len(batch)
+        return total
+
+    def create_users(self, options, places):
+        rng = self.rng
+        prefix = options['prefix']
+        # Hashing is deliberately slow, so every user shares one hash
+        password = make_password(options['password'])
+        count = options['users']
+
+        # Sign-ups in order, spread over the window
+        joined = sorted(self.between(self.start) for _ in range(count))
+
+        def users():
+            for number in range(count):
+                yield User(
+                    username=f'{prefix}{number:07d}',
+                    email=f'{prefix}{number:07d}@example.com',
+                    password=password,
+                    first_name=f'User{number}',
+                    date_joined=joined[number],
+                )
+        self.bulk_create(User, users())
+        self.joined = dict(User.objects.filter(username__startswith=prefix).values_list('id', 'date_joined'))
+        user_ids = sorted(self.joined)
+
+        assemblers, customers = [], []
+        for user_id in user_ids:
+            (assemblers if rng.random() < options['assembler_ratio'] else customers).append(user_id)
+        if not assemblers:
+            assemblers.append(customers.pop())
+        if not customers:
+            customers.append(assemblers.pop())
+        is_assembler = set(assemblers)
+
+        def profiles():
+            for user_id in user_ids:
+                location = places.pick(rng)
+                yield Profile(
+                    user_id=user_id,
+                    location=location,
+                    bio='Experienced furniture assembler.' if user_id in is_assembler else '',
+                    is_assembler=user_id in is_assembler,
+                    date_joined=self.joined[user_id],
+                    **self.located(location),
+                )
+        self.bulk_create(Profile, profiles(), dated=['date_joined'])
+        return assemblers, customers
+
+    def create_services(self, assemblers):
+        rng = self.rng
+
+        def services():
+            for user_id in assemblers:
+                for _ in range(SERVICES_PER_ASSEMBLER.pick(rng)):
+                    # Rates cluster around £25/hour with a long upper tail
+                    rate = min(max(rng.lognormvariate(math.log(25), 0.35), 12), 120)
+                    created_at = self.between(self.joined[user_id])
+                    yield ServiceListing(
+                        created_at=created_at,
+                        updated_at=created_at,
+                        provider_id=user_id,
+                        title=rng.choice(SERVICE_TITLES),
+                        description='Assembly of ' + ', '.join(rng.sample([name for name, _ in FURNITURE_TYPES], 3)),
+                        hourly_rate=Decimal(f'{rate:.2f}'),
+                        experience_years=min(int(rng.expovariate(1 / 4)), 30),
+                        is_available=rng.random() < 0.8,
+                    )
+        return self.bulk_create(ServiceListing, services(), dated=['created_at', 'updated_at'])
+
+    def create_projects(self, customers, popularity, places, options):
+        rng = self.rng
+        mean = options['projects_per_customer']
+
+        def projects():
+            for user_id in customers:
+                # Geometric number of projects per customer
+                count = int(math.log(1 - rng.random()) / math.log(mean / (mean + 1))) if mean > 0 else 0
+                for _ in range(count):
+                    status = STATUSES.pick(rng)
+                    furniture_type = FURNITURE.pick(rng)
+                    location = places.pick(rng)
+                    assigned_to = None
+                    if status in ('in_progress', 'completed'):
+                        assigned_to = popularity.pick(rng)
+                    budget = min(max(rng.lognormvariate(math.log(70), 0.5), 20), 1000)
+                    created_at = self.between(self.joined[user_id])
+                    yield ProjectListing(
+                        created_at=created_at,
+                        updated_at=created_at,
+                        creator_id=user_id,
+                        title=f'{furniture_type} assembly',
+                        description=rng.choice(PROJECT_DESCRIPTIONS),
+                        furniture_type=furniture_type,
+                        location=location,
+                        budget=Decimal(f'{budget:.2f}'),
+                        status=status,
+                        assigned_to_id=assigned_to,
+                        **self.located(location),
+                    )
+        total = self.bulk_create(ProjectListing, projects(), dated=['created_at', 'updated_at'])
+        completed = list(ProjectListing.objects.filter(
+            creator__username__startswith=options['prefix'], status='completed'
+        ).values_list('id', 'creator_id', 'assigned_to_id', 'created_at'))
+        return total, completed
+
+    def create_reviews(self, completed):
+        rng = self.rng
+
+        def reviews():
+            for project_id, creator_id, assigned_to_id, created_at in completed:
+                if rng.random() < 0.7:
+                    yield Review(project_id=project_id, reviewer_id=creator_id, reviewee_id=assigned_to_id,
+                                 rating=RATING.pick(rng), comment='Great job.', created_at=self.between(created_at))
+                if rng.random() < 0.4:
+                    yield Review(project_id=project_id, reviewer_id=assigned_to_id, reviewee_id=creator_id,
+                                 rating=RATING.pick(rng), comment='Pleasant customer.',
+                                 created_at=self.between(created_at))
+        return self.bulk_create(Review, reviews(), dated=['created_at'])
+
+    def create_messages(self, customers, popularity, options):
+        rng = self.rng
+        threads_mean = options['threads_per_user']
+        messages_mean = options['messages_per_thread']
+
+        def messages():
+            for customer_id in customers:
+                threads = int(rng.expovariate(1 / threads_mean)) if threads_mean > 0 else 0
+                partners = set(popularity.pick(rng, k=threads)) if threads else set()
+                for assembler_id in partners:
+                    # Pareto-distributed thread length: most are short, a few are very long
+                    length = max(1, int(messages_mean * (rng.paretovariate(2.0) - 0.5)))
+                    sender, receiver = customer_id, assembler_id
+                    sent_at = self.between(max(self.joined[customer_id], self.joined[assembler_id]))
+                    for _ in range(length):
+                        yield Message(sender_id=sender, receiver_id=receiver, content=rng.choice(MESSAGE_LINES),
+                                      created_at=min(sent_at, self.now))
+                        # Replies follow within minutes to a day
+                        sent_at += timedelta(minutes=rng.expovariate(1 / 90))
+                        if rng.random() < 0.7:
+                            sender, receiver = receiver, sender
+        return self.bulk_create(Message, messages(), dated=['created_at'])
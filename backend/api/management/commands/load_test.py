@@ -0,0 +1,260 @@
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.test import Client
+
+from api.authentication import ClaimsRefreshToken
+from api.models import Conversation, Profile, ProjectListing, Review
+
+SEARCH_TERMS = ['wardrobe', 'bed', 'desk', 'ikea', 'drawers', 'bookshelf', 'office', '"dining set"', 'sofa']
+# Relative share of each scenario in the replayed traffic
+SCENARIOS = [
+    ('browse', 35), ('search', 15), ('inbox', 15), ('thread', 15), ('assign', 10), ('review', 10),
+]
+
+
+def client_address(user_id):
+    # One address per simulated user so per-address throttles see many clients
+    return f'10.{user_id >> 16 & 255}.{user_id >> 8 & 255}.{user_id & 255}'
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class HttpTransport:
+    """Sends requests to a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, token=None, params=None, data=None, address=None):
+        url = self.base_url + path + ('?' + urlencode(params) if params else '')
+        body = json.dumps(data).encode() if data is not None else None
+        request = Request(url, data=body, method=method)
+        request.add_header('Accept', 'application/json')
+        if body is not None:
+            request.add_header('Content-Type', 'application/json')
+        if token:
+            request.add_header('Authorization', f'Bearer {token}')
+        if address:
+            # Only honoured when the server is reached without a proxy in front
+            # (behind one, NUM_PROXIES makes it use the proxy's own entry)
+            request.add_header('X-Forwarded-For', address)
+        try:
+            with urlopen(request, timeout=30) as response:
+                return response.status, response.read()
+        except HTTPError as error:
+            return error.code, error.read()
+
+
+class InProcessTransport:
+    """Calls the Django application directly, without a server."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def request(self, method, path, token=None, params=None, data=None, address=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client()
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        if address:
+            headers['REMOTE_ADDR'] = address
+        if method == 'GET':
+            response = client.get(path, params or {}, **headers)
+        else:
+            response = client.generic(method, path, json.dumps(data or {}), content_type='application/json', **headers)
+        return response.status_code, response.content
+
+
+class Command(BaseCommand):
+    help = 'Replay mixed API traffic and report latency percentiles and throughput per endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', help='Server to load, e.g. http://localhost:8000. '
+                                               'Without it requests are sent in-process.')
+        parser.add_argument('--scenarios', type=int, default=1000,
+                            help='Number of scenarios to replay; each sends one or more requests.')
+        parser.add_argument('--duration', type=float, default=None, help='Stop after this many seconds.')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--users', type=int, default=200, help='Number of users to act as.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1.')
+        self.rng = random.Random(options['seed'])
+        self.rng_lock = threading.Lock()
+        self.transport = HttpTransport(options['base_url']) if options['base_url'] else InProcessTransport()
+        self.prepare(options['users'])
+
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(int)
+        self.samples_lock = threading.Lock()
+        deadline = time.monotonic() + options['duration'] if options['duration'] else None
+        counter = iter(range(options['scenarios']))
+        counter_lock = threading.Lock()
+
+        def worker():
+            while deadline is None or time.monotonic() < deadline:
+                with counter_lock:
+                    if next(counter, None) is None:
+                        return
+                self.run_scenario()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            for future in [executor.submit(worker) for _ in range(options['concurrency'])]:
+                future.result()
+        elapsed = time.perf_counter() - started
+        self.report(elapsed)
+
+    def prepare(self, user_count):
+        profiles = list(Profile.objects.order_by('?').values_list('user_id', 'is_assembler')[:user_count])
+        if not profiles:
+            raise CommandError('No users to act as; run generate_dataset first.')
+        # Tokens are minted directly so the run measures the API, not password hashing
+        users = User.objects.filter(id__in=[user_id for user_id, _ in profiles])
+        self.tokens = {user.id: str(ClaimsRefreshToken.for_user(user).access_token) for user in users}
+        self.customers = [user_id for user_id, is_assembler in profiles if not is_assembler] or list(self.tokens)
+        self.assemblers = list(
+            Profile.objects.filter(is_assembler=True).order_by('?').values_list('user_id', flat=True)[:user_count]
+        )
+        user_ids = list(self.tokens)
+        self.partners = defaultdict(list)
+        for user_a, user_b in Conversation.objects.filter(
+            Q(user_a_id__in=user_ids) | Q(user_b_id__in=user_ids)
+        ).values_list('user_a_id', 'user_b_id').iterator():
+            self.partners[user_a].append(user_b)
+            self.partners[user_b].append(user_a)
+        self.open_projects = defaultdict(list)
+        for project_id, creator_id in ProjectListing.objects.filter(
+            creator_id__in=user_ids, status='open'
+        ).values_list('id', 'creator_id').iterator():
+            self.open_projects[creator_id].append(project_id)
+        reviewed = Review.objects.values('project_id')
+        self.reviewable = list(ProjectListing.objects.filter(
+            creator_id__in=user_ids, status='completed', assigned_to__isnull=False
+        ).exclude(id__in=reviewed).values_list('id', 'creator_id', 'assigned_to_id'))
+        self.project_ids = list(ProjectListing.objects.order_by('?').values_list('id', flat=True)[:1000])
+
+    def choice(self, values):
+        with self.rng_lock:
+            return self.rng.choice(values) if values else None
+
+    def pop(self, values):
+        with self.rng_lock:
+            return values.pop() if values else None
+
+    def scenario(self):
+        with self.rng_lock:
+            names, weights = zip(*SCENARIOS)
+            return self.rng.choices(names, weights=weights)[0]
+
+    def call(self, endpoint, method, path, token=None, params=None, data=None, address=None):
+        started = time.perf_counter()
+        try:
+            status, body = self.transport.request(method, path, token, params, data, address)
+        except OSError:
+            status, body = 0, b''
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.samples_lock:
+            # Latencies of throttled or failed requests would flatter the percentiles
+            if 200 <= status < 300:
+                self.samples[endpoint].append(elapsed)
+            else:
+                self.errors[endpoint] += 1
+                self.statuses[status] += 1
+        return status, body
+
+    def run_scenario(self):
+        name = self.scenario()
+        user_id = self.choice(list(self.tokens))
+        token = self.tokens[user_id]
+        address = client_address(user_id)
+
+        if name == 'browse':
+            kind = self.choice(['services', 'projects'])
+            status, body = self.call(f'{kind} list', 'GET', f'/api/{kind}/', params={'page_size': 20},
+                                     address=address)
+            if status == 200:
+                page = json.loads(body)
+                if page.get('next') and self.choice([True, False]):
+                    next_page = urlsplit(page['next'])
+                    self.call(f'{kind} list', 'GET', next_page.path, params=dict(parse_qsl(next_page.query)),
+                              address=address)
+            project_id = self.choice(self.project_ids)
+            if project_id:
+                self.call('projects detail', 'GET', f'/api/projects/{project_id}/', address=address)
+        elif name == 'search':
+            kind = self.choice(['services', 'projects'])
+            self.call(f'{kind} search', 'GET', f'/api/{kind}/', params={'search': self.choice(SEARCH_TERMS)},
+                      address=address)
+        elif name == 'inbox':
+            self.call('conversations', 'GET', '/api/messages/conversations/', token, params={'page_size': 20},
+                      address=address)
+        elif name == 'thread':
+            partner = self.choice(self.partners.get(user_id))
+            if partner:
+                self.call('thread', 'GET', '/api/messages/with_user/', token, params={'user_id': partner},
+                          address=address)
+                if self.choice([True, False, False]):
+                    self.call('send message', 'POST', '/api/messages/', token,
+                              data={'receiver': partner, 'content': 'Load test message'}, address=address)
+        elif name == 'assign':
+            creator = self.choice([customer for customer in self.customers if self.open_projects.get(customer)])
+            project_id = self.pop(self.open_projects.get(creator, []))
+            if project_id:
+                token, address = self.tokens[creator], client_address(creator)
+                self.call('candidates', 'GET', f'/api/projects/{project_id}/candidates/', token,
+                          params={'limit': 5}, address=address)
+                self.call('assign', 'PATCH', f'/api/projects/{project_id}/assign/', token,
+                          data={'assigned_to': self.choice(self.assemblers)}, address=address)
+        elif name == 'review':
+            project = self.pop(self.reviewable)
+            if project:
+                project_id, creator_id, assembler_id = project
+                self.call('review', 'POST', '/api/reviews/', self.tokens[creator_id], data={
+                    'project': project_id, 'reviewee': assembler_id, 'rating': self.choice([3, 4, 5, 5]),
+                    'comment': 'Load test review',
+                }, address=client_address(creator_id))
+
+    def report(self, elapsed):
+        total = sum(len(samples) for samples in self.samples.values())
+        errors = sum(self.errors.values())
+        header = f'{"endpoint":<20} {"ok":>7} {"errors":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>8}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for endpoint in sorted(set(self.samples) | set(self.errors)):
+            samples = sorted(self.samples[endpoint])
+            self.stdout.write(
+                f'{endpoint:<20} {len(samples):>7} {self.errors[endpoint]:>7} '
+                f'{percentile(samples, 0.50):>9.1f} {percentile(samples, 0.95):>9.1f} '
+                f'{percentile(samples, 0.99):>9.1f} {len(samples) / elapsed:>8.1f}'
+            )
+        if self.statuses:
+            # 0 stands for requests that got no response at all
+            self.stdout.write('Errors by status: ' + ', '.join(
+                f'{status}: {count}' for status, count in sorted(self.statuses.items())
+            ))
+        style = self.style.WARNING if errors else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{total} successful requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s), {errors} errors.'
+        ))
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from api.models import Conversation, Message, UnreadCounter
+
+
+def unread_subquery(reader, writer):
+    # Messages from the other side that are newer than the reader's pointer
+    return Coalesce(Subquery(
+        Message.objects.filter(
+            sender_id=OuterRef(f'{writer}_id'),
+            receiver_id=OuterRef(f'{reader}_id'),
+            id__gt=OuterRef(f'{reader}_last_read_id'),
+        ).order_by().values('receiver_id').annotate(count=Count('id')).values('count')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the conversation summaries and unread counters from existing Message rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pairs = Message.objects.annotate(
+            pair_a=Least('sender_id', 'receiver_id'),
+            pair_b=Greatest('sender_id', 'receiver_id'),
+        ).values('pair_a', 'pair_b').annotate(
+            last_message_id=Max('id'),
+            last_activity=Max('created_at'),
+            # Conversations without a pointer yet start from the legacy flag
+            user_a_read=Max('id', filter=Q(is_read=True, receiver_id=F('pair_a'))),
+            user_b_read=Max('id', filter=Q(is_read=True, receiver_id=F('pair_b'))),
+        ).order_by()
+
+        created = 0
+        with transaction.atomic():
+            pointers = {
+                (row[0], row[1]): row[2:]
+                for row in Conversation.objects.values_list(
+                    'user_a_id', 'user_b_id',
+                    'user_a_last_read_id', 'user_b_last_read_id',
+                    'user_a_read_at', 'user_b_read_at',
+                ).iterator(chunk_size=batch_size)
+            }
+            Conversation.objects.all().delete()
+
+            batch = []
+            for row in pairs.iterator(chunk_size=batch_size):
+                pair = (row['pair_a'], row['pair_b'])
+                a_read, b_read, a_read_at, b_read_at = pointers.get(
+                    pair, (row['user_a_read'] or 0, row['user_b_read'] or 0, None, None)
+                )
+                batch.append(Conversation(
+                    user_a_id=pair[0],
+                    user_b_id=pair[1],
+                    last_message_id=row['last_message_id'],
+                    last_activity=row['last_activity'],
+                    user_a_last_read_id=a_read,
+                    user_b_last_read_id=b_read,
+                    user_a_read_at=a_read_at,
+                    user_b_read_at=b_read_at,
+                ))
+                if len(batch) >= batch_size:
+                    Conversation.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            Conversation.objects.bulk_create(batch)
+            created += len(batch)
+
+            Conversation.objects.update(
+                user_a_unread=unread_subquery('user_a', 'user_b'),
+                user_b_unread=unread_subquery('user_b', 'user_a'),
+            )
+            UnreadCounter.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} conversations.'))
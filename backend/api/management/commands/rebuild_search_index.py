@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api.search import SEARCH_FIELDS, reindex
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for project and service listings.'
+
+    def handle(self, *args, **options):
+        for model in SEARCH_FIELDS:
+            reindex(model)
+            self.stdout.write(f'Reindexed {model._meta.verbose_name_plural}.')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
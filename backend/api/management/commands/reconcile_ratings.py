@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from api.cache import bump_generation, bump_user_generations
+from api.models import Profile, Review, average_rating_expression
+
+
+class Command(BaseCommand):
+    help = 'Recompute profile rating totals from reviews and fix any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted profiles.')
+
+    def handle(self, *args, **options):
+        reviews = Review.objects.filter(reviewee_id=OuterRef('user_id')).order_by().values('reviewee_id')
+        actual_sum = Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0)
+        actual_count = Coalesce(Subquery(reviews.annotate(total=Count('id')).values('total')), 0)
+
+        drifted = Profile.objects.annotate(
+            actual_sum=actual_sum,
+            actual_count=actual_count,
+        ).filter(
+            ~Q(rating_sum=F('actual_sum')) | ~Q(rating_count=F('actual_count'))
+        )
+        user_ids = list(drifted.values_list('user_id', flat=True))
+        count = len(user_ids)
+
+        if count and not options['dry_run']:
+            # One UPDATE for every drifted profile
+            Profile.objects.filter(pk__in=drifted.values('pk')).update(
+                rating_sum=actual_sum,
+                rating_count=actual_count,
+                average_rating=average_rating_expression(actual_sum, actual_count),
+            )
+            # update() sends no signals, so cached responses are expired here
+            bump_generation(Profile)
+            bump_user_generations(user_ids)
+
+        verb = 'Found' if options['dry_run'] else 'Reconciled'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {count} drifted profiles.'))
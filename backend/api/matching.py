@@ -0,0 +1,279 @@
+"""
+Assembler matching for project listings.
+
+Every process keeps a column-oriented feature table of all assemblers
+(availability, cheapest rate, experience, rating, coordinates). It is built
+with one aggregate query and then refreshed incrementally: rows touched in
+this process are marked dirty by signals, services changed by other
+processes are polled through ``updated_at`` every ``MATCHING_POLL_INTERVAL``
+seconds, and the whole table is rebuilt after ``MATCHING_INDEX_TTL`` seconds
+to catch anything else. Updates build a new :class:`FeatureTable` and swap
+it in, so scoring reads one consistent snapshot without taking a lock and
+a rebuild never stalls requests that already have a table. Scoring a
+project is a single pass over the columns with no ORM queries.
+"""
+import heapq
+import math
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .geo import EARTH_RADIUS_KM
+from .models import Profile, Review, ServiceListing
+
+WEIGHTS = {
+    'available': 0.25,
+    'affordability': 0.25,
+    'rating': 0.20,
+    'proximity': 0.15,
+    'experience': 0.15,
+}
+# Hours a typical job takes, used to compare hourly rates with a budget
+EXPECTED_HOURS = 3.0
+# Distance at which the proximity score has dropped to 1/e
+PROXIMITY_SCALE_KM = 25.0
+UNKNOWN_PROXIMITY = 0.3
+MAX_EXPERIENCE_YEARS = 10.0
+# Reviews needed before an assembler's own average outweighs the prior
+RATING_PRIOR_COUNT = 3
+RATING_PRIOR = 3.5
+
+
+class FeatureTable:
+    """
+    One version of the feature columns. Published tables are never
+    modified: changes are applied to a copy that then replaces it.
+    """
+    # ``base`` is the project-independent part of the score; coordinates
+    # are kept in radians
+    columns = ('active', 'available', 'base', 'rate', 'experience', 'latitude', 'longitude')
+    typecodes = {'active': 'b', 'available': 'b'}
+
+    def __init__(self, source=None):
+        self.user_ids = array('q', source.user_ids if source else ())
+        self.rows = dict(source.rows) if source else {}
+        for name in self.columns:
+            setattr(self, name, array(self.typecodes.get(name, 'd'), getattr(source, name) if source else ()))
+
+    def store(self, row):
+        user_id = row['user_id']
+        rate = row['available_rate'] if row['available_rate'] is not None else row['any_rate']
+        rating = (row['rating_sum'] + RATING_PRIOR * RATING_PRIOR_COUNT) / (row['rating_count'] + RATING_PRIOR_COUNT)
+        available = 1 if row['available_rate'] is not None else 0
+        experience = float(row['experience'] or 0)
+        base = (
+            WEIGHTS['available'] * available
+            + WEIGHTS['rating'] * rating / 5.0
+            + WEIGHTS['experience'] * min(experience, MAX_EXPERIENCE_YEARS) / MAX_EXPERIENCE_YEARS
+        )
+        has_point = row['latitude'] is not None and row['longitude'] is not None
+        values = (
+            1 if row['is_assembler'] else 0,
+            available,
+            base,
+            float(rate) if rate is not None else math.nan,
+            experience,
+            math.radians(row['latitude']) if has_point else math.nan,
+            math.radians(row['longitude']) if has_point else math.nan,
+        )
+        index = self.rows.get(user_id)
+        if index is None:
+            if not row['is_assembler']:
+                return
+            self.rows[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            for name, value in zip(self.columns, values):
+                getattr(self, name).append(value)
+        else:
+            for name, value in zip(self.columns, values):
+                getattr(self, name)[index] = value
+
+    def deactivate(self, user_id):
+        index = self.rows.get(user_id)
+        if index is not None:
+            self.active[index] = 0
+
+    def describe(self, user_id):
+        index = self.rows[user_id]
+        rate = self.rate[index]
+        return {
+            'is_available': bool(self.available[index]),
+            'hourly_rate': None if math.isnan(rate) else rate,
+            'experience_years': int(self.experience[index]),
+        }
+
+
+class AssemblerFeatures:
+    def __init__(self):
+        # ``lock`` guards the bookkeeping below; ``update_lock`` lets one
+        # thread at a time build the next table while others keep scoring
+        # against the current one
+        self.lock = threading.Lock()
+        self.update_lock = threading.Lock()
+        self.dirty = set()
+        self.table = None
+        self.built_at = None
+        self.polled_at = None
+
+    def invalidate(self):
+        with self.lock:
+            self.built_at = None
+
+    def mark_dirty(self, user_id):
+        with self.lock:
+            self.dirty.add(user_id)
+
+    def feature_rows(self, user_ids=None):
+        profiles = Profile.objects.all()
+        if user_ids is not None:
+            profiles = profiles.filter(user_id__in=user_ids)
+        return profiles.values(
+            'user_id', 'is_assembler', 'rating_sum', 'rating_count', 'latitude', 'longitude'
+        ).annotate(
+            available_rate=Min('user__services__hourly_rate', filter=Q(user__services__is_available=True)),
+            any_rate=Min('user__services__hourly_rate'),
+            experience=Max('user__services__experience_years'),
+        ).order_by()
+
+    def refresh(self):
+        """Bring the table up to date if needed and return it."""
+        ttl = getattr(settings, 'MATCHING_INDEX_TTL', 300)
+        now = time.monotonic()
+        table = self.table
+        if self.built_at is None or now - self.built_at > ttl:
+            # Only the first build makes callers wait
+            if not self.update_lock.acquire(blocking=table is None):
+                return table
+            try:
+                if self.table is table:
+                    self.rebuild(now)
+            finally:
+                self.update_lock.release()
+            return self.table
+        return self.apply_changes(table, now)
+
+    def rebuild(self, now):
+        with self.lock:
+            # Marks made from here on are applied to the new table later
+            self.dirty.clear()
+        started = timezone.now()
+        table = FeatureTable()
+        for row in self.feature_rows().filter(is_assembler=True).iterator(chunk_size=2000):
+            table.store(row)
+        self.table = table
+        self.built_at = now
+        self.polled_at = (now, started)
+
+    def apply_changes(self, table, now):
+        interval = getattr(settings, 'MATCHING_POLL_INTERVAL', 5)
+        with self.lock:
+            changed, self.dirty = self.dirty, set()
+            since = None
+            if now - self.polled_at[0] >= interval:
+                since, self.polled_at = self.polled_at[1], (now, timezone.now())
+        if since is not None:
+            # Services changed by other processes since the last poll
+            changed |= set(ServiceListing.objects.filter(updated_at__gte=since).values_list('provider_id', flat=True))
+        if not changed:
+            return table
+        if not self.update_lock.acquire(blocking=False):
+            # Another thread is publishing a table; apply these next time
+            with self.lock:
+                self.dirty |= changed
+            return table
+        try:
+            rows = list(self.feature_rows(changed))
+            updated = FeatureTable(self.table)
+            for row in rows:
+                updated.store(row)
+            for user_id in changed - {row['user_id'] for row in rows}:
+                # Profile deleted
+                updated.deactivate(user_id)
+            self.table = updated
+        finally:
+            self.update_lock.release()
+        return updated
+
+    def top_candidates(self, project, limit=10, exclude=()):
+        """
+        Return ``(score, user_id, distance_km, details)`` for the best
+        ``limit`` assemblers, where ``details`` is :meth:`FeatureTable.describe`.
+        """
+        table = self.refresh()
+        budget = float(project.budget)
+        has_point = project.latitude is not None and project.longitude is not None
+        if has_point:
+            project_lat = math.radians(project.latitude)
+            project_lng = math.radians(project.longitude)
+            # Equirectangular distance is plenty for ranking; exact
+            # great-circle distances are computed for the winners only
+            lng_scale = math.cos(project_lat)
+        excluded = set(exclude)
+        w_affordability = WEIGHTS['affordability']
+        w_proximity = WEIGHTS['proximity']
+        unknown_proximity = w_proximity * UNKNOWN_PROXIMITY
+        affordability_rate = budget / EXPECTED_HOURS
+        decay = EARTH_RADIUS_KM / PROXIMITY_SCALE_KM
+        exp, sqrt = math.exp, math.sqrt
+
+        def scored():
+            columns = zip(table.user_ids, table.active, table.base, table.rate, table.latitude, table.longitude)
+            for user_id, active, score, rate, lat, lng in columns:
+                if not active or user_id in excluded:
+                    continue
+                # NaN compares false, so unknown rates and places fall through
+                if rate > 0:
+                    score += w_affordability * min(1.0, affordability_rate / rate)
+                if has_point and lat == lat:
+                    x = (lng - project_lng) * lng_scale
+                    y = lat - project_lat
+                    score += w_proximity * exp(-decay * sqrt(x * x + y * y))
+                else:
+                    score += unknown_proximity
+                yield score, user_id
+
+        best = heapq.nlargest(limit, scored())
+        results = []
+        for score, user_id in best:
+            index = table.rows[user_id]
+            distance = None
+            if has_point and not math.isnan(table.latitude[index]):
+                distance = great_circle_km(project_lat, project_lng, table.latitude[index], table.longitude[index])
+            results.append((score, user_id, distance, table.describe(user_id)))
+        return results
+
+
+def great_circle_km(lat1, lng1, lat2, lng2):
+    """Haversine distance between two points given in radians."""
+    a = math.sin((lat2 - lat1) / 2) ** 2 + (
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+assembler_features = AssemblerFeatures()
+
+
+def profile_changed(sender, instance, **kwargs):
+    assembler_features.mark_dirty(instance.user_id)
+
+
+def service_changed(sender, instance, **kwargs):
+    assembler_features.mark_dirty(instance.provider_id)
+
+
+def review_changed(sender, instance, **kwargs):
+    assembler_features.mark_dirty(instance.reviewee_id)
+
+
+post_save.connect(profile_changed, sender=Profile, dispatch_uid='matching_profile_saved')
+post_delete.connect(profile_changed, sender=Profile, dispatch_uid='matching_profile_deleted')
+post_save.connect(service_changed, sender=ServiceListing, dispatch_uid='matching_service_saved')
+post_delete.connect(service_changed, sender=ServiceListing, dispatch_uid='matching_service_deleted')
+post_save.connect(review_changed, sender=Review, dispatch_uid='matching_review_saved')
+post_delete.connect(review_changed, sender=Review, dispatch_uid='matching_review_deleted')
@@ -0,0 +1,225 @@
+"""
+Operational metrics in the Prometheus text format.
+
+Each process keeps its own counters, gauges and histograms in memory. With
+``METRICS_MULTIPROCESS_DIR`` set (one directory shared by all gunicorn
+workers, emptied on deploy), every process also writes its values to its
+own file, at the end of a request at most every ``METRICS_FLUSH_INTERVAL``
+seconds and on exit. ``/api/metrics/`` merges the files of all processes:
+counters and histograms are summed, gauges are reported per live process.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_save
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .models import Message, ProjectListing
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'api_requests_total': ('counter', 'Requests by route, action, method and status.'),
+    'api_request_errors_total': ('counter', 'Requests that ended in a 5xx response.'),
+    'api_request_duration_seconds': ('histogram', 'Request latency by route and action.'),
+    'api_db_queries_total': ('counter', 'Database queries by route and action.'),
+    'api_db_query_seconds_total': ('counter', 'Time spent in database queries by route and action.'),
+    'api_db_connections_open': ('gauge', 'Open database connections in the process.'),
+    'api_response_cache_total': ('counter', 'Response cache lookups by result.'),
+    'api_messages_sent_total': ('counter', 'Messages sent.'),
+    'api_projects_assigned_total': ('counter', 'Projects assigned to an assembler.'),
+}
+
+
+def label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+class Registry:
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = Path(directory) if directory else None
+        self.flush_interval = flush_interval
+        self.path = None
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            atexit.register(self.flush, force=True)
+        self.reset()
+        # With --preload the workers are forked from an importing master
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self.lock = threading.Lock()
+        if self.directory:
+            # The random part keeps a reused pid from overwriting a dead process's totals
+            self.path = self.directory / f'metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+        self.flushed_at = 0.0
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        # buckets..., +Inf, sum
+        self.histograms = defaultdict(lambda: [0.0] * (len(LATENCY_BUCKETS) + 2))
+
+    def inc(self, name, labels=None, value=1):
+        with self.lock:
+            self.counters[(name, label_key(labels))] += value
+
+    def set_gauge(self, name, value, labels=None):
+        with self.lock:
+            self.gauges[(name, label_key(labels))] = value
+
+    def observe(self, name, value, labels=None):
+        with self.lock:
+            values = self.histograms[(name, label_key(labels))]
+            values[bisect_left(LATENCY_BUCKETS, value)] += 1
+            values[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self.gauges.items()],
+                'histograms': [[name, list(labels), values] for (name, labels), values in self.histograms.items()],
+            }
+
+    def flush(self, force=False):
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed_at < self.flush_interval:
+            return
+        self.flushed_at = now
+        temporary = self.path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, self.path)
+
+    def snapshots(self):
+        if self.path is None:
+            return [self.snapshot()]
+        self.flush(force=True)
+        found = []
+        for path in self.directory.glob('metrics-*.json'):
+            try:
+                found.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                # Being replaced by its process
+                continue
+        return found
+
+    def collect(self):
+        counters = defaultdict(float)
+        gauges = {}
+        histograms = defaultdict(lambda: [0.0] * (len(LATENCY_BUCKETS) + 2))
+        for snapshot in self.snapshots():
+            for name, labels, value in snapshot['counters']:
+                counters[(name, tuple(map(tuple, labels)))] += value
+            if process_alive(snapshot['pid']):
+                for name, labels, value in snapshot['gauges']:
+                    labels = tuple(map(tuple, labels))
+                    if self.path is not None:
+                        labels += (('pid', str(snapshot['pid'])),)
+                    gauges[(name, labels)] = value
+            for name, labels, values in snapshot['histograms']:
+                merged = histograms[(name, tuple(map(tuple, labels)))]
+                for index, value in enumerate(values):
+                    merged[index] += value
+        return counters, gauges, histograms
+
+    def render(self):
+        counters, gauges, histograms = self.collect()
+        series = defaultdict(list)
+        for (name, labels), value in counters.items():
+            series[name].append(sample(name, labels, value))
+        for (name, labels), value in gauges.items():
+            series[name].append(sample(name, labels, value))
+        for (name, labels), values in histograms.items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), values):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                series[name].append(sample(f'{name}_bucket', labels + (('le', le),), cumulative))
+            series[name].append(sample(f'{name}_sum', labels, values[-1]))
+            series[name].append(sample(f'{name}_count', labels, cumulative))
+
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(sorted(series.get(name, [])))
+        return '\n'.join(lines) + '\n'
+
+
+def process_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def sample(name, labels, value):
+    if labels:
+        name += '{%s}' % ','.join(f'{key}="{escape(label)}"' for key, label in sorted(labels))
+    return f'{name} {value:g}' if value != int(value) else f'{name} {int(value)}'
+
+
+registry = Registry(
+    directory=getattr(settings, 'METRICS_MULTIPROCESS_DIR', None),
+    flush_interval=getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0),
+)
+
+
+def record_request(route, action, method, status_code, duration, queries, db_time):
+    labels = {'route': route or 'unresolved', 'action': action or ''}
+    registry.inc('api_requests_total', {**labels, 'method': method, 'status': str(status_code)})
+    if status_code >= 500:
+        registry.inc('api_request_errors_total', labels)
+    registry.observe('api_request_duration_seconds', duration, labels)
+    registry.inc('api_db_queries_total', labels, queries)
+    registry.inc('api_db_query_seconds_total', labels, db_time)
+    registry.set_gauge('api_db_connections_open', sum(
+        1 for alias in connections if connections[alias].connection is not None
+    ))
+    registry.flush()
+
+
+def record_cache(result):
+    registry.inc('api_response_cache_total', {'result': result})
+
+
+def metrics_view(request):
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if request.META.get('REMOTE_ADDR') not in allowed and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def message_sent(sender, instance, created, **kwargs):
+    if created:
+        registry.inc('api_messages_sent_total')
+
+
+def project_assigned(sender, instance, created, **kwargs):
+    if instance.saved_value('status') == 'open' and instance.status == 'in_progress' \
+            and instance.assigned_to_id is not None:
+        registry.inc('api_projects_assigned_total')
+
+
+post_save.connect(message_sent, sender=Message, dispatch_uid='metrics_message_sent')
+post_save.connect(project_assigned, sender=ProjectListing, dispatch_uid='metrics_project_assigned')
@@ -0,0 +1,213 @@
+"""
+Per-request performance instrumentation.
+
+:class:`PerformanceMiddleware` records, for every request, the number of
+queries, total and slowest query time, time spent in serializers and in
+rendering, tagged with the resolved view and action (``MessageViewSet.
+with_user``). The figures are returned in a ``Server-Timing`` header.
+
+A sample of requests (``PERFORMANCE_LOG_SAMPLE_RATE``) is also written to
+the ``api.performance`` logger as one JSON object, including queries that
+ran more than once with the code that issued them. Stacks are only captured
+for sampled requests, so unsampled requests pay for a few clock reads per
+query.
+
+Every request, sampled or not, is also counted in :mod:`api.metrics`.
+"""
+import json
+import logging
+import random
+import time
+import traceback
+from collections import defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+from .compiled import CompiledSerializer
+from .metrics import record_request
+
+logger = logging.getLogger('api.performance')
+
+_current = ContextVar('request_metrics', default=None)
+PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
+_THIS_FILE = str(Path(__file__).resolve())
+
+
+class RequestMetrics:
+    def __init__(self, sampled):
+        self.sampled = sampled
+        self.view = None
+        self.route = None
+        self.action = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = (0.0, None)
+        self.serialize_time = 0.0
+        self.serialize_depth = 0
+        self.render_time = 0.0
+        self.statements = defaultdict(list) if sampled else None
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if duration > self.slowest[0]:
+            self.slowest = (duration, sql)
+        if self.sampled:
+            self.statements[sql].append(caller_stack())
+
+    def duplicates(self):
+        found = []
+        for sql, stacks in self.statements.items():
+            if len(stacks) > 1:
+                distinct = list(dict.fromkeys(tuple(stack) for stack in stacks))
+                found.append({'sql': sql, 'count': len(stacks), 'stacks': [list(stack) for stack in distinct[:3]]})
+        return sorted(found, key=lambda duplicate: -duplicate['count'])
+
+    def server_timing(self, total):
+        entries = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ]
+        if self.view:
+            entries.append(f'view;desc="{self.view}"')
+        return ', '.join(entries)
+
+
+def caller_stack():
+    # Project frames only, innermost last, skipping this module
+    return [
+        f'{frame.filename[len(PROJECT_ROOT) + 1:]}:{frame.lineno} in {frame.name}'
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(PROJECT_ROOT) and frame.filename != _THIS_FILE
+    ]
+
+
+def view_name(view_func, method):
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__qualname__', repr(view_func))
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
+
+
+def route_and_action(request, view_func, method):
+    # Router basename and viewset action, or the URL name for plain views
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        return view_func.initkwargs.get('basename'), actions.get(method.lower(), method.lower())
+    url_name = request.resolver_match.url_name if request.resolver_match else None
+    return url_name, method.lower()
+
+
+def _timed(method):
+    # Nested serializers call Serializer.data recursively, so only the
+    # outermost call is counted.
+    def timed(self, *args):
+        metrics = _current.get()
+        if metrics is None:
+            return method(self, *args)
+        metrics.serialize_depth += 1
+        started = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            metrics.serialize_depth -= 1
+            if not metrics.serialize_depth:
+                metrics.serialize_time += time.perf_counter() - started
+    return timed
+
+
+_instrumented = False
+
+
+def instrument_serializers():
+    global _instrumented
+    if _instrumented:
+        return
+    # Serializer.data is where to_representation runs
+    serializers.Serializer.data = property(_timed(serializers.Serializer.data.fget))
+    serializers.ListSerializer.data = property(_timed(serializers.ListSerializer.data.fget))
+    CompiledSerializer.serialize = _timed(CompiledSerializer.serialize)
+    _instrumented = True
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PERFORMANCE_LOG_SAMPLE_RATE', 0.0)
+        self.server_timing = getattr(settings, 'PERFORMANCE_SERVER_TIMING', True)
+        instrument_serializers()
+
+    def __call__(self, request):
+        metrics = RequestMetrics(sampled=self.sample_rate > 0 and random.random() < self.sample_rate)
+        token = _current.set(metrics)
+        request._performance_metrics = metrics
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(self.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        record_request(
+            metrics.route, metrics.action, request.method, response.status_code,
+            total, metrics.queries, metrics.db_time,
+        )
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing(total)
+        if metrics.sampled:
+            self.log(request, response, metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = getattr(request, '_performance_metrics', None)
+        if metrics is not None:
+            metrics.view = view_name(view_func, request.method)
+            metrics.route, metrics.action = route_and_action(request, view_func, request.method)
+
+    def process_template_response(self, request, response):
+        # Runs just before the response is rendered
+        metrics = getattr(request, '_performance_metrics', None)
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                metrics.render_time += time.perf_counter() - started
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def execute(execute, sql, params, many, context):
+        metrics = _current.get()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if metrics is not None:
+                metrics.record_query(sql, time.perf_counter() - started)
+
+    def log(self, request, response, metrics, total):
+        slowest_time, slowest_sql = metrics.slowest
+        logger.info(json.dumps({
+            'view': metrics.view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 2),
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'slowest_query': {'sql': slowest_sql, 'ms': round(slowest_time * 1000, 2)} if slowest_sql else None,
+            'serialize_ms': round(metrics.serialize_time * 1000, 2),
+            'render_ms': round(metrics.render_time * 1000, 2),
+            'duplicate_queries': metrics.duplicates(),
+        }))
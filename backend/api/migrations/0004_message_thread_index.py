@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-17 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_conversation_read_pointers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'receiver', 'id'], name='message_thread_idx'),
+        ),
+    ]
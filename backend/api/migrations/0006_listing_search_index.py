@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# Indexed columns with their weight, mirroring api.search.SEARCH_FIELDS
+SEARCH_FIELDS = {
+    'api_projectlisting': [('title', 'A'), ('furniture_type', 'B'), ('location', 'B'), ('description', 'C')],
+    'api_servicelisting': [('title', 'A'), ('description', 'C')],
+}
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, fields in SEARCH_FIELDS.items():
+        if vendor == 'postgresql':
+            vector = ' || '.join(
+                f"setweight(to_tsvector('english', coalesce(\"{name}\", '')), '{weight}')"
+                for name, weight in fields
+            )
+            schema_editor.execute(
+                f'ALTER TABLE "{table}" ADD COLUMN "search_vector" tsvector '
+                f'GENERATED ALWAYS AS ({vector}) STORED'
+            )
+            schema_editor.execute(f'CREATE INDEX "{table}_search_idx" ON "{table}" USING GIN ("search_vector")')
+        elif vendor == 'sqlite':
+            columns = ', '.join(name for name, _ in fields)
+            schema_editor.execute(
+                f'CREATE VIRTUAL TABLE "{table}_fts" USING fts5({columns}, tokenize=\'porter unicode61\')'
+            )
+            schema_editor.execute(f'INSERT INTO "{table}_fts" (rowid, {columns}) SELECT id, {columns} FROM "{table}"')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in SEARCH_FIELDS:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'ALTER TABLE "{table}" DROP COLUMN "search_vector"')
+        elif vendor == 'sqlite':
+            schema_editor.execute(f'DROP TABLE "{table}_fts"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_profile_rating_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
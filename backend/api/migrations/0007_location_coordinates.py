@@ -0,0 +1,63 @@
+# Generated by Django 4.2.11 on 2026-10-17 17:27
+
+from django.db import migrations, models
+
+from api.geo import geocode, geohash_encode
+
+
+def geocode_existing_locations(apps, schema_editor):
+    for model_name in ('Profile', 'ProjectListing'):
+        model = apps.get_model('api', model_name)
+        batch = []
+        for instance in model.objects.exclude(location__isnull=True).exclude(location='').iterator(chunk_size=1000):
+            point = geocode(instance.location)
+            if point is None:
+                continue
+            instance.latitude, instance.longitude = point
+            instance.geohash = geohash_encode(*point)
+            batch.append(instance)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+                batch = []
+        model.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_listing_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectlisting',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectlisting',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectlisting',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(geocode_existing_locations, migrations.RunPython.noop),
+    ]
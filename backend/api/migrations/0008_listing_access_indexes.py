@@ -0,0 +1,49 @@
+# Generated by Django 4.2.11 on 2026-10-17 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_location_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='projectlisting',
+            index=models.Index(fields=['created_at', 'id'], name='project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectlisting',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['created_at', 'id'], name='project_open_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectlisting',
+            index=models.Index(fields=['creator', 'created_at', 'id'], name='project_creator_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectlisting',
+            index=models.Index(condition=models.Q(('assigned_to__isnull', False)), fields=['assigned_to', 'created_at', 'id'], name='project_assignee_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['reviewee', 'created_at', 'id'], name='review_reviewee_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['project', 'reviewer'], name='review_project_reviewer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicelisting',
+            index=models.Index(fields=['created_at', 'id'], name='service_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicelisting',
+            index=models.Index(fields=['provider', 'created_at', 'id'], name='service_provider_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicelisting',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['hourly_rate', 'id'], name='service_available_rate_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.11 on 2026-10-17 18:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def backfill_unread_counters(apps, schema_editor):
+    Conversation = apps.get_model('api', 'Conversation')
+    UnreadCounter = apps.get_model('api', 'UnreadCounter')
+    totals = {}
+    for side in ('user_a', 'user_b'):
+        rows = Conversation.objects.filter(**{f'{side}_unread__gt': 0}).values(f'{side}_id').annotate(
+            total=Sum(f'{side}_unread')
+        ).order_by().values_list(f'{side}_id', 'total')
+        for user_id, total in rows:
+            totals[user_id] = totals.get(user_id, 0) + total
+    UnreadCounter.objects.bulk_create([UnreadCounter(user_id=user_id, count=total) for user_id, total in totals.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('api', '0009_token_revocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_unread_counters, migrations.RunPython.noop),
+    ]
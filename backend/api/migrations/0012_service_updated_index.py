@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-17 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='servicelisting',
+            index=models.Index(fields=['updated_at'], name='service_updated_idx'),
+        ),
+    ]
@@ -1,20 +1,136 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import connections, models, transaction
+from django.db.models import Case, Count, Exists, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.db.models.lookups import GreaterThan
+from django.db.models.signals import post_delete, post_save
+from django.db.models.sql import UpdateQuery
+from django.dispatch import Signal, receiver
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 
-class Profile(models.Model):
+from .geo import geocode, geohash_encode
+
+# Sent with ``reader_id`` and ``other_id`` when Conversation.mark_read moves
+# a read pointer; the UPDATE bypasses post_save.
+messages_read = Signal()
+
+def average_rating_expression(rating_sum, rating_count):
+    return Case(
+        When(GreaterThan(rating_count, 0), then=Cast(rating_sum, FloatField()) / Cast(rating_count, FloatField())),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+class DirtyFieldsMixin:
+    """
+    Remembers the column values last loaded from or written to the database.
+    A plain ``save()`` of an existing row then writes only the columns that
+    changed since (plus ``auto_now`` ones), and nothing at all if none did.
+    Receivers can read the previous values with :meth:`saved_value` until
+    the save returns.
+    """
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_saved()
+        return instance
+    
+    def remember_saved(self, fields=None):
+        saved = self.__dict__.setdefault('_saved_values', {})
+        for field in self._meta.concrete_fields:
+            if field.attname in self.__dict__ and (fields is None or field.name in fields or field.attname in fields):
+                saved[field.attname] = self.__dict__[field.attname]
+    
+    def saved_value(self, name):
+        """The value of field ``name`` as last loaded or saved, or None if unknown."""
+        return self.__dict__.get('_saved_values', {}).get(self._meta.get_field(name).attname)
+    
+    def changed_fields(self):
+        saved = self.__dict__.get('_saved_values', {})
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname in self.__dict__
+            and (field.attname not in saved or saved[field.attname] != self.__dict__[field.attname])
+        ]
+    
+    def save(self, *args, **kwargs):
+        tracked = not args and not self._state.adding and '_saved_values' in self.__dict__ \
+            and kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+        if tracked:
+            changed = self.changed_fields()
+            if not changed:
+                return
+            kwargs['update_fields'] = changed + [
+                field.name for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False) and field.name not in changed
+            ]
+        super().save(*args, **kwargs)
+        # Columns outside an explicit update_fields were not written
+        self.remember_saved(None if tracked else kwargs.get('update_fields'))
+    
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.remember_saved(fields)
+
+class GeoLocatedModel(models.Model):
+    # Coordinates resolved from the free-text location when it is saved
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, null=True, db_index=True)
+    
+    GEO_FIELDS = ['latitude', 'longitude', 'geohash']
+    
+    class Meta:
+        abstract = True
+    
+    def update_coordinates(self):
+        point = geocode(self.location)
+        if point is None:
+            self.latitude = self.longitude = self.geohash = None
+        else:
+            self.latitude, self.longitude = point
+            self.geohash = geohash_encode(*point)
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'location' in update_fields:
+            self.update_coordinates()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(self.GEO_FIELDS)
+        super().save(*args, **kwargs)
+
+class Profile(DirtyFieldsMixin, GeoLocatedModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(blank=True, null=True)
     location = models.CharField(max_length=100, blank=True, null=True)
     phone = models.CharField(max_length=15, blank=True, null=True)
     is_assembler = models.BooleanField(default=False)
     average_rating = models.FloatField(default=0.0, validators=[MinValueValidator(0.0), MaxValueValidator(5.0)])
+    # Running totals of received reviews; average_rating is derived from them
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
     date_joined = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"{self.user.username}'s profile"
+    
+    @classmethod
+    def apply_rating(cls, user_id, rating_delta, count_delta):
+        # A single UPDATE, so concurrent reviews cannot lose each other's
+        # changes; the right-hand sides all read the pre-update row.
+        rating_sum = F('rating_sum') + rating_delta
+        rating_count = F('rating_count') + count_delta
+        return cls.objects.filter(user_id=user_id).update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            average_rating=average_rating_expression(rating_sum, rating_count),
+        )
 
-class ServiceListing(models.Model):
+class ServiceListing(DirtyFieldsMixin, models.Model):
     provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='services')
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -24,10 +140,22 @@ class ServiceListing(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        # Listings are paginated on (ordering field, id)
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='service_created_idx'),
+            models.Index(fields=['provider', 'created_at', 'id'], name='service_provider_created_idx'),
+            models.Index(
+                fields=['hourly_rate', 'id'], condition=Q(is_available=True), name='service_available_rate_idx'
+            ),
+            # Polled by the matching feature table for changes
+            models.Index(fields=['updated_at'], name='service_updated_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.title} by {self.provider.username}"
 
-class ProjectListing(models.Model):
+class ProjectListing(DirtyFieldsMixin, GeoLocatedModel):
     STATUS_CHOICES = [
         ('open', 'Open'),
         ('in_progress', 'In Progress'),
@@ -46,20 +174,286 @@ class ProjectListing(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='project_created_idx'),
+            # The browse feed, a small fraction of the table once projects
+            # close. Other statuses are common enough to be found by walking
+            # project_created_idx.
+            models.Index(fields=['created_at', 'id'], condition=Q(status='open'), name='project_open_created_idx'),
+            models.Index(fields=['creator', 'created_at', 'id'], name='project_creator_created_idx'),
+            # Most projects are never assigned
+            models.Index(
+                fields=['assigned_to', 'created_at', 'id'], condition=Q(assigned_to__isnull=False),
+                name='project_assignee_created_idx'
+            ),
+        ]
+    
+    @classmethod
+    def transition(cls, pk, previous, status, creator_id=None, assigned_to_id=None):
+        """
+        Move a project from ``previous`` to ``status`` in a single
+        ``UPDATE ... RETURNING``, optionally only if ``creator_id`` created it
+        and assigning it to ``assigned_to_id`` if that user is an assembler.
+        Returns the updated project, with the creator and assignee usernames
+        loaded, or None if a condition did not hold. ``post_save`` is sent with
+        ``update_fields`` as for a regular save.
+        """
+        values = {'status': status, 'updated_at': timezone.now()}
+        queryset = cls.objects.filter(pk=pk, status=previous)
+        if creator_id is not None:
+            queryset = queryset.filter(creator_id=creator_id)
+        if assigned_to_id is not None:
+            values['assigned_to'] = assigned_to_id
+            queryset = queryset.filter(Exists(Profile.objects.filter(user_id=assigned_to_id, is_assembler=True)))
+    
+        query = queryset.query.chain(UpdateQuery)
+        query.add_update_values(values)
+        connection = connections[queryset.db]
+        sql, params = query.get_compiler(queryset.db).as_sql()
+        qn = connection.ops.quote_name
+        table = qn(cls._meta.db_table)
+        fields = cls._meta.concrete_fields
+        usernames = [
+            f'(SELECT {qn("username")} FROM {qn(User._meta.db_table)} WHERE {qn("id")} = {table}.{qn(column)})'
+            for column in ('creator_id', 'assigned_to_id')
+        ]
+        returning = [f'{table}.{qn(field.column)}' for field in fields] + usernames
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} RETURNING {", ".join(returning)}', params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+    
+        converted = []
+        for field, value in zip(fields, row):
+            column = field.get_col(cls._meta.db_table)
+            for converter in connection.ops.get_db_converters(column) + field.get_db_converters(connection):
+                value = converter(value, column, connection)
+            converted.append(value)
+        project = cls.from_db(queryset.db, [field.attname for field in fields], converted)
+        creator_name, assigned_to_name = row[len(fields):]
+        project.creator = User.from_db(queryset.db, ['id', 'username'], [project.creator_id, creator_name])
+        if project.assigned_to_id is not None:
+            project.assigned_to = User.from_db(queryset.db, ['id', 'username'], [project.assigned_to_id, assigned_to_name])
+    
+        project._saved_values['status'] = previous
+        post_save.send(
+            sender=cls, instance=project, created=False, raw=False, using=queryset.db, update_fields=frozenset(values)
+        )
+        project.remember_saved()
+        return project
+    
     def __str__(self):
         return f"{self.title} by {self.creator.username}"
 
-class Message(models.Model):
+class Message(DirtyFieldsMixin, models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_messages')
     content = models.TextField()
+    # Legacy flag, no longer maintained: read state lives on the
+    # Conversation read pointers and is derived by MessageSerializer.
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Serves both (sender, receiver) directions of a thread, walked by id
+            models.Index(fields=['sender', 'receiver', 'id'], name='message_thread_idx'),
+        ]
+    
     def __str__(self):
         return f"Message from {self.sender.username} to {self.receiver.username}"
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                Conversation.record_message(self)
 
-class Review(models.Model):
+class Conversation(DirtyFieldsMixin, models.Model):
+    # One row per pair of users, stored with user_a.id < user_b.id, so the
+    # inbox can be read without scanning messages.
+    user_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_activity = models.DateTimeField()
+    user_a_unread = models.PositiveIntegerField(default=0)
+    user_b_unread = models.PositiveIntegerField(default=0)
+    # Read pointers: the id of the newest message each side has read.
+    user_a_last_read_id = models.PositiveBigIntegerField(default=0)
+    user_b_last_read_id = models.PositiveBigIntegerField(default=0)
+    user_a_read_at = models.DateTimeField(null=True, blank=True)
+    user_b_read_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_a', 'user_b'], name='unique_conversation_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['user_a', '-last_activity'], name='conversation_a_activity_idx'),
+            models.Index(fields=['user_b', '-last_activity'], name='conversation_b_activity_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Conversation between {self.user_a_id} and {self.user_b_id}"
+    
+    @staticmethod
+    def pair(user_id, other_id):
+        return (user_id, other_id) if user_id <= other_id else (other_id, user_id)
+    
+    @classmethod
+    def for_users(cls, user_id, other_id):
+        user_a, user_b = cls.pair(user_id, other_id)
+        return cls.objects.filter(user_a_id=user_a, user_b_id=user_b)
+    
+    def side(self, user_id):
+        return 'user_a' if user_id == self.user_a_id else 'user_b'
+    
+    def other_user(self, user_id):
+        return self.user_b if user_id == self.user_a_id else self.user_a
+    
+    def unread_for(self, user_id):
+        return getattr(self, f'{self.side(user_id)}_unread')
+    
+    def read_pointers(self):
+        return (self.user_a_last_read_id, self.user_b_last_read_id)
+    
+    @classmethod
+    def is_message_read(cls, message, pointers):
+        # pointers is the (user_a, user_b) pair returned by read_pointers()
+        if pointers is None:
+            return False
+        user_a, _ = cls.pair(message.sender_id, message.receiver_id)
+        last_read_id = pointers[0] if message.receiver_id == user_a else pointers[1]
+        return message.id <= last_read_id
+    
+    @classmethod
+    def mark_read(cls, user_id, other_id, seen_id=None):
+        # Moves the reader's pointer to the latest message in a single UPDATE;
+        # matches no row when there is nothing unread, or when the reader has
+        # only seen messages up to ``seen_id`` and newer ones exist.
+        user_a, _ = cls.pair(user_id, other_id)
+        side = 'user_a' if user_id == user_a else 'user_b'
+        conversation = cls.for_users(user_id, other_id).filter(**{f'{side}_unread__gt': 0})
+        if seen_id is not None:
+            conversation = conversation.filter(Q(last_message_id__lte=seen_id) | Q(last_message__isnull=True))
+        with transaction.atomic():
+            updated = conversation.update(**{
+                f'{side}_last_read_id': Coalesce('last_message_id', f'{side}_last_read_id'),
+                f'{side}_read_at': timezone.now(),
+                f'{side}_unread': 0,
+            })
+            if updated:
+                UnreadCounter.recount(user_id)
+        if updated:
+            messages_read.send(sender=cls, reader_id=user_id, other_id=other_id)
+        return updated
+    
+    @classmethod
+    def record_message(cls, message):
+        user_a, user_b = cls.pair(message.sender_id, message.receiver_id)
+        unread_field = 'user_a_unread' if message.receiver_id == user_a else 'user_b_unread'
+        changes = {
+            'last_message': message,
+            'last_activity': message.created_at,
+            unread_field: F(unread_field) + 1,
+        }
+        UnreadCounter.adjust(message.receiver_id, 1)
+        if cls.for_users(user_a, user_b).update(**changes):
+            return
+        
+        _, created = cls.objects.get_or_create(
+            user_a_id=user_a,
+            user_b_id=user_b,
+            defaults={
+                'last_message': message,
+                'last_activity': message.created_at,
+                unread_field: 1,
+            }
+        )
+        if not created:
+            # Another writer created the row between our UPDATE and INSERT
+            cls.for_users(user_a, user_b).update(**changes)
+    
+    @classmethod
+    def forget_message(cls, message):
+        # Recomputes the preview and both unread counts from the messages
+        # left in the thread, in one UPDATE
+        user_a, user_b = cls.pair(message.sender_id, message.receiver_id)
+        thread = Message.objects.filter(
+            Q(sender_id=user_a, receiver_id=user_b) | Q(sender_id=user_b, receiver_id=user_a)
+        )
+        newest = thread.order_by('-id')
+        
+        def unread(user_id, side):
+            return Coalesce(Subquery(
+                thread.filter(receiver_id=user_id, id__gt=OuterRef(f'{side}_last_read_id')).order_by().values(
+                    'receiver_id'
+                ).annotate(total=Count('id')).values('total')
+            ), 0)
+        
+        with transaction.atomic():
+            updated = cls.for_users(user_a, user_b).update(
+                last_message=Subquery(newest.values('id')[:1]),
+                last_activity=Coalesce(Subquery(newest.values('created_at')[:1]), 'last_activity'),
+                user_a_unread=unread(user_a, 'user_a'),
+                user_b_unread=unread(user_b, 'user_b'),
+            )
+            if updated:
+                # A thread with no messages left drops out of the inbox
+                cls.for_users(user_a, user_b).filter(last_message__isnull=True).delete()
+                UnreadCounter.recount(message.receiver_id)
+
+class UnreadCounter(models.Model):
+    # Unread messages across all of a user's conversations: the sum of their
+    # side's Conversation unread counts, changed in the same transactions
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.count} unread for {self.user_id}"
+    
+    @classmethod
+    def adjust(cls, user_id, delta):
+        count = Greatest(F('count') + delta, 0)
+        if cls.objects.filter(user_id=user_id).update(count=count):
+            return
+        _, created = cls.objects.get_or_create(user_id=user_id, defaults={'count': max(delta, 0)})
+        if not created:
+            # Another writer created the row between our UPDATE and INSERT
+            cls.objects.filter(user_id=user_id).update(count=count)
+    
+    @classmethod
+    def recount(cls, user_id):
+        # Recomputed from the user's conversations rather than decremented,
+        # so the amount cleared by mark_read never has to be read back
+        total = Value(0)
+        for side in ('user_a', 'user_b'):
+            total = total + Coalesce(Subquery(
+                Conversation.objects.filter(**{f'{side}_id': user_id}).order_by().values(f'{side}_id').annotate(
+                    total=Sum(f'{side}_unread')
+                ).values('total')
+            ), 0)
+        return cls.objects.filter(user_id=user_id).update(count=total)
+    
+    @classmethod
+    def rebuild(cls):
+        """Recompute every counter from the conversations."""
+        totals = defaultdict(int)
+        for side in ('user_a', 'user_b'):
+            rows = Conversation.objects.filter(**{f'{side}_unread__gt': 0}).values(f'{side}_id').annotate(
+                total=Sum(f'{side}_unread')
+            ).order_by().values_list(f'{side}_id', 'total')
+            for user_id, total in rows:
+                totals[user_id] += total
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([cls(user_id=user_id, count=total) for user_id, total in totals.items()])
+        return len(totals)
+
+class Review(DirtyFieldsMixin, models.Model):
     project = models.ForeignKey(ProjectListing, on_delete=models.CASCADE, related_name='reviews')
     reviewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='given_reviews')
     reviewee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_reviews')
@@ -67,15 +461,82 @@ class Review(models.Model):
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['reviewee', 'created_at', 'id'], name='review_reviewee_created_idx'),
+            # Duplicate review check
+            models.Index(fields=['project', 'reviewer'], name='review_project_reviewer_idx'),
+        ]
+    
     def __str__(self):
         return f"Review by {self.reviewer.username} for {self.reviewee.username}"
     
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update reviewee's average rating
-        reviews = Review.objects.filter(reviewee=self.reviewee)
-        if reviews.exists():
-            avg = reviews.aggregate(models.Avg('rating'))['rating__avg']
-            profile = Profile.objects.get(user=self.reviewee)
-            profile.average_rating = avg
-            profile.save()
+        previous = None
+        if not self._state.adding and self.saved_value('rating') is not None:
+            previous = (self.saved_value('reviewee'), self.saved_value('rating'))
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Update the reviewee's running rating totals
+            if previous is None:
+                Profile.apply_rating(self.reviewee_id, self.rating, 1)
+            elif previous[0] != self.reviewee_id:
+                Profile.apply_rating(previous[0], -previous[1], -1)
+                Profile.apply_rating(self.reviewee_id, self.rating, 1)
+            elif previous[1] != self.rating:
+                Profile.apply_rating(self.reviewee_id, self.rating - previous[1], 0)
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    # Also runs for queryset and cascade deletes, unlike Model.delete()
+    Profile.apply_rating(instance.reviewee_id, -instance.rating, -1)
+
+@receiver(post_delete, sender=Message)
+def remove_message(sender, instance, **kwargs):
+    # SET_NULL only clears the preview; counts and the preview come from
+    # the messages that remain
+    Conversation.forget_message(instance)
+
+class RevokedToken(models.Model):
+    # JWT ids revoked by rotation or logout, kept until the token would
+    # have expired anyway
+    jti = models.CharField(max_length=255, unique=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"Revoked token {self.jti}"
+
+class TokenGeneration(models.Model):
+    # Tokens carry the generation they were issued in; bumping it logs the
+    # user out everywhere
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='token_generation')
+    generation = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Token generation {self.generation} of {self.user_id}"
+    
+    @classmethod
+    def bump(cls, user_id):
+        with transaction.atomic():
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(generation=F('generation') + 1)
+
+class ImportCheckpoint(models.Model):
+    # Progress of a bulk_import run, saved in the transaction of the batch it
+    # records so that resuming never replays rows that were committed
+    name = models.CharField(max_length=255, unique=True)
+    kind = models.CharField(max_length=20)
+    offset = models.BigIntegerField(default=0)
+    line = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.kind} import {self.name} at line {self.line}"
+    
+    @classmethod
+    def record(cls, name, state):
+        # One UPDATE per batch once the row exists
+        if not cls.objects.filter(name=name).update(**state):
+            cls.objects.create(name=name, **state)
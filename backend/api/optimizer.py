@@ -0,0 +1,95 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+class QueryPlan:
+    def __init__(self):
+        self.select_related = set()
+        self.prefetch_related = set()
+        self.only = set()
+        # Set when a field reads something we cannot map to columns (a
+        # SerializerMethodField, a property, source='*'), so only() is unsafe.
+        self.opaque = False
+
+    def apply(self, queryset, restrict_columns=True):
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*sorted(self.prefetch_related))
+        if restrict_columns and not self.opaque and self.only:
+            queryset = queryset.only(*sorted(self.only))
+        return queryset
+
+
+def _add_source(plan, model, path, prefix=''):
+    for index, attr in enumerate(path):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            plan.opaque = True
+            return
+        lookup = prefix + attr
+        last = index == len(path) - 1
+
+        if field.many_to_many or field.one_to_many:
+            # Prefetched rows are loaded in full, so nothing more to restrict
+            plan.prefetch_related.add(lookup)
+            plan.opaque = True
+            return
+
+        if field.is_relation and not last:
+            plan.select_related.add(lookup)
+            if field.concrete:
+                plan.only.add(lookup)
+            model = field.related_model
+            prefix = lookup + '__'
+            continue
+
+        if field.concrete:
+            plan.only.add(lookup)
+        elif field.is_relation:
+            # A reverse one-to-one read as a whole object
+            plan.select_related.add(lookup)
+            plan.opaque = True
+        return
+
+
+def _walk_serializer(plan, serializer, model, prefix=''):
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            plan.opaque = True
+            continue
+
+        path = field.source.split('.')
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        if isinstance(field, serializers.ModelSerializer):
+            related = field.Meta.model
+            _add_source(plan, model, path + [related._meta.pk.name], prefix)
+            _walk_serializer(plan, field, related, prefix + '__'.join(path) + '__')
+            continue
+        _add_source(plan, model, path, prefix)
+
+
+@lru_cache(maxsize=None)
+def query_plan(serializer_class):
+    """
+    Work out the select_related/prefetch_related/only() calls that let
+    ``serializer_class`` render without further queries, from the dotted
+    ``source`` paths of its fields.
+    """
+    plan = QueryPlan()
+    model = serializer_class.Meta.model
+    plan.only.add(model._meta.pk.name)
+    _walk_serializer(plan, serializer_class(), model)
+    # Relations read by SerializerMethodFields can be declared on Meta
+    plan.select_related.update(getattr(serializer_class.Meta, 'select_related', ()))
+    return plan
+
+
+def optimize_queryset(queryset, serializer_class, restrict_columns=True):
+    return query_plan(serializer_class).apply(queryset, restrict_columns=restrict_columns)
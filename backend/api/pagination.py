@@ -0,0 +1,293 @@
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.db.models import BooleanField, FloatField, IntegerField, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_position(value):
+    # Unlike DjangoJSONEncoder this keeps full microsecond precision, which
+    # the equality half of the keyset comparison depends on.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError('Cannot encode %r in a cursor.' % type(value))
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over ``(<ordering field>, id)``.
+
+    The ordering field is the first ``order_by`` term of the queryset, so the
+    default ``-created_at`` ordering and ``OrderingFilter`` both keep working.
+    ``id`` breaks ties, which keeps pages stable while rows are being inserted.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    default_ordering = '-id'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE
+        self.max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+        self.legacy_list = getattr(settings, 'API_PAGINATION_LEGACY_LIST', False)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.legacy = self.is_legacy_request(request)
+        self.page_size = self.get_page_size(request)
+
+        self.field, self.descending = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            cursor['v'] = self.clean_position(cursor['v'], self.get_ordering_field(queryset))
+        reverse = bool(cursor and cursor['r'])
+
+        queryset = queryset.order_by(*self.order_terms(reverse=reverse))
+        if cursor is not None:
+            queryset = queryset.filter(self.position_filter(cursor['v'], cursor['i'], reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def is_legacy_request(self, request):
+        # Clients that have not opted in to cursors (no cursor/page_size
+        # parameter) keep receiving a bare list, with links in headers.
+        if not self.legacy_list:
+            return False
+        params = request.query_params
+        return self.cursor_query_param not in params and self.page_size_query_param not in params
+
+    def get_page_size(self, request):
+        if self.legacy:
+            return self.max_page_size
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, queryset):
+        ordering = queryset.query.order_by or (self.default_ordering,)
+        term = ordering[0]
+        if not isinstance(term, str) or '__' in term or term.lstrip('-') in ('?', 'pk'):
+            term = self.default_ordering
+        return term.lstrip('-'), term.startswith('-')
+
+    def order_terms(self, reverse=False):
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        if self.field == 'id':
+            return [prefix + 'id']
+        return [prefix + self.field, prefix + 'id']
+
+    def position_filter(self, value, pk, reverse):
+        # Rows strictly after the cursor in the requested direction.
+        descending = self.descending != reverse
+        op = 'lt' if descending else 'gt'
+        if self.field == 'id':
+            return Q(**{'id__' + op: pk})
+        return (
+            Q(**{'%s__%s' % (self.field, op): value}) |
+            Q(**{self.field: value, 'id__' + op: pk})
+        )
+
+    def get_ordering_field(self, queryset):
+        try:
+            if self.field in queryset.query.annotations:
+                return queryset.query.annotations[self.field].output_field
+            return queryset.model._meta.get_field(self.field)
+        except (FieldDoesNotExist, FieldError):
+            return None
+
+    def clean_position(self, value, field):
+        # A cursor is client input: its value must have the JSON type the
+        # ordering field encodes to, and parse as that field.
+        if field is None:
+            expected = (str, int, float)
+        elif isinstance(field, BooleanField):
+            expected = bool
+        elif isinstance(field, IntegerField):
+            expected = int
+        elif isinstance(field, FloatField):
+            expected = (int, float)
+        else:
+            expected = str
+        if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+            raise NotFound(self.invalid_cursor_message)
+        if field is None:
+            return value
+        try:
+            return field.to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_position(self, item):
+        if isinstance(item, dict):
+            return item[self.field], item['id']
+        return getattr(item, self.field), item.pk
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk, reverse = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(pk, int) or isinstance(pk, bool) or reverse not in (0, 1):
+            raise NotFound(self.invalid_cursor_message)
+        return {'v': value, 'i': pk, 'r': bool(reverse)}
+
+    def encode_cursor(self, item, reverse):
+        value, pk = self.get_position(item)
+        payload = json.dumps([value, pk, int(reverse)], default=_encode_position, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        next_link = self.get_next_link()
+        previous_link = self.get_previous_link()
+
+        if self.legacy:
+            links = []
+            if next_link:
+                links.append('<%s>; rel="next"' % next_link)
+            if previous_link:
+                links.append('<%s>; rel="prev"' % previous_link)
+            headers = {'Link': ', '.join(links)} if links else None
+            return Response(data, headers=headers)
+
+        return Response({
+            'next': next_link,
+            'previous': previous_link,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class MessageThreadPagination(KeysetPagination):
+    """
+    Message-id cursors for a two-person thread. Pages are returned oldest
+    first; ``before`` walks back through history and ``after`` returns only
+    the messages that arrived since the client's last poll.
+    """
+    before_query_param = 'before'
+    after_query_param = 'after'
+    page_size_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.legacy = self.is_legacy_request(request)
+        self.page_size = self.get_page_size(request)
+        self.before = self.get_message_id(request, self.before_query_param)
+        self.after = self.get_message_id(request, self.after_query_param)
+
+        if self.after is not None:
+            results = list(queryset.filter(id__gt=self.after).order_by('id')[:self.page_size + 1])
+            self.has_newer = len(results) > self.page_size
+            self.has_older = True
+            results = results[:self.page_size]
+        else:
+            if self.before is not None:
+                queryset = queryset.filter(id__lt=self.before)
+            results = list(queryset.order_by('-id')[:self.page_size + 1])
+            self.has_newer = self.before is not None
+            self.has_older = len(results) > self.page_size
+            results = results[:self.page_size]
+            results.reverse()
+
+        self.page = results
+        return results
+
+    def is_legacy_request(self, request):
+        if not self.legacy_list:
+            return False
+        params = request.query_params
+        return not any(
+            param in params
+            for param in (self.before_query_param, self.after_query_param, self.page_size_query_param)
+        )
+
+    def get_message_id(self, request, param):
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        try:
+            return _positive_int(value)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def link_with(self, param, value):
+        url = remove_query_param(self.base_url, self.before_query_param)
+        url = remove_query_param(url, self.after_query_param)
+        return replace_query_param(url, param, value)
+
+    def get_next_link(self):
+        # Always present: it is the URL to poll for newer messages.
+        if self.page:
+            return self.link_with(self.after_query_param, self.page[-1].id)
+        if self.after is not None:
+            return self.link_with(self.after_query_param, self.after)
+        if self.before is not None:
+            return self.link_with(self.after_query_param, self.before - 1)
+        return self.link_with(self.after_query_param, 0)
+
+    def get_previous_link(self):
+        if not self.has_older or not self.page:
+            return None
+        return self.link_with(self.before_query_param, self.page[0].id)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if not self.legacy:
+            response.data['has_more'] = self.has_newer
+        return response
@@ -0,0 +1,197 @@
+"""
+WebSocket push for messages, read receipts and project status changes.
+
+Clients connect to ``/ws/?token=<access token>`` with a SimpleJWT access
+token and receive JSON events addressed to their user:
+
+* ``{"type": "message", "message": {...}}`` for new messages sent or received
+* ``{"type": "read", "reader": id, "other": id, "read_at": ...}`` when either
+  side of a conversation reads it
+* ``{"type": "project_status", "project": id, "status": ..., "previous": ...}``
+  for projects the user created or is assigned to
+
+Events are published after the writing transaction commits, through the
+broker named by ``REALTIME_BROKER``. :class:`InProcessBroker` only reaches
+connections served by the same process; multi-process deployments need a
+broker backed by a shared pub/sub service.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import token_user_state
+from .models import Conversation, Message, ProjectListing, messages_read
+
+WEBSOCKET_PATH = '/ws/'
+# Close codes in the private 4000-4999 range
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+
+
+class BaseBroker:
+    """Delivers events to the subscribers of a user id."""
+
+    def publish(self, user_id, event):
+        raise NotImplementedError
+
+    def subscribe(self, user_id):
+        """Return an ``asyncio.Queue`` that receives the user's events."""
+        raise NotImplementedError
+
+    def unsubscribe(self, user_id, queue):
+        raise NotImplementedError
+
+
+class InProcessBroker(BaseBroker):
+    # Events are dropped for a connection that has fallen this far behind
+    max_queue_size = 1000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def publish(self, user_id, event):
+        # Called from sync code in any thread; each queue is fed on the
+        # event loop that owns it.
+        with self.lock:
+            targets = list(self.subscribers.get(user_id, ()))
+        for loop, queue in targets:
+            loop.call_soon_threadsafe(self.deliver, queue, event)
+
+    @staticmethod
+    def deliver(queue, event):
+        if not queue.full():
+            queue.put_nowait(event)
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=self.max_queue_size)
+        with self.lock:
+            self.subscribers[user_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self.lock:
+            subscribers = self.subscribers.get(user_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self.subscribers.pop(user_id, None)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'REALTIME_BROKER', 'api.realtime.InProcessBroker'))()
+
+
+def publish(user_ids, event):
+    """Send ``event`` to every user in ``user_ids`` once the transaction commits."""
+    recipients = {user_id for user_id in user_ids if user_id is not None}
+    payload = json.loads(json.dumps(event, cls=DjangoJSONEncoder))
+
+    def send():
+        broker = get_broker()
+        for user_id in recipients:
+            broker.publish(user_id, payload)
+
+    transaction.on_commit(send)
+
+
+def message_created(sender, instance, created, **kwargs):
+    if not created:
+        return
+    from .serializers import MessageSerializer
+    # A new message is unread; seed the pointer cache so nothing is queried
+    pair = Conversation.pair(instance.sender_id, instance.receiver_id)
+    data = MessageSerializer(instance, context={'read_pointers': {pair: None}}).data
+    publish([instance.sender_id, instance.receiver_id], {'type': 'message', 'message': data})
+
+
+def conversation_read(sender, reader_id, other_id, **kwargs):
+    publish([reader_id, other_id], {
+        'type': 'read',
+        'reader': reader_id,
+        'other': other_id,
+        'read_at': timezone.now(),
+    })
+
+
+def project_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'status' not in update_fields):
+        return
+    previous = instance.saved_value('status')
+    if previous is None or previous == instance.status:
+        return
+    publish([instance.creator_id, instance.assigned_to_id], {
+        'type': 'project_status',
+        'project': instance.pk,
+        'status': instance.status,
+        'previous': previous,
+        'assigned_to': instance.assigned_to_id,
+    })
+
+
+post_save.connect(message_created, sender=Message, dispatch_uid='realtime_message_created')
+post_save.connect(project_saved, sender=ProjectListing, dispatch_uid='realtime_project_saved')
+messages_read.connect(conversation_read, sender=Conversation, dispatch_uid='realtime_conversation_read')
+
+
+def authenticate_token(raw_token):
+    """Return the user id for a live access token, or None."""
+    try:
+        return token_user_state(AccessToken(raw_token))[0]
+    except (TokenError, AuthenticationFailed):
+        return None
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application for ``websocket`` scopes."""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if scope['path'] != WEBSOCKET_PATH:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [''])[0]
+    user_id = await sync_to_async(authenticate_token)(token) if token else None
+    if user_id is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+
+    broker = get_broker()
+    queue = broker.subscribe(user_id)
+    await send({'type': 'websocket.accept'})
+
+    async def forward():
+        while True:
+            event = await queue.get()
+            await send({'type': 'websocket.send', 'text': json.dumps(event)})
+
+    forwarder = asyncio.ensure_future(forward())
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            if message['type'] == 'websocket.receive' and message.get('text'):
+                try:
+                    is_ping = json.loads(message['text']).get('type') == 'ping'
+                except (ValueError, AttributeError):
+                    is_ping = False
+                if is_ping:
+                    await send({'type': 'websocket.send', 'text': json.dumps({'type': 'pong'})})
+    finally:
+        forwarder.cancel()
+        broker.unsubscribe(user_id, queue)
@@ -0,0 +1,59 @@
+"""
+JSON rendering through orjson when it is installed.
+
+:class:`FastJSONRenderer` produces the same bytes as DRF's ``JSONRenderer``
+(compact, UTF-8, with U+2028/U+2029 escaped). Types orjson would format
+differently, such as datetimes, are handed to DRF's encoder. Output that
+contains a float in exponent notation is rendered again by ``json``,
+because the two libraries spell exponents differently. orjson writes NaN
+and infinities as ``null``; when the output contains ``null`` and the data
+holds such a float, ``JSONRenderer`` renders it instead and raises as it
+always has.
+"""
+import math
+import re
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+EXPONENT = re.compile(rb'\de[-\d]')
+encode_default = JSONEncoder().default
+
+
+def has_non_finite(data):
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=encode_default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except TypeError:
+            # Non-string keys, integers beyond 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        if EXPONENT.search(ret) or (b'null' in ret and has_non_finite(data)):
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
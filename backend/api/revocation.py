@@ -0,0 +1,127 @@
+"""
+Revoked JWT ids.
+
+Revocations are rows of :class:`~api.models.RevokedToken` that live until
+the token would have expired, and are pruned after that. Every process keeps
+a Bloom filter of the revoked ids, so checking a token that was never
+revoked (nearly all of them) needs no query. The filter is topped up with
+new rows at most every ``TOKEN_REVOCATION_SYNC_INTERVAL`` seconds; ids
+revoked by this process are added at once. A hit in the filter is confirmed
+against the table, which rules out false positives.
+
+Syncing reads the rows revoked since shortly before the previous sync,
+so rows from transactions that committed late are still picked up.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import RevokedToken
+
+# How far back each sync re-reads, to cover slow transactions
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key):
+        # Double hashing: two 64-bit halves of one digest give every position
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class RevocationStore:
+    def __init__(self, capacity=100_000, sync_interval=5.0, prune_interval=3600.0):
+        self.capacity = capacity
+        self.sync_interval = sync_interval
+        self.prune_interval = prune_interval
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.bloom = None
+        self.count = 0
+        self.synced_since = None
+        self.synced_at = 0.0
+        self.pruned_at = time.monotonic()
+
+    def rebuild(self):
+        started = timezone.now()
+        rows = list(RevokedToken.objects.filter(expires_at__gt=started).values_list('jti', flat=True))
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)))
+        for jti in rows:
+            bloom.add(jti)
+        self.bloom, self.count, self.synced_since = bloom, len(rows), started - SYNC_OVERLAP
+
+    def sync(self):
+        now = time.monotonic()
+        if self.bloom is not None and now - self.synced_at < self.sync_interval:
+            return
+        with self.lock:
+            if self.bloom is None:
+                self.rebuild()
+            else:
+                started = timezone.now()
+                for jti in RevokedToken.objects.filter(revoked_at__gte=self.synced_since).values_list('jti', flat=True):
+                    self.bloom.add(jti)
+                    # Over-counts rows seen twice, so rebuilds come a little early
+                    self.count += 1
+                self.synced_since = started - SYNC_OVERLAP
+                if self.count > self.bloom.capacity:
+                    self.rebuild()
+            self.synced_at = now
+
+    def is_revoked(self, jti):
+        if not jti:
+            return False
+        self.sync()
+        if jti not in self.bloom:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, jti, exp):
+        """Revoke ``jti`` until ``exp`` (epoch seconds). False if it already was."""
+        expires_at = datetime.fromtimestamp(exp, tz=dt_timezone.utc)
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        self.sync()
+        with self.lock:
+            self.bloom.add(jti)
+        self.prune()
+        return True
+
+    def prune(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.pruned_at < self.prune_interval:
+            return 0
+        self.pruned_at = now
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+revocations = RevocationStore(
+    capacity=getattr(settings, 'TOKEN_REVOCATION_CAPACITY', 100_000),
+    sync_interval=getattr(settings, 'TOKEN_REVOCATION_SYNC_INTERVAL', 5.0),
+)
@@ -0,0 +1,139 @@
+"""
+Full-text search for project and service listings.
+
+PostgreSQL keeps a generated, weighted ``search_vector`` column with a GIN
+index on each listing table. SQLite keeps an FTS5 shadow table per listing
+table (``<table>_fts``, rowid = listing id) that is updated from
+``post_save``/``post_delete``, so search also works in local tests.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from .cache import bump_generation
+from .models import ProjectListing, ServiceListing
+
+# Indexed fields with their weight, most important first
+SEARCH_FIELDS = {
+    ProjectListing: [('title', 'A'), ('furniture_type', 'B'), ('location', 'B'), ('description', 'C')],
+    ServiceListing: [('title', 'A'), ('description', 'C')],
+}
+
+SEARCH_CONFIG = 'english'
+FTS5_WEIGHTS = {'A': 4.0, 'B': 2.0, 'C': 1.0}
+
+_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+_WORD_RE = re.compile(r'\w+')
+
+
+def fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def fts5_query(query):
+    # Quoted text becomes an FTS5 phrase, every other word a required term;
+    # FTS5 operators typed by the user are never interpreted.
+    terms = []
+    for phrase, word in _TERM_RE.findall(query):
+        words = _WORD_RE.findall(phrase or word)
+        if words:
+            terms.append('"%s"' % ' '.join(words))
+    return ' '.join(terms)
+
+
+def search(queryset, query):
+    """
+    Filter ``queryset`` to listings matching ``query`` and annotate each row
+    with ``search_rank`` (higher is better).
+    """
+    model = queryset.model
+    table = model._meta.db_table
+
+    if connection.vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        return queryset.filter(
+            RawSQL(f'"{table}"."search_vector" @@ {tsquery}', [query], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f'ts_rank_cd("{table}"."search_vector", {tsquery})', [query], output_field=FloatField())
+        )
+
+    match = fts5_query(query)
+    if not match:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+    fts = fts_table(model)
+    weights = ', '.join(str(FTS5_WEIGHTS[weight]) for _, weight in SEARCH_FIELDS[model])
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH %s', [match])
+    ).annotate(
+        # bm25() is lower-is-better, so flip the sign
+        search_rank=RawSQL(
+            f'(SELECT -bm25("{fts}", {weights}) FROM "{fts}" '
+            f'WHERE "{fts}" MATCH %s AND "{fts}".rowid = "{table}"."id")',
+            [match],
+            output_field=FloatField()
+        )
+    )
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    Ranked full-text search on the ``search`` parameter. Results are ordered
+    by relevance unless the client asks for an explicit ``ordering``.
+    """
+    search_param = api_settings.SEARCH_PARAM
+    ordering_param = api_settings.ORDERING_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        queryset = search(queryset, query)
+        if not request.query_params.get(self.ordering_param):
+            queryset = queryset.order_by('-search_rank')
+        return queryset
+
+
+def reindex(model):
+    """Rebuild the search index of ``model`` from its table."""
+    bump_generation(model)
+    if connection.vendor != 'sqlite':
+        # The PostgreSQL column is generated, so it is never stale
+        return
+    table = model._meta.db_table
+    fts = fts_table(model)
+    columns = ', '.join(name for name, _ in SEARCH_FIELDS[model])
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{fts}"')
+        cursor.execute(f'INSERT INTO "{fts}" (rowid, {columns}) SELECT id, {columns} FROM "{table}"')
+
+
+def index_instance(sender, instance, update_fields=None, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    names = [name for name, _ in SEARCH_FIELDS[sender]]
+    if update_fields is not None and not set(update_fields) & set(names):
+        return
+    fts = fts_table(sender)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{fts}" WHERE rowid = %s', [instance.pk])
+        cursor.execute(
+            f'INSERT INTO "{fts}" (rowid, {", ".join(names)}) VALUES (%s{", %s" * len(names)})',
+            [instance.pk] + [getattr(instance, name) for name in names]
+        )
+
+
+def unindex_instance(sender, instance, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{fts_table(sender)}" WHERE rowid = %s', [instance.pk])
+
+
+for indexed_model in SEARCH_FIELDS:
+    post_save.connect(index_instance, sender=indexed_model, dispatch_uid=f'search_index_{indexed_model.__name__}')
+    post_delete.connect(unindex_instance, sender=indexed_model, dispatch_uid=f'search_unindex_{indexed_model.__name__}')
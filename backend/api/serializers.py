@@ -1,6 +1,10 @@
+from functools import reduce
+from operator import or_
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Profile, ServiceListing, ProjectListing, Message, Review
+from django.db.models import Q
+from .models import Profile, ServiceListing, ProjectListing, Message, Conversation, Review
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,19 +20,21 @@ class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'bio', 
-                  'location', 'phone', 'is_assembler', 'average_rating', 'date_joined']
-        read_only_fields = ['id', 'average_rating', 'date_joined']
+                  'location', 'phone', 'is_assembler', 'average_rating', 'rating_count', 'date_joined']
+        read_only_fields = ['id', 'average_rating', 'rating_count', 'date_joined']
         
     def update(self, instance, validated_data):
         user_data = validated_data.pop('user', {})
         
-        # Update user fields
+        # Update user fields, writing the row only if one of them changed
         user = instance.user
-        for attr, value in user_data.items():
-            setattr(user, attr, value)
-        user.save()
+        changed = [attr for attr, value in user_data.items() if getattr(user, attr) != value]
+        for attr in changed:
+            setattr(user, attr, user_data[attr])
+        if changed:
+            user.save(update_fields=changed)
         
-        # Update profile fields
+        # Update profile fields; save() writes only the changed columns
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
@@ -64,20 +70,73 @@ class ProjectListingSerializer(serializers.ModelSerializer):
         validated_data['creator'] = self.context['request'].user
         return super().create(validated_data)
 
+class MessageListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Load the read pointers for every conversation on the page at once
+        messages = list(data.all() if hasattr(data, 'all') else data)
+        pointers = self.context.setdefault('read_pointers', {})
+        pairs = {Conversation.pair(m.sender_id, m.receiver_id) for m in messages} - set(pointers)
+        if pairs:
+            pointers.update(dict.fromkeys(pairs))
+            conversations = Conversation.objects.filter(
+                reduce(or_, (Q(user_a_id=a, user_b_id=b) for a, b in pairs))
+            ).values_list('user_a_id', 'user_b_id', 'user_a_last_read_id', 'user_b_last_read_id')
+            for user_a, user_b, a_read, b_read in conversations:
+                pointers[(user_a, user_b)] = (a_read, b_read)
+        return super().to_representation(messages)
+
 class MessageSerializer(serializers.ModelSerializer):
     sender_name = serializers.CharField(source='sender.username', read_only=True)
     receiver_name = serializers.CharField(source='receiver.username', read_only=True)
+    is_read = serializers.SerializerMethodField()
     
     class Meta:
         model = Message
         fields = ['id', 'sender', 'sender_name', 'receiver', 'receiver_name', 
                   'content', 'is_read', 'created_at']
         read_only_fields = ['id', 'sender', 'created_at']
+        list_serializer_class = MessageListSerializer
+        
+    def get_is_read(self, obj):
+        # Read pointers are looked up once per conversation and shared by
+        # every message serialized with the same context.
+        pointers = self.context.setdefault('read_pointers', {})
+        pair = Conversation.pair(obj.sender_id, obj.receiver_id)
+        if pair not in pointers:
+            pointers[pair] = Conversation.for_users(*pair).values_list(
+                'user_a_last_read_id', 'user_b_last_read_id'
+            ).first()
+        return Conversation.is_message_read(obj, pointers[pair])
         
     def create(self, validated_data):
         validated_data['sender'] = self.context['request'].user
         return super().create(validated_data)
 
+class ConversationSerializer(serializers.ModelSerializer):
+    user = serializers.SerializerMethodField()
+    latest_message = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Conversation
+        fields = ['id', 'user', 'latest_message', 'unread_count', 'last_activity']
+        read_only_fields = fields
+        select_related = ['user_a', 'user_b', 'last_message__sender', 'last_message__receiver']
+        
+    def get_user(self, obj):
+        other_user = obj.other_user(self.context['request'].user.id)
+        return UserSerializer(other_user).data
+    
+    def get_latest_message(self, obj):
+        if obj.last_message is None:
+            return None
+        pointers = self.context.setdefault('read_pointers', {})
+        pointers[(obj.user_a_id, obj.user_b_id)] = obj.read_pointers()
+        return MessageSerializer(obj.last_message, context=self.context).data
+    
+    def get_unread_count(self, obj):
+        return obj.unread_for(self.context['request'].user.id)
+
 class ReviewSerializer(serializers.ModelSerializer):
     reviewer_name = serializers.CharField(source='reviewer.username', read_only=True)
     reviewee_name = serializers.CharField(source='reviewee.username', read_only=True)
@@ -0,0 +1,125 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ProjectListing
+from api.authentication import user_states
+from api import authentication
+from api.throttling import buckets
+
+def user_queries(queries):
+    return [query['sql'] for query in queries.captured_queries if 'FROM "auth_user"' in query['sql']]
+
+@pytest.mark.django_db
+class TestClaimsAuthentication:
+    def setup_method(self):
+        user_states.invalidate()
+        buckets.reset()
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        self.profile = Profile.objects.create(user=self.user, is_assembler=True)
+        ProjectListing.objects.create(
+            creator=self.user,
+            title='Desk assembly',
+            description='Desk',
+            furniture_type='Desk',
+            location='Leeds',
+            budget=Decimal('50.00')
+        )
+
+    def login(self):
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'assembler',
+            'password': 'strongpassword'
+        })
+        assert response.status_code == status.HTTP_200_OK
+        return response.data
+
+    def authenticate(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_tokens_carry_claims(self):
+        tokens = self.login()
+        access = AccessToken(tokens['access'])
+
+        assert access['username'] == 'assembler'
+        assert access['is_assembler'] is True
+
+    def test_no_user_query_once_cached(self):
+        self.authenticate(self.login()['access'])
+        self.client.get(reverse('projectlisting-my-projects'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('projectlisting-my-projects'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [item['title'] for item in response.json()] == ['Desk assembly']
+        assert user_queries(queries) == []
+
+    def test_other_fields_load_on_access(self):
+        tokens = self.login()
+        user = authentication.ClaimsJWTAuthentication().get_user(AccessToken(tokens['access']))
+
+        with CaptureQueriesContext(connection) as queries:
+            assert (user.username, user.is_active, user.is_staff, user.is_assembler) == ('assembler', True, False, True)
+        assert len(queries) == 0
+
+        with CaptureQueriesContext(connection) as queries:
+            assert user.email == 'assembler@example.com'
+        assert len(queries) == 1
+
+    def test_deactivation_locks_out(self):
+        self.authenticate(self.login()['access'])
+        assert self.client.get(reverse('projectlisting-my-projects')).status_code == status.HTTP_200_OK
+
+        self.user.is_active = False
+        self.user.save()
+
+        assert self.client.get(reverse('projectlisting-my-projects')).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_deactivation_elsewhere_within_ttl(self, monkeypatch):
+        self.authenticate(self.login()['access'])
+        assert self.client.get(reverse('projectlisting-my-projects')).status_code == status.HTTP_200_OK
+
+        # As if another process deactivated the user: no signal here
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        assert self.client.get(reverse('projectlisting-my-projects')).status_code == status.HTTP_200_OK
+
+        later = authentication.time.monotonic() + user_states.ttl + 1
+        monkeypatch.setattr(authentication.time, 'monotonic', lambda: later)
+        assert self.client.get(reverse('projectlisting-my-projects')).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_refresh_updates_claims(self):
+        tokens = self.login()
+        self.profile.is_assembler = False
+        self.profile.save()
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert AccessToken(response.data['access'])['is_assembler'] is False
+
+    def test_refresh_rejects_inactive_user(self):
+        tokens = self.login()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_tokens_without_claims_still_work(self):
+        self.authenticate(str(RefreshToken.for_user(self.user).access_token))
+
+        response = self.client.get(reverse('projectlisting-my-projects'))
+
+        assert response.status_code == status.HTTP_200_OK
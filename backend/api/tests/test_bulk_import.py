@@ -0,0 +1,179 @@
+import json
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import ImportCheckpoint, Profile, ServiceListing, ProjectListing, Review
+from api.management.commands import bulk_import
+
+@pytest.mark.django_db
+class TestBulkImport:
+    def setup_method(self):
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.assembler)
+        # No profile yet: the import creates it
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+
+    def run(self, kind, path, **options):
+        out = StringIO()
+        call_command('bulk_import', kind, str(path), stdout=out, **options)
+        return out.getvalue()
+
+    def rejects(self, path):
+        with open(f'{path}.rejects.jsonl') as handle:
+            return [json.loads(line) for line in handle]
+
+    def test_import_users_csv(self, tmp_path):
+        path = tmp_path / 'users.csv'
+        path.write_text(
+            'username,email,first_name,is_assembler,location,password\n'
+            'newbie,newbie@example.com,New,true,Leeds,secret123\n'
+            'assembler,dupe@example.com,Dupe,false,York,\n'
+            'broken,not-an-email,,,,\n'
+            '"quoted",quoted@example.com,"Multi\nline",false,"Bath, UK",\n'
+        )
+        output = self.run('users', path)
+
+        assert 'Imported 2 users, rejected 2 rows.' in output
+        newbie = User.objects.get(username='newbie')
+        assert newbie.check_password('secret123')
+        assert newbie.profile.is_assembler
+        assert newbie.profile.latitude is not None
+        quoted = User.objects.get(username='quoted')
+        assert quoted.first_name == 'Multi\nline'
+        assert not quoted.has_usable_password()
+
+        rejects = self.rejects(path)
+        assert [reject['line'] for reject in rejects] == [3, 4]
+        assert 'username' in rejects[0]['errors']
+        assert 'email' in rejects[1]['errors']
+
+    def test_import_services_jsonl_in_batches(self, tmp_path):
+        path = tmp_path / 'services.jsonl'
+        rows = [
+            {'provider': 'assembler', 'title': f'Service {i}', 'description': 'Assembly',
+             'hourly_rate': '25.00', 'experience_years': 3}
+            for i in range(10)
+        ]
+        rows[4] = {'provider': 'nobody', 'title': 'Ghost', 'description': 'x', 'hourly_rate': '20'}
+        rows[7]['hourly_rate'] = 'cheap'
+        path.write_text('\n'.join(json.dumps(row) for row in rows) + '\n{not json\n')
+
+        with CaptureQueriesContext(connection) as queries:
+            output = self.run('services', path, batch_size=5)
+
+        assert 'Imported 8 services, rejected 3 rows.' in output
+        assert ServiceListing.objects.filter(provider=self.assembler).count() == 8
+        assert Profile.objects.get(user=self.assembler).is_assembler
+        # A bounded number of queries per batch, not per row
+        assert len(queries) < 40
+        assert [reject['line'] for reject in self.rejects(path)] == [5, 8, 11]
+
+    def test_imported_listings_are_searchable(self, tmp_path, client):
+        path = tmp_path / 'projects.csv'
+        path.write_text(
+            'creator,title,description,furniture_type,location,budget,status\n'
+            'customer,Wardrobe build,Large wardrobe,Wardrobe,Leeds,80.00,open\n'
+            'customer,Desk build,Desk,Desk,Leeds,-,open\n'
+            'customer,Bed build,Bed,Bed,Leeds,60.00,unknown\n'
+        )
+        output = self.run('projects', path)
+
+        assert 'Imported 1 projects, rejected 2 rows.' in output
+        assert Profile.objects.filter(user=self.customer, is_assembler=False).exists()
+        response = client.get('/api/projects/', {'search': 'wardrobe'})
+        assert [item['title'] for item in response.json()] == ['Wardrobe build']
+
+    def test_import_reviews_applies_ratings(self, tmp_path):
+        Profile.objects.create(user=self.customer)
+        project = ProjectListing.objects.create(
+            creator=self.customer,
+            title='Chair assembly',
+            description='Chairs',
+            furniture_type='Chair',
+            location='York',
+            budget=Decimal('40.00'),
+            status='completed',
+            assigned_to=self.assembler
+        )
+        path = tmp_path / 'reviews.csv'
+        path.write_text(
+            'project,reviewer,reviewee,rating,comment\n'
+            f'{project.id},customer,assembler,4,Good\n'
+            f'{project.id},customer,assembler,5,Twice\n'
+            f'{project.id},assembler,assembler,5,Self\n'
+            f'{project.id},customer,assembler,9,Too high\n'
+        )
+        output = self.run('reviews', path)
+
+        assert 'Imported 1 reviews, rejected 3 rows.' in output
+        profile = Profile.objects.get(user=self.assembler)
+        assert (profile.rating_sum, profile.rating_count, profile.average_rating) == (4, 1, 4.0)
+        assert Review.objects.get().comment == 'Good'
+
+    def test_resume_after_crash(self, tmp_path, monkeypatch):
+        path = tmp_path / 'services.csv'
+        path.write_text('provider,title,description,hourly_rate\n' + ''.join(
+            f'assembler,Service {i},Assembly,20.00\n' for i in range(9)
+        ))
+        original = bulk_import.Command.import_batch
+        calls = []
+
+        def crash_on_second_batch(self, *args):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('crash')
+            return original(self, *args)
+
+        monkeypatch.setattr(bulk_import.Command, 'import_batch', crash_on_second_batch)
+        with pytest.raises(RuntimeError):
+            self.run('services', path, batch_size=3)
+        assert ServiceListing.objects.count() == 3
+        assert ImportCheckpoint.objects.get(name=str(path)).line == 4
+
+        monkeypatch.setattr(bulk_import.Command, 'import_batch', original)
+        output = self.run('services', path, batch_size=3)
+
+        assert 'Resuming after line 4.' in output
+        assert 'Imported 9 services' in output
+        titles = sorted(ServiceListing.objects.values_list('title', flat=True))
+        assert titles == [f'Service {i}' for i in range(9)]
+        assert not ImportCheckpoint.objects.exists()
+
+    def test_checkpoint_commits_with_the_batch(self, tmp_path, monkeypatch):
+        path = tmp_path / 'services.csv'
+        path.write_text('provider,title,description,hourly_rate\n' + ''.join(
+            f'assembler,Service {i},Assembly,20.00\n' for i in range(6)
+        ))
+        original = ImportCheckpoint.record
+        calls = []
+
+        def crash_on_second_checkpoint(name, state):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('crash')
+            return original(name, state)
+
+        # The second batch is inserted, then the process dies before its checkpoint
+        monkeypatch.setattr(ImportCheckpoint, 'record', crash_on_second_checkpoint)
+        with pytest.raises(RuntimeError):
+            self.run('services', path, batch_size=3)
+        assert ServiceListing.objects.count() == 3
+
+        monkeypatch.undo()
+        output = self.run('services', path, batch_size=3)
+
+        assert 'Resuming after line 4.' in output
+        titles = sorted(ServiceListing.objects.values_list('title', flat=True))
+        assert titles == [f'Service {i}' for i in range(6)]
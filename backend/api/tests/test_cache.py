@@ -0,0 +1,188 @@
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ServiceListing, ProjectListing, Review
+from api.cache import response_cache
+
+@pytest.mark.django_db
+class TestResponseCache:
+    def setup_method(self):
+        response_cache().clear()
+        self.client = APIClient()
+
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.assembler, is_assembler=True)
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+
+        self.service = ServiceListing.objects.create(
+            provider=self.assembler,
+            title='Furniture Assembly',
+            description='Flat-pack furniture',
+            hourly_rate=Decimal('25.00')
+        )
+        self.project = ProjectListing.objects.create(
+            creator=self.customer,
+            title='Bed assembly',
+            description='Double bed',
+            furniture_type='Bed',
+            location='Leeds',
+            budget=Decimal('60.00'),
+            status='completed',
+            assigned_to=self.assembler
+        )
+
+    def test_repeated_reads_are_served_from_cache(self, django_assert_num_queries):
+        url = reverse('servicelisting-list')
+        first = self.client.get(url)
+        with django_assert_num_queries(0):
+            second = self.client.get(url)
+
+        assert first['X-Cache'] == 'miss'
+        assert second['X-Cache'] == 'hit'
+        assert second.data == first.data
+        assert second['ETag'] == first['ETag']
+        assert second.headers.get('Link') == first.headers.get('Link')
+
+    def test_query_params_are_normalized(self):
+        url = reverse('projectlisting-list')
+        self.client.get(url, {'status': 'completed', 'furniture_type': 'Bed'})
+        response = self.client.get(url + '?furniture_type=Bed&status=completed&search=')
+
+        assert response['X-Cache'] == 'hit'
+        assert self.client.get(url, {'status': 'open'})['X-Cache'] == 'miss'
+
+    def test_auth_scope_is_part_of_the_key(self):
+        url = reverse('servicelisting-list')
+        self.client.get(url)
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(url)
+
+        assert response['X-Cache'] == 'miss'
+        assert 'private' in response['Cache-Control']
+
+    def test_writes_invalidate(self, django_capture_on_commit_callbacks):
+        url = reverse('servicelisting-detail', args=[self.service.id])
+        etag = self.client.get(url)['ETag']
+
+        with django_capture_on_commit_callbacks(execute=True):
+            self.service.hourly_rate = Decimal('30.00')
+            self.service.save()
+            # Until the write commits, other readers still see the old row
+            assert self.client.get(url)['ETag'] == etag
+        response = self.client.get(url)
+
+        assert response['X-Cache'] == 'miss'
+        assert response['ETag'] != etag
+        assert response.data['hourly_rate'] == '30.00'
+
+    def test_rating_changes_invalidate_services(self, django_capture_on_commit_callbacks):
+        url = reverse('servicelisting-detail', args=[self.service.id])
+        assert self.client.get(url).data['provider_rating'] == 0
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Review.objects.create(
+                project=self.project,
+                reviewer=self.customer,
+                reviewee=self.assembler,
+                rating=4,
+                comment='Good'
+            )
+
+        assert self.client.get(url).data['provider_rating'] == 4.0
+
+    def test_unrelated_writes_keep_entries(self):
+        url = reverse('projectlisting-list')
+        self.client.get(url)
+        ServiceListing.objects.create(
+            provider=self.assembler,
+            title='Another service',
+            description='More assembly',
+            hourly_rate=Decimal('20.00')
+        )
+        # Logging in only touches last_login
+        self.customer.save(update_fields=['last_login'])
+
+        assert self.client.get(url)['X-Cache'] == 'hit'
+
+    def test_revalidation(self, django_assert_num_queries, django_capture_on_commit_callbacks):
+        url = reverse('review-for-user')
+        params = {'user_id': self.assembler.id}
+        first = self.client.get(url, params)
+
+        with django_assert_num_queries(0):
+            by_etag = self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+            by_date = self.client.get(url, params, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+
+        assert by_etag.status_code == status.HTTP_304_NOT_MODIFIED
+        assert by_etag['ETag'] == first['ETag']
+        assert by_date.status_code == status.HTTP_304_NOT_MODIFIED
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Review.objects.create(
+                project=self.project,
+                reviewer=self.customer,
+                reviewee=self.assembler,
+                rating=5,
+                comment='Great'
+            )
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 1
+
+    def test_errors_are_not_cached(self):
+        url = reverse('review-for-user')
+        self.client.get(url)
+
+        assert self.client.get(url).status_code == status.HTTP_400_BAD_REQUEST
+        assert 'X-Cache' not in self.client.get(url)
+
+    def test_missing_objects_are_not_revalidated(self):
+        missing = reverse('servicelisting-detail', args=[self.service.id + 100])
+        future = 'Fri, 01 Jan 2100 00:00:00 GMT'
+
+        assert self.client.get(missing, HTTP_IF_NONE_MATCH='*').status_code == status.HTTP_404_NOT_FOUND
+        assert self.client.get(missing, HTTP_IF_MODIFIED_SINCE=future).status_code == status.HTTP_404_NOT_FOUND
+
+        url = reverse('servicelisting-detail', args=[self.service.id])
+        assert self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code == status.HTTP_304_NOT_MODIFIED
+        assert self.client.get(url, HTTP_IF_MODIFIED_SINCE=future).status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_generations_outlive_responses(self):
+        url = reverse('servicelisting-list')
+        etag = self.client.get(url)['ETag']
+        response_cache().clear()
+        response = self.client.get(url)
+
+        assert response['X-Cache'] == 'miss'
+        assert response['ETag'] == etag
+
+    def test_reconcile_ratings_invalidates(self):
+        url = reverse('servicelisting-detail', args=[self.service.id])
+        # bulk_create skips the signals that keep the totals in step
+        Review.objects.bulk_create([Review(
+            project=self.project,
+            reviewer=self.customer,
+            reviewee=self.assembler,
+            rating=4,
+            comment='Good'
+        )])
+        assert self.client.get(url).data['provider_rating'] == 0
+
+        call_command('reconcile_ratings', stdout=StringIO())
+
+        assert self.client.get(url).data['provider_rating'] == 4.0
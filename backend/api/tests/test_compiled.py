@@ -0,0 +1,149 @@
+import datetime
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ServiceListing, ProjectListing, Review
+from api.serializers import ServiceListingSerializer, ProjectListingSerializer, ReviewSerializer, MessageSerializer
+from api.compiled import compile_serializer
+from api.renderers import FastJSONRenderer
+from api.cache import response_cache
+from api import views
+
+@pytest.mark.django_db
+class TestCompiledSerializers:
+    def setup_method(self):
+        response_cache().clear()
+        self.client = APIClient()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+        self.assembler = User.objects.create_user(
+            username='assembler_ü',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.assembler, is_assembler=True, rating_sum=14, rating_count=3,
+                               average_rating=14 / 3)
+        # No profile: provider_rating is null
+        self.newcomer = User.objects.create_user(
+            username='newcomer',
+            email='newcomer@example.com',
+            password='strongpassword'
+        )
+
+        ServiceListing.objects.create(
+            provider=self.assembler,
+            title='Assembly \u2028 "quoted" \\ <b>',
+            description='Flat-pack, emoji \U0001f6e0 and control \x01',
+            hourly_rate=Decimal('25.5'),
+            experience_years=4
+        )
+        ServiceListing.objects.create(
+            provider=self.newcomer,
+            title='Cheap',
+            description='',
+            hourly_rate=Decimal('9999.99'),
+            is_available=False
+        )
+        self.open = ProjectListing.objects.create(
+            creator=self.customer,
+            title='Desk',
+            description='Desk \u2028 and \u2029',
+            furniture_type='Desk',
+            location='Leeds',
+            budget=Decimal('0.10')
+        )
+        done = ProjectListing.objects.create(
+            creator=self.customer,
+            title='Bed',
+            description='Bed',
+            furniture_type='Bed',
+            location='York',
+            budget=Decimal('120'),
+            status='completed',
+            assigned_to=self.assembler
+        )
+        # A timestamp without microseconds formats differently
+        ProjectListing.objects.filter(pk=done.pk).update(
+            created_at=datetime.datetime(2024, 3, 31, 1, 30, tzinfo=datetime.timezone.utc)
+        )
+        Review.objects.create(
+            project=done,
+            reviewer=self.customer,
+            reviewee=self.assembler,
+            rating=5,
+            comment='Great'
+        )
+
+    def assert_identical(self, serializer_class, queryset):
+        compiled = compile_serializer(serializer_class)
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        actual = FastJSONRenderer().render(compiled.serialize(compiled.values(queryset)))
+
+        assert actual == expected
+
+    def test_compiled_output_is_byte_identical(self):
+        for serializer_class, model in (
+            (ServiceListingSerializer, ServiceListing),
+            (ProjectListingSerializer, ProjectListing),
+            (ReviewSerializer, Review),
+        ):
+            self.assert_identical(serializer_class, model.objects.order_by('id'))
+            with timezone.override('Europe/London'):
+                self.assert_identical(serializer_class, model.objects.order_by('id'))
+
+    def test_endpoints_are_byte_identical(self, monkeypatch):
+        self.client.force_authenticate(user=self.customer)
+        requests = [
+            (reverse('servicelisting-list'), {}),
+            (reverse('servicelisting-list'), {'ordering': 'hourly_rate', 'page_size': 1}),
+            (reverse('projectlisting-list'), {'search': 'desk'}),
+            (reverse('projectlisting-list'), {'near': '53.8,-1.55', 'radius_km': 50}),
+            (reverse('projectlisting-my-projects'), {'page_size': 1}),
+            (reverse('review-for-user'), {'user_id': self.assembler.id}),
+        ]
+        compiled = [self.client.get(url, params).content for url, params in requests]
+
+        response_cache().clear()
+        monkeypatch.setattr(views.PaginatedActionMixin, 'compile_serializers', False)
+        monkeypatch.setattr(FastJSONRenderer, 'render', JSONRenderer.render)
+        regular = [self.client.get(url, params).content for url, params in requests]
+
+        assert compiled == regular
+
+    def test_cursor_pages_with_compiled_rows(self):
+        response = self.client.get(reverse('servicelisting-list'), {'ordering': '-hourly_rate', 'page_size': 1})
+        first = response.json()
+        second = self.client.get(first['next']).json()
+
+        assert [item['title'] for item in first['results'] + second['results']] == [
+            'Cheap', 'Assembly \u2028 "quoted" \\ <b>'
+        ]
+        assert second['next'] is None
+
+    def test_unsupported_serializers_are_not_compiled(self):
+        assert compile_serializer(MessageSerializer) is None
+
+    def test_exponent_floats_fall_back_to_json(self):
+        data = {'score': 1e-05, 'large': 1e16, 'text': 'line \u2028'}
+
+        assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+
+    def test_non_finite_floats_are_refused_like_json(self):
+        for value in (float('nan'), float('inf'), float('-inf')):
+            data = {'results': [{'score': value, 'distance_km': None}]}
+            with pytest.raises(ValueError):
+                JSONRenderer().render(data)
+            with pytest.raises(ValueError):
+                FastJSONRenderer().render(data)
+
+        data = {'score': 0.5, 'distance_km': None}
+        assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
@@ -0,0 +1,118 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ServiceListing, ProjectListing, Message, Conversation
+from api.cache import response_cache
+
+@pytest.mark.django_db
+class TestDashboard:
+    def setup_method(self):
+        response_cache().clear()
+        self.client = APIClient()
+
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.assembler, is_assembler=True)
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.other, is_assembler=True)
+
+        ServiceListing.objects.create(
+            provider=self.assembler,
+            title='Furniture Assembly',
+            description='Flat-pack furniture',
+            hourly_rate=Decimal('25.00')
+        )
+        for i in range(7):
+            ProjectListing.objects.create(
+                creator=self.customer,
+                title=f'Project {i}',
+                description='Assembly',
+                furniture_type='Bed',
+                location='Leeds',
+                budget=Decimal('60.00'),
+                status='in_progress',
+                assigned_to=self.assembler
+            )
+        Message.objects.create(sender=self.customer, receiver=self.assembler, content='Hello')
+        self.client.force_authenticate(user=self.assembler)
+
+    def dashboard(self, **headers):
+        return self.client.get(reverse('dashboard'), **headers)
+
+    def test_sections(self):
+        data = self.dashboard().data
+
+        assert data['profile']['username'] == 'assembler'
+        assert data['projects']['created'] == []
+        assert [item['title'] for item in data['projects']['assigned']] == [f'Project {i}' for i in (6, 5, 4, 3, 2)]
+        assert data['projects']['assigned'][0]['creator_name'] == 'customer'
+        assert [item['title'] for item in data['services']] == ['Furniture Assembly']
+        assert data['unread_count'] == 1
+        assert data['conversations'][0]['user']['username'] == 'customer'
+        assert data['conversations'][0]['unread_count'] == 1
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+
+        assert self.dashboard().status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_cached_per_user(self):
+        first = self.dashboard()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.dashboard()
+
+        assert len(queries) == 0
+        assert second['X-Cache'] == 'hit'
+        assert second.data == first.data
+        assert self.dashboard(HTTP_IF_NONE_MATCH=first['ETag']).status_code == status.HTTP_304_NOT_MODIFIED
+
+        # Another user's writes leave the entry alone
+        ServiceListing.objects.create(
+            provider=self.other,
+            title='Other service',
+            description='Flat-pack furniture',
+            hourly_rate=Decimal('20.00')
+        )
+        assert self.dashboard()['X-Cache'] == 'hit'
+
+        # Customers see their own view
+        self.client.force_authenticate(user=self.customer)
+        assert self.dashboard().data['profile']['username'] == 'customer'
+
+    def test_own_changes_invalidate(self, django_capture_on_commit_callbacks):
+        def committed(write):
+            with django_capture_on_commit_callbacks(execute=True):
+                write()
+
+        self.dashboard()
+        committed(lambda: ProjectListing.objects.filter(title='Project 6').get().delete())
+        assert self.dashboard()['X-Cache'] == 'miss'
+
+        committed(lambda: Message.objects.create(sender=self.other, receiver=self.assembler, content='Hi'))
+        assert self.dashboard().data['unread_count'] == 2
+
+        committed(lambda: Conversation.mark_read(self.assembler.id, self.other.id))
+        assert self.dashboard().data['unread_count'] == 1
+
+        project = ProjectListing.objects.filter(title='Project 5').get()
+        project.assigned_to = self.other
+        committed(project.save)
+        assert 'Project 5' not in [item['title'] for item in self.dashboard().data['projects']['assigned']]
@@ -0,0 +1,79 @@
+import pytest
+from datetime import timedelta
+from io import StringIO
+from django.db.models import F
+from django.utils import timezone
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth.models import User
+from api.models import Profile, ServiceListing, ProjectListing, Message, Conversation, Review
+from api.management.commands.load_test import percentile
+
+@pytest.mark.django_db(transaction=True)
+class TestDatasetCommands:
+    def generate(self, **options):
+        out = StringIO()
+        call_command('generate_dataset', users=60, seed=1, batch_size=25, stdout=out, **options)
+        return out.getvalue()
+
+    def test_generate_dataset(self):
+        output = self.generate()
+
+        assert 'Dataset generated.' in output
+        assert User.objects.filter(username__startswith='gen_').count() == 60
+        assert Profile.objects.count() == 60
+        assert ServiceListing.objects.exists()
+        assert set(ProjectListing.objects.values_list('status', flat=True)) == {
+            'open', 'in_progress', 'completed', 'cancelled'
+        }
+        assert Review.objects.exists()
+        assert not ProjectListing.objects.filter(status='completed', assigned_to__isnull=True).exists()
+
+        # Derived data is rebuilt after the bulk inserts
+        pairs = {frozenset(pair) for pair in Message.objects.values_list('sender_id', 'receiver_id')}
+        assert Conversation.objects.count() == len(pairs)
+        profile = Profile.objects.filter(rating_count__gt=0).first()
+        ratings = Review.objects.filter(reviewee=profile.user).values_list('rating', flat=True)
+        assert profile.rating_sum == sum(ratings)
+        assert Profile.objects.filter(latitude__isnull=False).count() == 60
+
+    def test_timestamps_are_spread(self):
+        self.generate(days=30)
+        now = timezone.now()
+
+        for model in (ProjectListing, ServiceListing, Message, Review):
+            dates = model.objects.values_list('created_at', flat=True)
+            assert min(dates) > now - timedelta(days=31)
+            assert max(dates) - min(dates) > timedelta(days=7)
+            assert max(dates) <= now
+        assert not ProjectListing.objects.filter(created_at__lt=F('creator__date_joined')).exists()
+        assert not Message.objects.filter(created_at__lt=F('sender__date_joined')).exists()
+
+    def test_existing_prefix_requires_clear(self):
+        self.generate()
+
+        with pytest.raises(CommandError):
+            self.generate()
+        self.generate(clear=True)
+
+        assert User.objects.filter(username__startswith='gen_').count() == 60
+
+    def test_load_test_reports_percentiles(self):
+        self.generate()
+        out = StringIO()
+        # One worker: the in-memory SQLite test database locks under concurrent writers
+        call_command('load_test', scenarios=60, concurrency=1, seed=1, users=30, stdout=out)
+        output = out.getvalue()
+
+        assert 'p95 ms' in output
+        assert 'projects list' in output
+        assert output.strip().endswith(', 0 errors.')
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+
+        assert percentile(values, 0.50) == 50
+        assert percentile(values, 0.95) == 95
+        assert percentile(values, 0.99) == 99
+        assert percentile([1, 2], 0.50) == 1
+        assert percentile([], 0.50) == 0.0
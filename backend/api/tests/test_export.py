@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ServiceListing, ProjectListing, Review
+from api import views
+
+@pytest.mark.django_db
+class TestExport:
+    def setup_method(self):
+        self.client = APIClient()
+
+        self.staff = User.objects.create_user(
+            username='ops',
+            email='ops@example.com',
+            password='strongpassword',
+            is_staff=True
+        )
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.assembler, is_assembler=True)
+
+        self.projects = []
+        for i, furniture_type in enumerate(['Desk', 'Bed', 'Desk', 'Wardrobe', 'Desk']):
+            self.projects.append(ProjectListing.objects.create(
+                creator=self.customer,
+                title=f'{furniture_type} {i}',
+                description='Needs assembling, "quoted", with commas',
+                furniture_type=furniture_type,
+                location='Leeds',
+                budget=Decimal('50.00') + i,
+                status='completed',
+                assigned_to=self.assembler
+            ))
+        ServiceListing.objects.create(
+            provider=self.assembler,
+            title='Assembly',
+            description='Flat-pack',
+            hourly_rate=Decimal('25.00')
+        )
+        Review.objects.create(
+            project=self.projects[0],
+            reviewer=self.customer,
+            reviewee=self.assembler,
+            rating=5,
+            comment='Great'
+        )
+
+        self.client.force_authenticate(user=self.staff)
+
+    def export(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        response, body = self.export('projectlisting-export', furniture_type='Desk', ordering='budget')
+        rows = list(csv.DictReader(io.StringIO(body)))
+
+        assert response['Content-Type'].startswith('text/csv')
+        assert 'projectlisting-export.csv' in response['Content-Disposition']
+        assert [row['title'] for row in rows] == ['Desk 0', 'Desk 2', 'Desk 4']
+        assert rows[0]['description'] == 'Needs assembling, "quoted", with commas'
+        assert rows[0]['assigned_to_name'] == 'assembler'
+
+    def test_csv_export_neutralises_formulas(self):
+        formulas = ['=HYPERLINK("http://example.com")', '+1', '-2+3', '@SUM(A1)', '\tcmd']
+        for project, title in zip(self.projects, formulas):
+            ProjectListing.objects.filter(pk=project.pk).update(title=title, description='\rcmd')
+
+        response, body = self.export('projectlisting-export', ordering='budget')
+        rows = list(csv.DictReader(io.StringIO(body)))
+
+        assert [row['title'] for row in rows] == ["'" + title for title in formulas]
+        assert rows[0]['description'] == "'\rcmd"
+        assert rows[0]['budget'] == '50.00'
+
+        response, body = self.export('projectlisting-export', file_format='ndjson', ordering='budget')
+        assert json.loads(body.splitlines()[0])['title'] == formulas[0]
+
+    def test_ndjson_export_with_search(self):
+        response, body = self.export('projectlisting-export', file_format='ndjson', search='wardrobe')
+        rows = [json.loads(line) for line in body.splitlines()]
+
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert [row['title'] for row in rows] == ['Wardrobe 3']
+
+    def test_service_and_review_exports(self):
+        _, services = self.export('servicelisting-export', file_format='ndjson')
+        _, reviews = self.export('review-export')
+
+        assert json.loads(services)['provider_name'] == 'assembler'
+        assert list(csv.DictReader(io.StringIO(reviews)))[0]['project_title'] == 'Desk 0'
+
+    def test_export_streams_in_chunks(self, monkeypatch):
+        monkeypatch.setattr(views.ProjectListingViewSet, 'export_chunk_size', 2)
+        budget = views.ProjectListingViewSet.query_budgets['export']
+
+        with CaptureQueriesContext(connection) as queries:
+            _, body = self.export('projectlisting-export', file_format='ndjson')
+
+        assert len(body.splitlines()) == 5
+        assert len(queries) <= budget
+
+    def test_invalid_format(self):
+        response = self.client.get(reverse('projectlisting-export'), {'file_format': 'xml'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_export_requires_staff(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('projectlisting-export'))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,97 @@
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ProjectListing
+from api.geo import covering_cells, geocode, geohash_encode
+
+# Manchester city centre
+NEAR_MANCHESTER = '53.4794,-2.2453'
+
+class TestGeocoding:
+    def test_free_text_locations_resolve(self):
+        assert geocode('London, UK') == geocode('london')
+        assert geocode('Central Leeds') == geocode('Leeds')
+        assert geocode('Kingston upon Hull, England') == geocode('Hull')
+        assert geocode('Atlantis') is None
+        assert geocode('') is None
+
+    def test_geohash(self):
+        # Reference value for the geohash algorithm
+        assert geohash_encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+
+    def test_covering_cells_contain_nearby_points(self):
+        latitude, longitude = geocode('Manchester')
+        cells = covering_cells(latitude, longitude, 15)
+        salford = geohash_encode(*geocode('Salford'))
+
+        assert len(cells) <= 9
+        assert any(salford.startswith(cell) for cell in cells)
+
+@pytest.mark.django_db
+class TestProximitySearch:
+    def setup_method(self):
+        self.client = APIClient()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer, location='Manchester, UK')
+
+        self.stockport = self.create_project('Stockport')
+        self.salford = self.create_project('Salford, Greater Manchester')
+        self.leeds = self.create_project('Leeds')
+        self.unknown = self.create_project('Somewhere remote')
+
+    def create_project(self, location):
+        return ProjectListing.objects.create(
+            creator=self.customer,
+            title=f'Project in {location}',
+            description='Sofa assembly',
+            furniture_type='Sofa',
+            location=location,
+            budget=Decimal('90.00'),
+            status='open'
+        )
+
+    def test_coordinates_are_stored_on_write(self):
+        assert (self.leeds.latitude, self.leeds.longitude) == geocode('Leeds')
+        assert self.leeds.geohash == geohash_encode(*geocode('Leeds'))
+        assert self.unknown.geohash is None
+
+        self.unknown.location = 'York'
+        self.unknown.save(update_fields=['location'])
+        self.unknown.refresh_from_db()
+        assert self.unknown.geohash == geohash_encode(*geocode('York'))
+
+    def test_projects_within_radius_ordered_by_distance(self):
+        url = reverse('projectlisting-list')
+        response = self.client.get(url, {'near': NEAR_MANCHESTER, 'radius_km': 15})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [item['id'] for item in response.data] == [self.salford.id, self.stockport.id]
+
+        response = self.client.get(url, {'near': NEAR_MANCHESTER, 'radius_km': 60})
+        assert [item['id'] for item in response.data] == [self.salford.id, self.stockport.id, self.leeds.id]
+
+    def test_profiles_near(self):
+        self.client.force_authenticate(user=self.customer)
+        assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=assembler, location='Glasgow', is_assembler=True)
+
+        response = self.client.get(reverse('profile-list'), {'near': NEAR_MANCHESTER})
+        assert [item['username'] for item in response.data] == ['customer']
+
+    def test_invalid_parameters(self):
+        url = reverse('projectlisting-list')
+        assert self.client.get(url, {'near': 'north'}).status_code == status.HTTP_400_BAD_REQUEST
+        assert self.client.get(url, {'near': '91,0'}).status_code == status.HTTP_400_BAD_REQUEST
+        assert self.client.get(url, {'near': NEAR_MANCHESTER, 'radius_km': -1}).status_code == status.HTTP_400_BAD_REQUEST
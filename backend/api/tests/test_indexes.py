@@ -0,0 +1,110 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ServiceListing, ProjectListing, Review
+from api.cache import response_cache
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Small test tables would otherwise always be scanned
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+        else:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+@pytest.mark.django_db
+class TestAccessPathIndexes:
+    def setup_method(self):
+        response_cache().clear()
+        self.client = APIClient()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.assembler, is_assembler=True)
+        ServiceListing.objects.create(
+            provider=self.assembler,
+            title='Assembly',
+            description='Flat-pack',
+            hourly_rate=Decimal('25.00')
+        )
+        self.project = ProjectListing.objects.create(
+            creator=self.customer,
+            title='Desk assembly',
+            description='Desk',
+            furniture_type='Desk',
+            location='Leeds',
+            budget=Decimal('50.00'),
+            status='completed',
+            assigned_to=self.assembler
+        )
+
+    def plans(self, method, url, data=None, table=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        assert response.status_code < 400, response.content
+        return [
+            explain(query['sql']) for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']
+        ]
+
+    def assert_uses_index(self, index, method, url, data=None, table='api_projectlisting'):
+        plans = self.plans(method, url, data, table)
+        assert plans
+        assert any(index in plan for plan in plans), plans
+        for plan in plans:
+            # Neither a full table scan nor a sort of the whole result
+            assert f'SCAN {table}\n' not in f'{plan}\n' and 'TEMP B-TREE' not in plan, plan
+            assert 'Seq Scan' not in plan and 'Sort' not in plan, plan
+
+    def test_project_feeds(self):
+        self.assert_uses_index('project_created_idx', 'get', reverse('projectlisting-list'))
+        self.assert_uses_index('project_open_created_idx', 'get', reverse('projectlisting-list'), {'status': 'open'})
+        self.assert_uses_index('project_created_idx', 'get', reverse('projectlisting-list'), {'status': 'completed'})
+
+    def test_own_projects(self):
+        self.client.force_authenticate(user=self.customer)
+        self.assert_uses_index('project_creator_created_idx', 'get', reverse('projectlisting-my-projects'))
+        self.client.force_authenticate(user=self.assembler)
+        self.assert_uses_index('project_assignee_created_idx', 'get', reverse('projectlisting-assigned-to-me'))
+
+    def test_service_listings(self):
+        table = 'api_servicelisting'
+        self.assert_uses_index('service_created_idx', 'get', reverse('servicelisting-list'), table=table)
+        self.assert_uses_index(
+            'service_available_rate_idx', 'get', reverse('servicelisting-list'),
+            {'is_available': 'true', 'ordering': 'hourly_rate'}, table=table
+        )
+        self.client.force_authenticate(user=self.assembler)
+        self.assert_uses_index('service_provider_created_idx', 'get', reverse('servicelisting-my-services'), table=table)
+
+    def test_reviews(self):
+        self.assert_uses_index(
+            'review_reviewee_created_idx', 'get', reverse('review-for-user'), {'user_id': self.assembler.id},
+            table='api_review'
+        )
+        self.client.force_authenticate(user=self.customer)
+        plans = self.plans('post', reverse('review-list'), {
+            'project': self.project.id,
+            'reviewee': self.assembler.id,
+            'rating': 5,
+            'comment': 'Great'
+        }, table='api_review')
+
+        assert Review.objects.count() == 1
+        assert any('review_project_reviewer_idx' in plan for plan in plans), plans
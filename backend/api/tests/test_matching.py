@@ -0,0 +1,134 @@
+import pytest
+from django.db import connection
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ServiceListing, ProjectListing, Review
+from api.matching import assembler_features
+from api import matching
+
+@pytest.mark.django_db
+class TestAssemblerMatching:
+    def setup_method(self):
+        self.client = APIClient()
+        assembler_features.invalidate()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer, location='London')
+
+        self.project = ProjectListing.objects.create(
+            creator=self.customer,
+            title='Wardrobe assembly',
+            description='Large wardrobe',
+            furniture_type='Wardrobe',
+            location='London',
+            budget=Decimal('90.00'),
+            status='open'
+        )
+
+        self.local = self.create_assembler('local', 'London', Decimal('25.00'), 5)
+        self.distant = self.create_assembler('distant', 'Manchester', Decimal('25.00'), 5)
+        self.expensive = self.create_assembler('expensive', 'London', Decimal('120.00'), 5)
+        self.busy = self.create_assembler('busy', 'London', Decimal('25.00'), 5, is_available=False)
+
+        self.client.force_authenticate(user=self.customer)
+
+    def create_assembler(self, username, location, hourly_rate, experience_years, is_available=True):
+        user = User.objects.create_user(
+            username=username,
+            email=f'{username}@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=user, is_assembler=True, location=location)
+        ServiceListing.objects.create(
+            provider=user,
+            title=f'{username} assembly',
+            description='Flat-pack furniture',
+            hourly_rate=hourly_rate,
+            experience_years=experience_years,
+            is_available=is_available
+        )
+        return user
+
+    def candidates(self, **params):
+        response = self.client.get(reverse('projectlisting-candidates', args=[self.project.id]), params)
+        assert response.status_code == status.HTTP_200_OK
+        return response.data
+
+    def test_candidates_are_ranked(self):
+        data = self.candidates()
+
+        assert [item['user'] for item in data] == [
+            self.local.id, self.distant.id, self.expensive.id, self.busy.id
+        ]
+        assert data[0]['username'] == 'local'
+        assert data[0]['distance_km'] < 1
+        assert data[1]['distance_km'] > 200
+        assert data[3]['is_available'] is False
+
+    def test_limit(self):
+        assert [item['user'] for item in self.candidates(limit=1)] == [self.local.id]
+
+    def test_customers_are_not_candidates(self):
+        ids = {item['user'] for item in self.candidates()}
+
+        assert self.customer.id not in ids
+
+    def test_index_follows_writes(self):
+        self.candidates()
+
+        # Reviews and service changes are picked up without a rebuild
+        Review.objects.create(
+            project=self.project,
+            reviewer=self.customer,
+            reviewee=self.busy,
+            rating=5,
+            comment='Great'
+        )
+        ServiceListing.objects.filter(provider=self.busy).update(is_available=True)
+        ServiceListing.objects.get(provider=self.local).delete()
+        newcomer = self.create_assembler('newcomer', 'London', Decimal('20.00'), 10)
+
+        ids = [item['user'] for item in self.candidates()]
+
+        assert ids[:2] == [newcomer.id, self.busy.id]
+        assert ids[-1] == self.local.id
+
+    def test_only_creator_sees_candidates(self):
+        self.client.force_authenticate(user=self.local)
+        response = self.client.get(reverse('projectlisting-candidates', args=[self.project.id]))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_other_processes_are_polled_at_intervals(self, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(matching.time, 'monotonic', lambda: clock[0])
+        self.candidates()
+        # A save by another process: no signal reaches this one
+        ServiceListing.objects.filter(provider=self.busy).update(is_available=True, updated_at=timezone.now())
+
+        with CaptureQueriesContext(connection) as queries:
+            ids = [item['user'] for item in self.candidates()]
+        assert not [query for query in queries if 'api_servicelisting' in query['sql']]
+        assert ids[-1] == self.busy.id
+
+        clock[0] += 6
+        ids = [item['user'] for item in self.candidates()]
+        assert ids[-1] != self.busy.id
+
+    def test_rebuilds_do_not_block_readers(self):
+        table = assembler_features.refresh()
+        assembler_features.invalidate()
+
+        # While another thread holds the update lock, callers keep the current table
+        with assembler_features.update_lock:
+            assert assembler_features.refresh() is table
+        assert assembler_features.refresh() is not table
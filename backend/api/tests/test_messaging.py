@@ -0,0 +1,322 @@
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from api.models import Profile, Message, Conversation, UnreadCounter
+
+@pytest.mark.django_db
+class TestConversationInbox:
+    def setup_method(self):
+        self.client = APIClient()
+
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.assembler, is_assembler=True)
+
+        self.customers = []
+        for i in range(3):
+            customer = User.objects.create_user(
+                username=f'customer{i}',
+                email=f'customer{i}@example.com',
+                password='strongpassword'
+            )
+            Profile.objects.create(user=customer)
+            self.customers.append(customer)
+
+    def send(self, sender, receiver, content='Hello'):
+        return Message.objects.create(sender=sender, receiver=receiver, content=content)
+
+    def test_summary_is_updated_on_write(self):
+        customer = self.customers[0]
+        self.send(customer, self.assembler, 'Can you build a wardrobe?')
+        reply = self.send(self.assembler, customer, 'Yes, on Friday.')
+        self.send(customer, self.assembler, 'Great')
+        latest = self.send(customer, self.assembler, 'See you then')
+
+        conversation = Conversation.for_users(customer.id, self.assembler.id).get()
+        assert conversation.last_message == latest
+        assert conversation.last_activity == latest.created_at
+        assert conversation.unread_for(self.assembler.id) == 3
+        assert conversation.unread_for(customer.id) == 1
+        assert conversation.other_user(customer.id) == self.assembler
+        assert reply.id < latest.id
+
+    def test_inbox_lists_latest_conversation_first(self):
+        for customer in self.customers:
+            self.send(customer, self.assembler, f'Hi from {customer.username}')
+        self.send(self.assembler, self.customers[0], 'Reply')
+
+        self.client.force_authenticate(user=self.assembler)
+        url = reverse('message-conversations')
+        response = self.client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [item['user']['username'] for item in response.data] == ['customer0', 'customer2', 'customer1']
+        assert response.data[0]['latest_message']['content'] == 'Reply'
+        assert response.data[0]['unread_count'] == 1
+        assert response.data[1]['unread_count'] == 1
+
+    def test_inbox_after_deletes(self):
+        first, second = self.customers[:2]
+        self.send(first, self.assembler, 'Kept')
+        self.send(first, self.assembler, 'Deleted').delete()
+        self.send(second, self.assembler, 'Only message').delete()
+
+        self.client.force_authenticate(user=self.assembler)
+        response = self.client.get(reverse('message-conversations'))
+
+        assert [item['user']['username'] for item in response.data] == ['customer0']
+        assert response.data[0]['latest_message']['content'] == 'Kept'
+        assert response.data[0]['unread_count'] == 1
+        assert UnreadCounter.objects.get(user=self.assembler).count == 1
+
+    def test_inbox_query_count_does_not_grow(self, django_assert_max_num_queries):
+        for customer in self.customers:
+            for _ in range(3):
+                self.send(customer, self.assembler)
+
+        self.client.force_authenticate(user=self.assembler)
+        url = reverse('message-conversations')
+        with django_assert_max_num_queries(1):
+            response = self.client.get(url)
+
+        assert len(response.data) == 3
+
+    def test_rebuild_command(self):
+        customer = self.customers[0]
+        self.send(customer, self.assembler)
+        latest = self.send(self.assembler, customer)
+        Conversation.objects.all().delete()
+
+        call_command('rebuild_conversations', stdout=StringIO())
+
+        conversation = Conversation.for_users(self.assembler.id, customer.id).get()
+        assert conversation.last_message == latest
+        assert conversation.unread_for(self.assembler.id) == 1
+        assert conversation.unread_for(customer.id) == 1
+
+@pytest.mark.django_db
+class TestReadPointer:
+    def setup_method(self):
+        self.client = APIClient()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+        Profile.objects.create(user=self.assembler, is_assembler=True)
+
+        self.messages = [
+            Message.objects.create(sender=self.customer, receiver=self.assembler, content=f'Message {i}')
+            for i in range(5)
+        ]
+
+    def test_reading_a_thread_writes_pointer_and_counter(self):
+        self.client.force_authenticate(user=self.assembler)
+        url = reverse('message-with-user')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'user_id': self.customer.id})
+
+        assert response.status_code == status.HTTP_200_OK
+        writes = [q['sql'] for q in queries if q['sql'].startswith(('UPDATE', 'INSERT', 'DELETE'))]
+        assert [sql.split(' SET ')[0] for sql in writes] == ['UPDATE "api_conversation"', 'UPDATE "api_unreadcounter"']
+        assert all(item['is_read'] for item in response.data)
+
+        conversation = Conversation.for_users(self.customer.id, self.assembler.id).get()
+        assert conversation.unread_for(self.assembler.id) == 0
+        assert conversation.user_b_last_read_id == self.messages[-1].id
+
+    def test_deleting_the_last_message(self):
+        Conversation.mark_read(self.assembler.id, self.customer.id)
+        unread = [Message.objects.create(sender=self.customer, receiver=self.assembler, content=f'New {i}')
+                  for i in range(2)]
+        unread[-1].delete()
+
+        conversation = Conversation.for_users(self.customer.id, self.assembler.id).get()
+        assert conversation.last_message == unread[0]
+        assert conversation.unread_for(self.assembler.id) == 1
+        assert UnreadCounter.objects.get(user=self.assembler).count == 1
+
+        self.client.force_authenticate(user=self.assembler)
+        response = self.client.get(reverse('message-with-user'), {'user_id': self.customer.id, 'limit': 10})
+
+        assert response.data['results'][-1]['id'] == unread[0].id
+        assert all(item['is_read'] for item in response.data['results'])
+        assert Conversation.for_users(self.customer.id, self.assembler.id).get().unread_for(self.assembler.id) == 0
+        assert UnreadCounter.objects.get(user=self.assembler).count == 0
+
+    def test_is_read_is_derived_from_pointer(self):
+        Conversation.mark_read(self.assembler.id, self.customer.id)
+        newer = Message.objects.create(sender=self.customer, receiver=self.assembler, content='Newer')
+
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('message-list'))
+
+        read = {item['id']: item['is_read'] for item in response.data}
+        assert read[newer.id] is False
+        assert all(read[message.id] for message in self.messages)
+
+        inbox = self.client.get(reverse('message-conversations'))
+        assert inbox.data[0]['latest_message']['is_read'] is False
+
+    def test_rebuild_keeps_read_pointers(self):
+        Conversation.mark_read(self.assembler.id, self.customer.id)
+        Message.objects.create(sender=self.customer, receiver=self.assembler, content='Newer')
+
+        call_command('rebuild_conversations', stdout=StringIO())
+
+        conversation = Conversation.for_users(self.customer.id, self.assembler.id).get()
+        assert conversation.unread_for(self.assembler.id) == 1
+        assert conversation.user_b_last_read_id == self.messages[-1].id
+
+@pytest.mark.django_db
+class TestThreadHistory:
+    def setup_method(self):
+        self.client = APIClient()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+        Profile.objects.create(user=self.assembler, is_assembler=True)
+
+        self.messages = []
+        for i in range(6):
+            sender, receiver = (self.customer, self.assembler) if i % 2 else (self.assembler, self.customer)
+            self.messages.append(Message.objects.create(sender=sender, receiver=receiver, content=f'Message {i}'))
+
+        self.client.force_authenticate(user=self.customer)
+        self.url = reverse('message-with-user')
+
+    def ids(self, response):
+        return [item['id'] for item in response.data['results']]
+
+    def test_newest_messages_first_page(self):
+        response = self.client.get(self.url, {'user_id': self.assembler.id, 'limit': 4})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert self.ids(response) == [message.id for message in self.messages[2:]]
+        assert response.data['has_more'] is False
+        assert response.data['previous'] is not None
+
+    def test_before_loads_older_history(self):
+        response = self.client.get(self.url, {'user_id': self.assembler.id, 'limit': 4})
+        older = self.client.get(response.data['previous'])
+
+        assert self.ids(older) == [message.id for message in self.messages[:2]]
+        assert older.data['previous'] is None
+
+    def test_after_returns_only_new_messages(self):
+        response = self.client.get(self.url, {'user_id': self.assembler.id, 'limit': 10})
+        poll = response.data['next']
+
+        assert self.ids(self.client.get(poll)) == []
+
+        newer = Message.objects.create(sender=self.assembler, receiver=self.customer, content='New')
+        assert self.ids(self.client.get(poll)) == [newer.id]
+
+    def test_truncated_pages_leave_the_thread_unread(self):
+        self.client.get(self.url, {'user_id': self.assembler.id, 'limit': 10})
+        newer = [Message.objects.create(sender=self.assembler, receiver=self.customer, content=f'New {i}')
+                 for i in range(3)]
+
+        partial = self.client.get(self.url, {'user_id': self.assembler.id, 'after': self.messages[-1].id, 'limit': 2})
+        assert self.ids(partial) == [message.id for message in newer[:2]]
+        assert partial.data['has_more'] is True
+        assert Conversation.for_users(self.customer.id, self.assembler.id).get().unread_for(self.customer.id) == 3
+
+        rest = self.client.get(partial.data['next'])
+        assert self.ids(rest) == [newer[2].id]
+        assert all(item['is_read'] for item in rest.data['results'] if item['receiver'] == self.customer.id)
+        assert Conversation.for_users(self.customer.id, self.assembler.id).get().unread_for(self.customer.id) == 0
+
+    def test_legacy_clients_get_a_list(self):
+        response = self.client.get(self.url, {'user_id': self.assembler.id})
+
+        assert [item['id'] for item in response.data] == [message.id for message in self.messages]
+
+@pytest.mark.django_db
+class TestUnreadCounter:
+    def setup_method(self):
+        self.client = APIClient()
+
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        self.customers = [
+            User.objects.create_user(username=f'customer{i}', password='strongpassword') for i in range(2)
+        ]
+        for customer in self.customers:
+            for i in range(2):
+                Message.objects.create(sender=customer, receiver=self.assembler, content=f'Message {i}')
+        Message.objects.create(sender=self.assembler, receiver=self.customers[0], content='Reply')
+        self.client.force_authenticate(user=self.assembler)
+
+    def badge(self, **headers):
+        return self.client.get(reverse('message-unread-count'), **headers)
+
+    def test_counter_follows_writes_and_reads(self):
+        assert UnreadCounter.objects.get(user=self.assembler).count == 4
+        assert UnreadCounter.objects.get(user=self.customers[0]).count == 1
+
+        Conversation.mark_read(self.assembler.id, self.customers[0].id)
+        assert UnreadCounter.objects.get(user=self.assembler).count == 2
+        # Nothing unread: no change
+        Conversation.mark_read(self.assembler.id, self.customers[0].id)
+        assert UnreadCounter.objects.get(user=self.assembler).count == 2
+
+    def test_badge_revalidates(self):
+        response = self.badge()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'unread_count': 4}
+        assert 'private' in response['Cache-Control']
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.badge(HTTP_IF_NONE_MATCH=response['ETag'])
+        assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+        assert len(queries) == 1 and 'api_unreadcounter' in queries[0]['sql']
+
+        self.client.get(reverse('message-with-user'), {'user_id': self.customers[1].id})
+        changed = self.badge(HTTP_IF_NONE_MATCH=response['ETag'])
+        assert changed.status_code == status.HTTP_200_OK
+        assert changed.data == {'unread_count': 2}
+
+    def test_users_without_messages(self):
+        self.client.force_authenticate(user=User.objects.create_user(username='new', password='strongpassword'))
+
+        assert self.badge().data == {'unread_count': 0}
+
+    def test_rebuild_restores_counters(self):
+        UnreadCounter.objects.all().delete()
+
+        call_command('rebuild_conversations', stdout=StringIO())
+
+        assert dict(UnreadCounter.objects.values_list('user_id', 'count')) == {
+            self.assembler.id: 4, self.customers[0].id: 1
+        }
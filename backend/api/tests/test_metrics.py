@@ -0,0 +1,121 @@
+import json
+import os
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ServiceListing, ProjectListing
+from api.cache import response_cache
+from api.metrics import Registry, registry
+
+def parse(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+@pytest.mark.django_db
+class TestMetricsEndpoint:
+    def setup_method(self):
+        response_cache().clear()
+        registry.reset()
+        self.client = APIClient()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.assembler, is_assembler=True)
+        ServiceListing.objects.create(
+            provider=self.assembler,
+            title='Assembly',
+            description='Flat-pack',
+            hourly_rate=Decimal('25.00')
+        )
+        self.project = ProjectListing.objects.create(
+            creator=self.customer,
+            title='Desk assembly',
+            description='Desk',
+            furniture_type='Desk',
+            location='Leeds',
+            budget=Decimal('50.00')
+        )
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        return parse(response.content.decode())
+
+    def test_request_and_cache_metrics(self):
+        self.client.get(reverse('servicelisting-list'))
+        self.client.get(reverse('servicelisting-list'))
+        self.client.get(reverse('servicelisting-detail', args=[999]))
+        samples = self.scrape()
+
+        labels = 'action="list",method="GET",route="servicelisting"'
+        assert samples[f'api_requests_total{{{labels},status="200"}}'] == 2
+        assert samples['api_requests_total{action="retrieve",method="GET",route="servicelisting",status="404"}'] == 1
+        assert samples['api_request_duration_seconds_count{action="list",route="servicelisting"}'] == 2
+        assert samples['api_request_duration_seconds_bucket{action="list",le="+Inf",route="servicelisting"}'] == 2
+        assert samples['api_db_queries_total{action="list",route="servicelisting"}'] >= 1
+        assert samples['api_response_cache_total{result="hit"}'] == 1
+        assert samples['api_response_cache_total{result="miss"}'] == 2
+        assert samples['api_db_connections_open'] == 1
+
+    def test_business_counters(self):
+        self.client.force_authenticate(user=self.customer)
+        self.client.post(reverse('message-list'), {'receiver': self.assembler.id, 'content': 'Hello'})
+        response = self.client.patch(
+            reverse('projectlisting-assign', args=[self.project.id]),
+            {'assigned_to': self.assembler.id}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        samples = self.scrape()
+
+        assert samples['api_messages_sent_total'] == 1
+        assert samples['api_projects_assigned_total'] == 1
+        assert samples['api_requests_total{action="assign",method="PATCH",route="projectlisting",status="200"}'] == 1
+
+    def test_remote_scrape_forbidden(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.8')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+class TestMultiprocessRegistry:
+    def test_workers_are_merged(self, tmp_path):
+        first = Registry(directory=tmp_path)
+        second = Registry(directory=tmp_path)
+        for worker, duration in ((first, 0.02), (second, 0.3)):
+            worker.inc('api_messages_sent_total')
+            worker.observe('api_request_duration_seconds', duration, {'route': 'message', 'action': 'list'})
+            worker.flush(force=True)
+        # A worker that has exited keeps its totals but not its gauges
+        (tmp_path / 'metrics-999999999-dead.json').write_text(json.dumps({
+            'pid': 999999999,
+            'counters': [['api_messages_sent_total', [], 5]],
+            'gauges': [['api_db_connections_open', [], 1]],
+            'histograms': [],
+        }))
+        first.set_gauge('api_db_connections_open', 1)
+
+        samples = parse(first.render())
+
+        assert samples['api_messages_sent_total'] == 7
+        assert samples['api_request_duration_seconds_count{action="list",route="message"}'] == 2
+        assert samples['api_request_duration_seconds_bucket{action="list",le="0.025",route="message"}'] == 1
+        assert samples['api_request_duration_seconds_bucket{action="list",le="0.5",route="message"}'] == 2
+        assert samples['api_request_duration_seconds_sum{action="list",route="message"}'] == pytest.approx(0.32)
+        assert samples[f'api_db_connections_open{{pid="{os.getpid()}"}}'] == 1
+        assert len([name for name in samples if name.startswith('api_db_connections_open')]) == 1
@@ -0,0 +1,97 @@
+import json
+import logging
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ServiceListing, Message
+from api.cache import response_cache
+
+def server_timing(response):
+    metrics = {}
+    for entry in response['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+@pytest.mark.django_db
+class TestPerformanceMiddleware:
+    def setup_method(self):
+        response_cache().clear()
+        self.client = APIClient()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.assembler, is_assembler=True)
+        ServiceListing.objects.create(
+            provider=self.assembler,
+            title='Assembly',
+            description='Flat-pack',
+            hourly_rate=Decimal('25.00')
+        )
+        Message.objects.create(sender=self.customer, receiver=self.assembler, content='Hello')
+
+        self.client.force_authenticate(user=self.customer)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('servicelisting-list'))
+        metrics = server_timing(response)
+
+        assert metrics['view']['desc'] == '"ServiceListingViewSet.list"'
+        assert metrics['db']['desc'] == '"1 queries"'
+        assert float(metrics['serialize']['dur']) >= 0
+        assert float(metrics['render']['dur']) >= 0
+        assert float(metrics['total']['dur']) >= float(metrics['db']['dur'])
+
+    def test_custom_actions_are_tagged(self):
+        response = self.client.get(reverse('message-with-user'), {'user_id': self.assembler.id})
+
+        assert server_timing(response)['view']['desc'] == '"MessageViewSet.with_user"'
+
+    def test_sampled_log(self, settings, caplog):
+        settings.PERFORMANCE_LOG_SAMPLE_RATE = 1.0
+        caplog.set_level(logging.INFO, logger='api.performance')
+
+        self.client.get(reverse('profile-me'))
+        self.client.get(reverse('profile-list'))
+
+        records = [json.loads(record.message) for record in caplog.records if record.name == 'api.performance']
+        assert [record['view'] for record in records] == ['ProfileViewSet.me', 'ProfileViewSet.list']
+        assert records[-1]['queries'] == 1
+        assert records[-1]['slowest_query']['sql'].startswith('SELECT')
+        assert records[-1]['duplicate_queries'] == []
+
+    def test_duplicate_queries_are_attributed(self, settings, caplog, monkeypatch):
+        settings.PERFORMANCE_LOG_SAMPLE_RATE = 1.0
+        caplog.set_level(logging.INFO, logger='api.performance')
+        from api import views
+        original = views.ProfileViewSet.me
+
+        def chatty_me(self, request):
+            for _ in range(3):
+                Profile.objects.filter(user=request.user).exists()
+            return original(self, request)
+        monkeypatch.setattr(views.ProfileViewSet, 'me', chatty_me)
+
+        self.client.get(reverse('profile-me'))
+
+        record = json.loads(caplog.records[-1].message)
+        duplicate = record['duplicate_queries'][0]
+        assert duplicate['count'] == 3
+        assert any('test_middleware.py' in frame and 'chatty_me' in frame for frame in duplicate['stacks'][0])
+
+    def test_nothing_is_logged_without_sampling(self, caplog):
+        caplog.set_level(logging.INFO, logger='api.performance')
+        self.client.get(reverse('servicelisting-list'))
+
+        assert not [record for record in caplog.records if record.name == 'api.performance']
@@ -1,4 +1,10 @@
 import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
 from django.contrib.auth.models import User
 from decimal import Decimal
 from api.models import Profile, ServiceListing, ProjectListing, Message, Review
@@ -226,4 +232,149 @@ class TestReview:
         
         # Verify average rating is updated correctly
         assembler_profile.refresh_from_db()
-        assert assembler_profile.average_rating == 4.5  # Average of 4 and 5
\ No newline at end of file
+        assert assembler_profile.average_rating == 4.5  # Average of 4 and 5
+
+@pytest.mark.django_db
+class TestRatingTotals:
+    def setup_method(self):
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+        self.profile = Profile.objects.create(user=self.assembler, is_assembler=True)
+
+    def review(self, rating):
+        project = ProjectListing.objects.create(
+            creator=self.customer,
+            title='Bed Assembly',
+            description='King size bed frame',
+            furniture_type='Bed',
+            location='Bristol',
+            budget=Decimal('60.00'),
+            status='completed',
+            assigned_to=self.assembler
+        )
+        return Review.objects.create(
+            project=project,
+            reviewer=self.customer,
+            reviewee=self.assembler,
+            rating=rating,
+            comment='Review'
+        )
+
+    def test_edit_adjusts_totals(self):
+        self.review(2)
+        review = Review.objects.get(pk=self.review(4).pk)
+        review.rating = 5
+        review.save()
+
+        self.profile.refresh_from_db()
+        assert (self.profile.rating_sum, self.profile.rating_count) == (7, 2)
+        assert self.profile.average_rating == 3.5
+
+    def test_delete_adjusts_totals(self):
+        self.review(2)
+        self.review(4)
+        Review.objects.filter(rating=2).delete()
+
+        self.profile.refresh_from_db()
+        assert (self.profile.rating_sum, self.profile.rating_count) == (4, 1)
+        assert self.profile.average_rating == 4.0
+
+        Review.objects.all().delete()
+        self.profile.refresh_from_db()
+        assert self.profile.rating_count == 0
+        assert self.profile.average_rating == 0.0
+
+    def test_reconcile_fixes_drift(self):
+        self.review(3)
+        self.review(5)
+        Profile.objects.filter(pk=self.profile.pk).update(rating_sum=1, rating_count=9, average_rating=0.1)
+
+        call_command('reconcile_ratings', stdout=StringIO())
+
+        self.profile.refresh_from_db()
+        assert (self.profile.rating_sum, self.profile.rating_count) == (8, 2)
+        assert self.profile.average_rating == 4.0
+
+def updated_columns(queries, table):
+    # The SET clause of each UPDATE on the table
+    return [
+        query['sql'].split(' SET ', 1)[1].split(' WHERE ', 1)[0]
+        for query in queries.captured_queries if query['sql'].startswith(f'UPDATE "{table}"')
+    ]
+
+@pytest.mark.django_db
+class TestDirtyFields:
+    def setup_method(self):
+        self.user = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.user, bio='Hello', location='York')
+        self.project = ProjectListing.objects.create(
+            creator=self.user,
+            title='Desk',
+            description='Desk',
+            furniture_type='Desk',
+            location='York',
+            budget=Decimal('50.00')
+        )
+
+    def test_only_changed_columns_are_written(self):
+        profile = Profile.objects.get(user=self.user)
+        profile.bio = 'Updated'
+        with CaptureQueriesContext(connection) as queries:
+            profile.save()
+
+        assert updated_columns(queries, 'api_profile') == ['"bio" = \'Updated\'']
+        assert Profile.objects.get(user=self.user).bio == 'Updated'
+
+    def test_unchanged_save_writes_nothing(self):
+        project = ProjectListing.objects.get(pk=self.project.pk)
+        project.title = 'Desk'
+        with CaptureQueriesContext(connection) as queries:
+            project.save()
+
+        assert len(queries) == 0
+
+    def test_auto_now_and_derived_columns_follow(self):
+        project = ProjectListing.objects.get(pk=self.project.pk)
+        project.status = 'cancelled'
+        with CaptureQueriesContext(connection) as queries:
+            project.save()
+        columns = updated_columns(queries, 'api_projectlisting')[0]
+
+        assert '"status"' in columns and '"updated_at"' in columns and '"title"' not in columns
+        assert project.saved_value('status') == 'cancelled'
+
+        project.location = 'Leeds'
+        with CaptureQueriesContext(connection) as queries:
+            project.save()
+        columns = updated_columns(queries, 'api_projectlisting')[0]
+
+        assert '"location"' in columns and '"geohash"' in columns and '"status"' not in columns
+
+    def test_update_me_skips_unchanged_user(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(reverse('profile-update-me'), {'bio': 'New bio', 'first_name': ''})
+
+        assert response.status_code == 200
+        assert updated_columns(queries, 'auth_user') == []
+        assert [columns.split(' = ')[0] for columns in updated_columns(queries, 'api_profile')] == ['"bio"']
+
+        with CaptureQueriesContext(connection) as queries:
+            client.patch(reverse('profile-update-me'), {'first_name': 'Ada'})
+
+        assert [columns.split(' = ')[0] for columns in updated_columns(queries, 'auth_user')] == ['"first_name"']
+        assert updated_columns(queries, 'api_profile') == []
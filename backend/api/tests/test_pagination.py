@@ -0,0 +1,131 @@
+import base64
+import json
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.cache import response_cache
+from api.models import Profile, ProjectListing
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    def setup_method(self):
+        response_cache().clear()
+        self.client = APIClient()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer, is_assembler=False)
+
+        # Create more projects than fit on a single page
+        for i in range(7):
+            self.create_project(i)
+
+    def create_project(self, i):
+        return ProjectListing.objects.create(
+            creator=self.customer,
+            title=f'Project {i}',
+            description='Flat-pack assembly',
+            furniture_type='Desk',
+            location='Leeds',
+            budget=Decimal('50.00') + i,
+            status='open'
+        )
+
+    def test_cursor_pages_cover_every_row_once(self):
+        url = reverse('projectlisting-list')
+        response = self.client.get(url, {'page_size': 3})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['previous'] is None
+        seen = [item['id'] for item in response.data['results']]
+
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(item['id'] for item in response.data['results'])
+
+        expected = list(ProjectListing.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        assert seen == expected
+
+    def test_pages_are_stable_under_concurrent_inserts(self):
+        url = reverse('projectlisting-list')
+        first = self.client.get(url, {'page_size': 3})
+        first_ids = [item['id'] for item in first.data['results']]
+
+        # A new project is created between page requests
+        self.create_project(99)
+
+        second = self.client.get(first.data['next'])
+        second_ids = [item['id'] for item in second.data['results']]
+        assert not set(first_ids) & set(second_ids)
+
+        previous = self.client.get(second.data['previous'])
+        assert [item['id'] for item in previous.data['results']] == first_ids
+
+    def test_page_size_is_capped(self, settings):
+        settings.API_MAX_PAGE_SIZE = 2
+        url = reverse('projectlisting-list')
+        response = self.client.get(url, {'page_size': 50})
+
+        assert len(response.data['results']) == 2
+
+    def test_ordering_filter_is_used_as_keyset(self):
+        url = reverse('projectlisting-list')
+        response = self.client.get(url, {'page_size': 4, 'ordering': 'budget'})
+        budgets = [item['budget'] for item in response.data['results']]
+
+        response = self.client.get(response.data['next'])
+        budgets += [item['budget'] for item in response.data['results']]
+        assert budgets == sorted(budgets, key=Decimal)
+        assert len(budgets) == 7
+
+    def test_legacy_list_mode(self, settings):
+        settings.API_PAGINATION_LEGACY_LIST = True
+        settings.API_MAX_PAGE_SIZE = 5
+        url = reverse('projectlisting-list')
+        response = self.client.get(url)
+
+        # Clients that have not opted in still receive a plain list
+        assert isinstance(response.data, list)
+        assert len(response.data) == 5
+        assert 'rel="next"' in response['Link']
+
+    def test_invalid_cursor(self):
+        url = reverse('projectlisting-list')
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_tampered_cursor_values(self):
+        url = reverse('projectlisting-list')
+
+        def cursor(*position):
+            return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+        valid = self.client.get(url, {'page_size': 3}).data['next']
+        assert self.client.get(valid).status_code == status.HTTP_200_OK
+        for position, params in [
+            (([], 1, 0), {}),
+            (({'a': 1}, 1, 0), {}),
+            ((None, 1, 0), {}),
+            (('yesterday', 1, 0), {}),
+            (('2026-01-01T00:00:00+00:00', [1], 0), {}),
+            (('2026-01-01T00:00:00+00:00', 1, {}), {}),
+            ((50, 1, 0), {'ordering': 'budget'}),
+            (('fifty', 1, 0), {'ordering': 'budget'}),
+        ]:
+            response = self.client.get(url, {'cursor': cursor(*position), **params})
+            assert response.status_code == status.HTTP_404_NOT_FOUND, position
+
+    def test_custom_actions_are_paginated(self):
+        self.client.force_authenticate(user=self.customer)
+        url = reverse('projectlisting-my-projects')
+        response = self.client.get(url, {'page_size': 5})
+
+        assert len(response.data['results']) == 5
+        assert response.data['next'] is not None
@@ -0,0 +1,136 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ServiceListing, ProjectListing, Message, Review
+from api.cache import response_cache
+from api import views
+
+def assert_query_budget(client, viewset, action, url, params=None, method='get'):
+    budget = viewset.query_budgets[action]
+    with CaptureQueriesContext(connection) as queries:
+        response = getattr(client, method)(url, params or {})
+    # Savepoints come from the test's own transaction
+    statements = [query['sql'] for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT'))]
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(statements) <= budget, '%s.%s ran %d queries, budget is %d:\n%s' % (
+        viewset.__name__, action, len(statements), budget, '\n'.join(statements)
+    )
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+    def setup_method(self):
+        self.client = APIClient()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+
+        # Several assemblers, so per-row lookups would show up as extra queries
+        self.assemblers = []
+        for i in range(4):
+            assembler = User.objects.create_user(
+                username=f'assembler{i}',
+                email=f'assembler{i}@example.com',
+                password='strongpassword'
+            )
+            Profile.objects.create(user=assembler, is_assembler=True)
+            self.assemblers.append(assembler)
+
+            ServiceListing.objects.create(
+                provider=assembler,
+                title=f'Service {i}',
+                description='Assembly',
+                hourly_rate=Decimal('20.00'),
+                experience_years=i
+            )
+            project = ProjectListing.objects.create(
+                creator=self.customer,
+                title=f'Project {i}',
+                description='Assembly',
+                furniture_type='Chair',
+                location='York',
+                budget=Decimal('40.00'),
+                status='completed',
+                assigned_to=assembler
+            )
+            Review.objects.create(
+                project=project,
+                reviewer=self.customer,
+                reviewee=assembler,
+                rating=4,
+                comment='Good'
+            )
+            Message.objects.create(sender=self.customer, receiver=assembler, content='Hello')
+            Message.objects.create(sender=assembler, receiver=self.customer, content='Hi')
+
+        self.client.force_authenticate(user=self.customer)
+
+    def test_profile_endpoints(self):
+        viewset = views.ProfileViewSet
+        assert_query_budget(self.client, viewset, 'list', reverse('profile-list'))
+        assert_query_budget(self.client, viewset, 'me', reverse('profile-me'))
+        profile = self.assemblers[0].profile
+        assert_query_budget(self.client, viewset, 'retrieve', reverse('profile-detail', args=[profile.id]))
+
+    def test_service_endpoints(self):
+        viewset = views.ServiceListingViewSet
+        assert_query_budget(self.client, viewset, 'list', reverse('servicelisting-list'))
+        service = ServiceListing.objects.first()
+        assert_query_budget(self.client, viewset, 'retrieve', reverse('servicelisting-detail', args=[service.id]))
+        self.client.force_authenticate(user=self.assemblers[0])
+        assert_query_budget(self.client, viewset, 'my_services', reverse('servicelisting-my-services'))
+
+    def test_project_endpoints(self):
+        viewset = views.ProjectListingViewSet
+        assert_query_budget(self.client, viewset, 'list', reverse('projectlisting-list'))
+        project = ProjectListing.objects.first()
+        assert_query_budget(self.client, viewset, 'retrieve', reverse('projectlisting-detail', args=[project.id]))
+        assert_query_budget(self.client, viewset, 'my_projects', reverse('projectlisting-my-projects'))
+        assert_query_budget(self.client, viewset, 'candidates', reverse('projectlisting-candidates', args=[project.id]))
+        self.client.force_authenticate(user=self.assemblers[0])
+        assert_query_budget(self.client, viewset, 'assigned_to_me', reverse('projectlisting-assigned-to-me'))
+
+    def test_project_transitions(self):
+        viewset = views.ProjectListingViewSet
+        project = ProjectListing.objects.create(
+            creator=self.customer,
+            title='Desk',
+            description='Assembly',
+            furniture_type='Desk',
+            location='York',
+            budget=Decimal('40.00')
+        )
+        assert_query_budget(self.client, viewset, 'assign', reverse('projectlisting-assign', args=[project.id]),
+                            {'assigned_to': self.assemblers[0].id}, method='patch')
+        assert_query_budget(self.client, viewset, 'update_status',
+                            reverse('projectlisting-update-status', args=[project.id]),
+                            {'status': 'completed'}, method='patch')
+
+    def test_message_endpoints(self):
+        viewset = views.MessageViewSet
+        assert_query_budget(self.client, viewset, 'list', reverse('message-list'))
+        assert_query_budget(self.client, viewset, 'conversations', reverse('message-conversations'))
+        assert_query_budget(self.client, viewset, 'with_user', reverse('message-with-user'),
+                            {'user_id': self.assemblers[0].id})
+        assert_query_budget(self.client, viewset, 'unread_count', reverse('message-unread-count'))
+
+    def test_dashboard(self):
+        response_cache().clear()
+        assert_query_budget(self.client, views.DashboardView, 'get', reverse('dashboard'))
+
+    def test_review_endpoints(self):
+        viewset = views.ReviewViewSet
+        assert_query_budget(self.client, viewset, 'list', reverse('review-list'))
+        review = Review.objects.first()
+        assert_query_budget(self.client, viewset, 'retrieve', reverse('review-detail', args=[review.id]))
+        assert_query_budget(self.client, viewset, 'for_user', reverse('review-for-user'),
+                            {'user_id': self.assemblers[0].id})
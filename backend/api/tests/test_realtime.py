@@ -0,0 +1,182 @@
+import json
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ProjectListing, Message, Conversation, TokenGeneration
+from api.authentication import user_states
+from api.revocation import revocations
+from assembleally.asgi import application
+
+async def connect(scope):
+    communicator = ApplicationCommunicator(application, scope)
+    await communicator.send_input({'type': 'websocket.connect'})
+    return await communicator.receive_output(1)
+
+def websocket_scope(token=None, path='/ws/'):
+    return {
+        'type': 'websocket',
+        'path': path,
+        'query_string': f'token={token}'.encode() if token else b'',
+        'headers': [],
+    }
+
+@pytest.mark.django_db
+class TestRealtimePush:
+    def setup_method(self):
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.assembler, is_assembler=True)
+
+        self.project = ProjectListing.objects.create(
+            creator=self.customer,
+            title='Desk assembly',
+            description='Standing desk',
+            furniture_type='Desk',
+            location='Bristol',
+            budget=Decimal('50.00'),
+            status='open'
+        )
+
+    def token_for(self, user):
+        return str(AccessToken.for_user(user))
+
+    def committed(self, func):
+        # Events are published on commit, which tests otherwise never reach
+        def wrapper():
+            with TestCase.captureOnCommitCallbacks(execute=True):
+                func()
+        return sync_to_async(wrapper)
+
+    def run(self, user, scenario):
+        async def main():
+            communicator = ApplicationCommunicator(application, websocket_scope(self.token_for(user)))
+            await communicator.send_input({'type': 'websocket.connect'})
+            assert (await communicator.receive_output(1))['type'] == 'websocket.accept'
+            try:
+                await scenario(communicator)
+            finally:
+                await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+                await communicator.wait(1)
+        async_to_sync(main)()
+
+    @staticmethod
+    async def next_event(communicator):
+        output = await communicator.receive_output(1)
+        assert output['type'] == 'websocket.send'
+        return json.loads(output['text'])
+
+    def test_new_messages_are_pushed(self):
+        def send_message():
+            Message.objects.create(sender=self.assembler, receiver=self.customer, content='On my way')
+
+        async def scenario(communicator):
+            await self.committed(send_message)()
+            event = await self.next_event(communicator)
+
+            assert event['type'] == 'message'
+            assert event['message']['content'] == 'On my way'
+            assert event['message']['sender_name'] == 'assembler'
+            assert event['message']['is_read'] is False
+
+        self.run(self.customer, scenario)
+
+    def test_read_receipts_are_pushed(self):
+        Message.objects.create(sender=self.assembler, receiver=self.customer, content='Hello')
+
+        async def scenario(communicator):
+            await self.committed(lambda: Conversation.mark_read(self.customer.id, self.assembler.id))()
+            event = await self.next_event(communicator)
+
+            assert event['type'] == 'read'
+            assert event['reader'] == self.customer.id
+            assert event['other'] == self.assembler.id
+
+            # Nothing left unread, so nothing is sent
+            await self.committed(lambda: Conversation.mark_read(self.customer.id, self.assembler.id))()
+            assert await communicator.receive_nothing(0.1)
+
+        self.run(self.assembler, scenario)
+
+    def test_project_status_changes_are_pushed(self):
+        def start_project():
+            project = ProjectListing.objects.get(id=self.project.id)
+            project.assigned_to = self.assembler
+            project.status = 'in_progress'
+            project.save()
+            # Saving again without a status change sends nothing
+            project.save()
+
+        async def scenario(communicator):
+            await self.committed(start_project)()
+            event = await self.next_event(communicator)
+
+            assert event == {
+                'type': 'project_status',
+                'project': self.project.id,
+                'status': 'in_progress',
+                'previous': 'open',
+                'assigned_to': self.assembler.id,
+            }
+            assert await communicator.receive_nothing(0.1)
+
+        self.run(self.assembler, scenario)
+
+    def test_events_only_reach_participants(self):
+        outsider = User.objects.create_user(
+            username='outsider',
+            email='outsider@example.com',
+            password='strongpassword'
+        )
+
+        async def scenario(communicator):
+            await self.committed(lambda: Message.objects.create(
+                sender=self.assembler, receiver=self.customer, content='Private'
+            ))()
+            assert await communicator.receive_nothing(0.1)
+
+        self.run(outsider, scenario)
+
+    def test_ping(self):
+        async def scenario(communicator):
+            await communicator.send_input({'type': 'websocket.receive', 'text': '{"type": "ping"}'})
+            assert await self.next_event(communicator) == {'type': 'pong'}
+
+        self.run(self.customer, scenario)
+
+    def test_invalid_tokens_are_rejected(self):
+        self.assembler.is_active = False
+        self.assembler.save()
+
+        for scope in [websocket_scope(), websocket_scope('not-a-token'), websocket_scope(self.token_for(self.assembler))]:
+            assert async_to_sync(connect)(scope) == {'type': 'websocket.close', 'code': 4401}
+        unknown_path = websocket_scope(self.token_for(self.customer), path='/other/')
+        assert async_to_sync(connect)(unknown_path) == {'type': 'websocket.close', 'code': 4404}
+
+    def test_revoked_tokens_are_rejected(self):
+        revocations.reset()
+        user_states.invalidate()
+        logged_out = AccessToken.for_user(self.customer)
+        revocations.revoke(logged_out['jti'], logged_out['exp'])
+        closed = {'type': 'websocket.close', 'code': 4401}
+
+        assert async_to_sync(connect)(websocket_scope(str(logged_out))) == closed
+
+        # Log out everywhere: tokens of the previous generation are refused
+        earlier = self.token_for(self.assembler)
+        TokenGeneration.bump(self.assembler.id)
+        user_states.invalidate(self.assembler.id)
+
+        assert async_to_sync(connect)(websocket_scope(earlier)) == closed
@@ -0,0 +1,146 @@
+import datetime
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from django.contrib.auth.models import User
+from api.models import Profile, RevokedToken
+from api.authentication import user_states
+from api.revocation import BloomFilter, revocations
+from api.throttling import buckets
+
+def revocation_queries(queries):
+    return [query['sql'] for query in queries.captured_queries if 'api_revokedtoken' in query['sql']]
+
+@pytest.mark.django_db
+class TestTokenRevocation:
+    def setup_method(self):
+        revocations.reset()
+        user_states.invalidate()
+        buckets.reset()
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.user)
+
+    def login(self):
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'customer',
+            'password': 'strongpassword'
+        })
+        assert response.status_code == status.HTTP_200_OK
+        return response.data
+
+    def refresh(self, token):
+        return self.client.post(reverse('token_refresh'), {'refresh': token})
+
+    def profile_status(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = self.client.get(reverse('profile-me'))
+        self.client.credentials()
+        return response.status_code
+
+    def test_rotation_revokes_old_refresh_token(self):
+        tokens = self.login()
+        rotated = self.refresh(tokens['refresh'])
+
+        assert rotated.status_code == status.HTTP_200_OK
+        assert rotated.data['refresh'] != tokens['refresh']
+        assert RevokedToken.objects.filter(jti=RefreshToken(tokens['refresh'])['jti']).exists()
+        assert self.refresh(tokens['refresh']).status_code == status.HTTP_401_UNAUTHORIZED
+        assert self.refresh(rotated.data['refresh']).status_code == status.HTTP_200_OK
+
+    def test_revoked_token_seen_by_other_processes(self):
+        tokens = self.login()
+        self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        # Another process: a fresh filter, rebuilt from the table
+        revocations.reset()
+
+        assert self.refresh(tokens['refresh']).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_logout_revokes_both_tokens(self):
+        tokens = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        response = self.client.post(reverse('token_logout'), {'refresh': tokens['refresh']})
+        self.client.credentials()
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert self.profile_status(tokens['access']) == status.HTTP_401_UNAUTHORIZED
+        assert self.refresh(tokens['refresh']).status_code == status.HTTP_401_UNAUTHORIZED
+        assert self.client.post(reverse('token_logout'), {
+            'refresh': tokens['refresh']
+        }).status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_logout_requires_a_refresh_token(self):
+        for data in ({}, {'refresh': ''}, {'refresh': 'not-a-token'}):
+            response = self.client.post(reverse('token_logout'), data)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        assert not RevokedToken.objects.exists()
+
+    def test_logout_is_throttled(self):
+        responses = [self.client.post(reverse('token_logout')) for _ in range(31)]
+
+        assert responses[-2].status_code == status.HTTP_400_BAD_REQUEST
+        assert responses[-1].status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    def test_logout_everywhere(self):
+        first, second = self.login(), self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {first["access"]}')
+        response = self.client.post(reverse('token_logout_all'))
+        self.client.credentials()
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        for tokens in (first, second):
+            assert self.profile_status(tokens['access']) == status.HTTP_401_UNAUTHORIZED
+            assert self.refresh(tokens['refresh']).status_code == status.HTTP_401_UNAUTHORIZED
+
+        tokens = self.login()
+        assert AccessToken(tokens['access'])['generation'] == 1
+        assert self.profile_status(tokens['access']) == status.HTTP_200_OK
+        assert self.refresh(tokens['refresh']).status_code == status.HTTP_200_OK
+
+    def test_logout_everywhere_requires_authentication(self):
+        response = self.client.post(reverse('token_logout_all'))
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_unrevoked_tokens_need_no_query(self):
+        access = self.login()['access']
+        assert self.profile_status(access) == status.HTTP_200_OK
+
+        with CaptureQueriesContext(connection) as queries:
+            assert self.profile_status(access) == status.HTTP_200_OK
+
+        assert revocation_queries(queries) == []
+
+    def test_filter_hits_are_confirmed(self, monkeypatch):
+        access = self.login()['access']
+        monkeypatch.setattr(BloomFilter, '__contains__', lambda bloom, key: True)
+
+        with CaptureQueriesContext(connection) as queries:
+            assert self.profile_status(access) == status.HTTP_200_OK
+
+        assert len(revocation_queries(queries)) >= 1
+
+    def test_concurrent_rotation_allows_one(self):
+        refresh = RefreshToken(self.login()['refresh'])
+
+        assert revocations.revoke(refresh['jti'], refresh['exp']) is True
+        assert revocations.revoke(refresh['jti'], refresh['exp']) is False
+
+    def test_expired_revocations_are_pruned(self):
+        now = timezone.now()
+        RevokedToken.objects.create(jti='expired', expires_at=now - datetime.timedelta(seconds=1))
+        RevokedToken.objects.create(jti='live', expires_at=now + datetime.timedelta(days=1))
+
+        assert revocations.prune(force=True) == 1
+        assert list(RevokedToken.objects.values_list('jti', flat=True)) == ['live']
@@ -0,0 +1,95 @@
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.cache import response_cache
+from api.models import Profile, ServiceListing, ProjectListing
+
+@pytest.mark.django_db
+class TestFullTextSearch:
+    def setup_method(self):
+        response_cache().clear()
+        self.client = APIClient()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+
+        self.wardrobe = self.create_project('Wardrobe assembly', 'Large IKEA wardrobe with sliding doors', 'Wardrobe')
+        self.desk = self.create_project('Desk build', 'Standing desk, needs assembling today', 'Desk')
+        self.shelves = self.create_project('Shelves', 'Wall shelves above the wardrobe', 'Shelf')
+
+    def create_project(self, title, description, furniture_type):
+        return ProjectListing.objects.create(
+            creator=self.customer,
+            title=title,
+            description=description,
+            furniture_type=furniture_type,
+            location='London',
+            budget=Decimal('80.00'),
+            status='open'
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('projectlisting-list'), {'search': query, **params})
+        return [item['id'] for item in response.data]
+
+    def test_stemmed_terms_match(self):
+        # "assembly" and "assembling" share a stem
+        assert set(self.search('assemble')) == {self.wardrobe.id, self.desk.id}
+
+    def test_results_are_ranked(self):
+        # A title match outranks a description match
+        assert self.search('wardrobe') == [self.wardrobe.id, self.shelves.id]
+
+    def test_phrase_query(self):
+        assert self.search('"standing desk"') == [self.desk.id]
+        assert self.search('"desk standing"') == []
+
+    def test_syntax_characters_are_ignored(self):
+        assert self.search('desk*') == [self.desk.id]
+        assert self.search('"') == []
+
+    def test_index_follows_writes(self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            self.desk.title = 'Bookcase build'
+            self.desk.save()
+            self.wardrobe.delete()
+
+        assert self.search('bookcase') == [self.desk.id]
+        assert self.search('wardrobe') == [self.shelves.id]
+
+    def test_search_results_paginate(self):
+        first = self.client.get(reverse('projectlisting-list'), {'search': 'wardrobe', 'page_size': 1})
+        second = self.client.get(first.data['next'])
+
+        ids = [item['id'] for item in first.data['results'] + second.data['results']]
+        assert ids == [self.wardrobe.id, self.shelves.id]
+
+    def test_service_search(self):
+        service = ServiceListing.objects.create(
+            provider=self.customer,
+            title='Flat-pack furniture assembler',
+            description='Beds and wardrobes',
+            hourly_rate=Decimal('25.00')
+        )
+        response = self.client.get(reverse('servicelisting-list'), {'search': 'wardrobe'})
+
+        assert [item['id'] for item in response.data] == [service.id]
+
+    def test_rebuild_command(self):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('DELETE FROM "api_projectlisting_fts"')
+            assert self.search('wardrobe') == []
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        assert self.search('wardrobe') == [self.wardrobe.id, self.shelves.id]
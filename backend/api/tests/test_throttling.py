@@ -0,0 +1,127 @@
+import multiprocessing
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile
+from api.throttling import FileBucketStore, MemoryBucketStore, buckets, parse_rule
+from api import throttling, views
+
+def take_many(path, count, results):
+    store = FileBucketStore(path, slots=64)
+    results.put(sum(store.take('ip:login:1.2.3.4', 10, 1 / 60) == 0 for _ in range(count)))
+
+@pytest.mark.django_db
+class TestThrottling:
+    def setup_method(self):
+        buckets.reset()
+        self.client = APIClient()
+
+        self.user = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.user)
+
+    def login(self, **extra):
+        return self.client.post(reverse('token_obtain_pair'), {
+            'username': 'customer',
+            'password': 'wrong'
+        }, **extra)
+
+    def test_login_is_limited_per_ip(self):
+        responses = [self.login() for _ in range(11)]
+
+        assert [response.status_code for response in responses[:10]] == [status.HTTP_401_UNAUTHORIZED] * 10
+        assert responses[10].status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert 1 <= int(responses[10]['Retry-After']) <= 6
+        # Another address has its own bucket
+        assert self.login(REMOTE_ADDR='10.0.0.2').status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_route_bucket_is_shared(self, monkeypatch):
+        monkeypatch.setattr(views.TokenObtainView, 'throttle_policies', {'post': ('ip:10/min', 'route:3/min')})
+        codes = [self.login(REMOTE_ADDR=f'10.0.0.{index}').status_code for index in range(4)]
+
+        assert codes == [status.HTTP_401_UNAUTHORIZED] * 3 + [status.HTTP_429_TOO_MANY_REQUESTS]
+
+    def test_throttled_client_does_not_drain_the_route(self, monkeypatch):
+        # Listed route first on purpose: per-client buckets are checked first anyway
+        monkeypatch.setattr(views.TokenObtainView, 'throttle_policies', {'post': ('route:20/min', 'ip:5/min')})
+        codes = [self.login(REMOTE_ADDR='10.0.0.66').status_code for _ in range(50)]
+
+        assert codes.count(status.HTTP_429_TOO_MANY_REQUESTS) == 45
+        assert self.login(REMOTE_ADDR='10.0.0.2').status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_user_scope_follows_the_user(self, monkeypatch):
+        monkeypatch.setattr(views.ProjectListingViewSet, 'throttle_policies', {'create': ('user:2/hour',)})
+        self.client.force_authenticate(user=self.user)
+        data = {
+            'title': 'Desk assembly',
+            'description': 'Desk',
+            'furniture_type': 'Desk',
+            'location': 'Leeds',
+            'budget': Decimal('50.00')
+        }
+        codes = [
+            self.client.post(reverse('projectlisting-list'), data, REMOTE_ADDR=f'10.0.0.{index}').status_code
+            for index in range(3)
+        ]
+
+        assert codes == [status.HTTP_201_CREATED] * 2 + [status.HTTP_429_TOO_MANY_REQUESTS]
+        # Reads are not throttled
+        assert self.client.get(reverse('projectlisting-list')).status_code == status.HTTP_200_OK
+
+    def test_buckets_refill(self, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(throttling.time, 'time', lambda: clock[0])
+        for _ in range(10):
+            self.login()
+        assert self.login().status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+        clock[0] += 6
+        assert self.login().status_code == status.HTTP_401_UNAUTHORIZED
+        assert self.login().status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    def test_spoofed_forwarded_for_is_ignored(self):
+        # nginx appends the real client address to whatever the client sent
+        codes = [
+            self.login(HTTP_X_FORWARDED_FOR=f'192.0.2.{index}, 10.0.0.7').status_code for index in range(11)
+        ]
+
+        assert codes == [status.HTTP_401_UNAUTHORIZED] * 10 + [status.HTTP_429_TOO_MANY_REQUESTS]
+        assert self.login(HTTP_X_FORWARDED_FOR='192.0.2.1, 10.0.0.8').status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_invalid_rules(self):
+        assert parse_rule('ip:10/min') == ('ip', 10, 10 / 60)
+        for rule in ('host:10/min', 'ip:10/fortnight', 'ip:0/min', 'ip'):
+            with pytest.raises(ValueError):
+                parse_rule(rule)
+
+def test_memory_store_drops_full_buckets(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(throttling.time, 'time', lambda: clock[0])
+    store = MemoryBucketStore()
+    for index in range(100):
+        store.take(f'ip:login:192.0.2.{index}', 10, 1)
+    store.take('ip:login:10.0.0.1', 10, 0.01)
+
+    clock[0] += 61
+    store.take('ip:login:10.0.0.2', 10, 1)
+
+    assert set(store.buckets) == {'ip:login:10.0.0.1', 'ip:login:10.0.0.2'}
+
+def test_file_store_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'buckets')
+    results = multiprocessing.get_context('fork').Queue()
+    workers = [
+        multiprocessing.get_context('fork').Process(target=take_many, args=(path, 10, results)) for _ in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sum(results.get() for _ in workers) == 10
@@ -0,0 +1,113 @@
+import pytest
+from django.db.models.signals import post_save
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from decimal import Decimal
+from api.models import Profile, ProjectListing
+from api.throttling import buckets
+
+@pytest.mark.django_db
+class TestProjectTransitions:
+    def setup_method(self):
+        buckets.reset()
+        self.client = APIClient()
+
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.customer)
+        self.assembler = User.objects.create_user(
+            username='assembler',
+            email='assembler@example.com',
+            password='strongpassword'
+        )
+        Profile.objects.create(user=self.assembler, is_assembler=True)
+        self.project = ProjectListing.objects.create(
+            creator=self.customer,
+            title='Desk assembly',
+            description='Standing desk',
+            furniture_type='Desk',
+            location='Bristol',
+            budget=Decimal('50.00')
+        )
+        self.client.force_authenticate(user=self.customer)
+
+    def assign(self, assigned_to):
+        return self.client.patch(reverse('projectlisting-assign', args=[self.project.id]), {
+            'assigned_to': assigned_to
+        })
+
+    def test_assign(self):
+        saved = []
+        def receiver(sender, instance, update_fields, **kwargs):
+            saved.append((instance.saved_value('status'), instance.status, update_fields))
+        post_save.connect(receiver, sender=ProjectListing, dispatch_uid='test_transition_saved')
+        try:
+            response = self.assign(self.assembler.id)
+        finally:
+            post_save.disconnect(dispatch_uid='test_transition_saved', sender=ProjectListing)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['status'] == 'in_progress'
+        assert response.data['assigned_to'] == self.assembler.id
+        assert response.data['assigned_to_name'] == 'assembler'
+        assert response.data['creator_name'] == 'customer'
+        assert response.data['budget'] == '50.00'
+        self.project.refresh_from_db()
+        assert (self.project.status, self.project.assigned_to_id) == ('in_progress', self.assembler.id)
+        assert response.data['updated_at'] == self.client.get(
+            reverse('projectlisting-detail', args=[self.project.id])
+        ).data['updated_at']
+        assert saved == [('open', 'in_progress', frozenset({'status', 'updated_at', 'assigned_to'}))]
+
+    def test_second_assign_fails(self):
+        other = User.objects.create_user(username='other', password='strongpassword')
+        Profile.objects.create(user=other, is_assembler=True)
+
+        assert self.assign(self.assembler.id).status_code == status.HTTP_200_OK
+        response = self.assign(other.id)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['detail'] == 'This project is not open for assignment.'
+        self.project.refresh_from_db()
+        assert self.project.assigned_to_id == self.assembler.id
+
+    def test_assign_errors(self):
+        customer_only = User.objects.create_user(username='nobody', password='strongpassword')
+
+        assert self.assign(customer_only.id).status_code == status.HTTP_400_BAD_REQUEST
+        assert self.assign(self.customer.id).status_code == status.HTTP_400_BAD_REQUEST
+        assert self.assign(999999).status_code == status.HTTP_404_NOT_FOUND
+        assert self.assign('').status_code == status.HTTP_400_BAD_REQUEST
+        assert self.client.patch(
+            reverse('projectlisting-assign', args=[999999]), {'assigned_to': self.assembler.id}
+        ).status_code == status.HTTP_404_NOT_FOUND
+        self.client.force_authenticate(user=self.assembler)
+        assert self.assign(self.assembler.id).status_code == status.HTTP_403_FORBIDDEN
+        self.project.refresh_from_db()
+        assert self.project.status == 'open'
+
+    def test_stale_transition_matches_nothing(self):
+        ProjectListing.objects.filter(pk=self.project.pk).update(status='cancelled')
+
+        assert ProjectListing.transition(self.project.pk, 'open', 'completed') is None
+        assert ProjectListing.objects.get(pk=self.project.pk).status == 'cancelled'
+
+    def test_update_status(self):
+        url = reverse('projectlisting-update-status', args=[self.project.id])
+        self.client.force_authenticate(user=self.assembler)
+
+        assert self.client.patch(url, {'status': 'completed'}).status_code == status.HTTP_403_FORBIDDEN
+        response = self.client.patch(url, {'status': 'in_progress'})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['status'] == 'in_progress'
+        assert response.data['assigned_to_name'] is None
+
+        self.client.force_authenticate(user=self.customer)
+        assert self.client.patch(url, {'status': 'done'}).status_code == status.HTTP_400_BAD_REQUEST
+        assert self.client.patch(url, {'status': 'completed'}).data['status'] == 'completed'
+        assert ProjectListing.objects.get(pk=self.project.pk).status == 'completed'
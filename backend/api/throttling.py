@@ -0,0 +1,218 @@
+"""
+Token-bucket throttling.
+
+Views declare ``throttle_policies``, a dict from action (or HTTP method for
+plain API views) to rules such as ``'ip:10/min'``. The scope before the
+colon picks the bucket a request draws from:
+
+- ``ip``: one bucket per client address (see ``NUM_PROXIES``),
+- ``user``: one per authenticated user, falling back to the address,
+- ``route``: one bucket for the action shared by all clients.
+
+A bucket holds up to ``count`` tokens and refills at ``count`` per period,
+so a client can burst up to the limit and then continues at the average
+rate. Rejected requests get 429 with ``Retry-After``. Per-client buckets are
+checked before the shared ``route`` bucket and checking stops at the first
+bucket that rejects, so a throttled client does not drain the route's
+budget for everyone else.
+
+Buckets live in the store named by ``API_THROTTLE_STORE``:
+
+- ``memory://``: per process, for development and tests,
+- ``file:///path``: a memory-mapped file shared by the workers on one host,
+  with a byte-range lock per bucket,
+- ``redis://host:port/db``: a Lua script, atomic across hosts (needs the
+  ``redis`` package).
+"""
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import registry
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+SCOPES = ('ip', 'user', 'route')
+
+
+@lru_cache(maxsize=None)
+def parse_rules(rules):
+    """Parsed rules with the shared ``route`` scope last."""
+    return tuple(sorted(map(parse_rule, rules), key=lambda parsed: parsed[0] == 'route'))
+
+
+@lru_cache(maxsize=None)
+def parse_rule(rule):
+    """``'ip:10/min'`` -> ``('ip', capacity, tokens per second)``."""
+    scope, _, rate = rule.partition(':')
+    count, _, period = rate.partition('/')
+    if scope not in SCOPES or period not in PERIODS or not count.isdigit() or int(count) < 1:
+        raise ValueError(f'Invalid throttle rule {rule!r}')
+    return scope, int(count), int(count) / PERIODS[period]
+
+
+def refill(tokens, stamp, capacity, rate, now):
+    """Take a token from the bucket; returns ``(tokens, seconds to wait)``."""
+    tokens = min(capacity, tokens + max(0.0, now - stamp) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBucketStore:
+    # Buckets that have refilled to capacity are the same as missing ones,
+    # so they are dropped every sweep_interval seconds
+    sweep_interval = 60
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.next_sweep = time.time() + self.sweep_interval
+
+    def take(self, key, capacity, rate):
+        now = time.time()
+        with self.lock:
+            if now >= self.next_sweep:
+                self.sweep(now)
+            tokens, stamp, _ = self.buckets.get(key, (capacity, now, now))
+            tokens, wait = refill(tokens, stamp, capacity, rate, now)
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        return wait
+
+    def sweep(self, now):
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if bucket[2] > now}
+        self.next_sweep = now + self.sweep_interval
+
+    def reset(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class FileBucketStore:
+    """
+    Fixed table of slots in a shared file. A key hashes to one slot; when
+    two keys collide, the newer one starts from a full bucket, which only
+    ever lets a request through that a larger table would have throttled.
+    """
+    SLOT = struct.Struct('<Qdd')
+
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.slots = slots
+        self.lock = threading.Lock()
+        self.map = None
+        # Forked workers must not share the parent's descriptor and locks
+        os.register_at_fork(after_in_child=self.close)
+
+    def open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.slots * self.SLOT.size
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self.fd, self.map = fd, mmap.mmap(fd, size)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            os.close(self.fd)
+        self.map = None
+
+    def take(self, key, capacity, rate):
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        offset = digest % self.slots * self.SLOT.size
+        with self.lock:
+            if self.map is None:
+                self.open()
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, self.SLOT.size, offset)
+            try:
+                now = time.time()
+                owner, tokens, stamp = self.SLOT.unpack_from(self.map, offset)
+                if owner != digest:
+                    tokens, stamp = capacity, now
+                tokens, wait = refill(tokens, stamp, capacity, rate, now)
+                self.SLOT.pack_into(self.map, offset, digest, tokens, now)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, self.SLOT.size, offset)
+        return wait
+
+    def reset(self):
+        with self.lock:
+            if self.map is None:
+                self.open()
+            self.map[:] = bytes(len(self.map))
+
+
+class RedisBucketStore:
+    SCRIPT = '''
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = tonumber(bucket[1]) or capacity
+    local stamp = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - stamp) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    '''
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return float(self.script(keys=[f'throttle:{key}'], args=[capacity, rate, time.time()]))
+
+    def reset(self):
+        keys = list(self.client.scan_iter('throttle:*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+def bucket_store(url):
+    if url.startswith('file://'):
+        return FileBucketStore(url[len('file://'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBucketStore(url)
+    return MemoryBucketStore()
+
+
+buckets = bucket_store(getattr(settings, 'API_THROTTLE_STORE', 'memory://'))
+
+
+class BucketThrottle(BaseThrottle):
+    """Applies the rules ``view.throttle_policies`` declares for the request."""
+
+    def allow_request(self, request, view):
+        policies = getattr(view, 'throttle_policies', None)
+        if not policies:
+            return True
+        action = getattr(view, 'action', None) or request.method.lower()
+        rules = policies.get(action)
+        if not rules:
+            return True
+        route = f'{type(view).__name__}.{action}'
+        for scope, capacity, rate in parse_rules(tuple(rules)):
+            if scope == 'route':
+                ident = ''
+            elif scope == 'user' and request.user and request.user.is_authenticated:
+                ident = f'user:{request.user.pk}'
+            else:
+                ident = self.get_ident(request)
+            self.retry_after = buckets.take(f'{scope}:{route}:{ident}', capacity, rate)
+            if self.retry_after:
+                registry.inc('api_throttled_requests_total', {'route': route})
+                return False
+        return True
+
+    def wait(self):
+        return math.ceil(self.retry_after)
@@ -1,8 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from . import views
+from . import metrics, views
 
 router = DefaultRouter()
 router.register(r'profiles', views.ProfileViewSet)
@@ -14,6 +13,10 @@ router.register(r'reviews', views.ReviewViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('register/', views.RegisterView.as_view(), name='register'),
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
+    path('token/', views.TokenObtainView.as_view(), name='token_obtain_pair'),
+    path('token/refresh/', views.TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/logout/', views.LogoutView.as_view(), name='token_logout'),
+    path('token/logout_all/', views.LogoutAllView.as_view(), name='token_logout_all'),
+    path('metrics/', metrics.metrics_view, name='metrics'),
 ]
@@ -2,30 +2,85 @@ from rest_framework import viewsets, generics, permissions, status, filters
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes, action
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt import views as jwt_views
 
-from .models import Profile, ServiceListing, ProjectListing, Message, Review
+from .models import (
+    Profile, ServiceListing, ProjectListing, Message, Conversation, Review, TokenGeneration, UnreadCounter
+)
 from .serializers import (
     UserSerializer, ProfileSerializer, ServiceListingSerializer, 
-    ProjectListingSerializer, MessageSerializer, ReviewSerializer,
-    RegisterSerializer
+    ProjectListingSerializer, MessageSerializer, ConversationSerializer,
+    ReviewSerializer, RegisterSerializer
 )
+from .pagination import MessageThreadPagination
+from .optimizer import optimize_queryset
+from .compiled import compile_serializer
+from .search import FullTextSearchFilter
+from .geo import ProximityFilter
+from .matching import assembler_features
+from .cache import CachedResponseMixin, cache_response, cached_response
+from .export import ExportMixin
+from .authentication import ClaimsRefreshToken, user_states
+from .revocation import revocations
+
+class OptimizedQuerysetMixin:
+    # Maximum queries per action, enforced by the query budget tests
+    query_budgets = {}
+    
+    def optimize_queryset(self, queryset):
+        # Column restriction only applies to reads; writes save whole rows
+        restrict_columns = self.request.method in permissions.SAFE_METHODS
+        return optimize_queryset(queryset, self.get_serializer_class(), restrict_columns=restrict_columns)
+    
+    def filter_queryset(self, queryset):
+        return self.optimize_queryset(super().filter_queryset(queryset))
+
+class PaginatedActionMixin(OptimizedQuerysetMixin):
+    # Serialize lists from values() rows when the serializer allows it
+    compile_serializers = True
+    
+    def list(self, request, *args, **kwargs):
+        return self.paginated_response(self.filter_queryset(self.get_queryset()))
+    
+    def paginated_response(self, queryset, on_page=None):
+        # on_page(rows) runs after the page is fetched and before it is serialized
+        queryset = self.optimize_queryset(queryset)
+        compiled = compile_serializer(self.get_serializer_class()) if self.compile_serializers else None
+        if compiled is not None:
+            queryset = compiled.values(queryset)
+        page = self.paginate_queryset(queryset)
+        rows = queryset if page is None else page
+        if on_page is not None:
+            on_page(rows)
+        if compiled is not None:
+            data = compiled.serialize(rows)
+        else:
+            data = self.get_serializer(rows, many=True).data
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [permissions.AllowAny]
     serializer_class = RegisterSerializer
+    # Hashing the password is the expensive part
+    throttle_policies = {'post': ('ip:20/hour', 'route:120/min')}
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
         
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         
         return Response({
             "user": UserSerializer(user).data,
@@ -33,13 +88,100 @@ class RegisterView(generics.CreateAPIView):
             "access": str(refresh.access_token),
         }, status=status.HTTP_201_CREATED)
 
-class ProfileViewSet(viewsets.ModelViewSet):
-    queryset = Profile.objects.all()
+class TokenObtainView(jwt_views.TokenObtainPairView):
+    # Every attempt runs the password hasher; the route limit keeps a spread
+    # out credential-stuffing run from taking all the workers
+    throttle_policies = {'post': ('ip:10/min', 'route:240/min')}
+
+class TokenRefreshView(jwt_views.TokenRefreshView):
+    throttle_policies = {'post': ('ip:60/min',)}
+
+class LogoutView(APIView):
+    """Revoke the given refresh token, and the access token used for the request."""
+    permission_classes = [permissions.AllowAny]
+    throttle_policies = {'post': ('ip:30/min',)}
+    
+    def post(self, request):
+        raw_token = request.data.get('refresh')
+        if not raw_token or not isinstance(raw_token, str):
+            # ClaimsRefreshToken(None) would mint a new token rather than fail
+            return Response({'refresh': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ClaimsRefreshToken(raw_token).blacklist()
+        except TokenError as error:
+            return Response({'refresh': [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+        if request.auth is not None:
+            revocations.revoke(request.auth[jwt_settings.JTI_CLAIM], request.auth['exp'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class LogoutAllView(APIView):
+    """Revoke every token issued to the user so far, on all devices."""
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_policies = {'post': ('user:10/min',)}
+    
+    def post(self, request):
+        TokenGeneration.bump(request.user.id)
+        user_states.invalidate(request.user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class DashboardView(APIView):
+    """
+    What the frontend shows after login, in one response: the user's
+    profile, latest projects in both roles, services, unread total and
+    latest conversations. Cached per user until one of those rows changes.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    cache_dependencies = ()
+    cache_per_user = True
+    query_budgets = {'get': 6}
+    # Items per section; the full lists stay on their own endpoints
+    section_size = 5
+    
+    def get(self, request):
+        return cached_response(self, self.dashboard, request)
+    
+    def serialize(self, queryset, serializer_class):
+        queryset = optimize_queryset(queryset, serializer_class)
+        compiled = compile_serializer(serializer_class)
+        if compiled is not None:
+            return compiled.serialize(compiled.values(queryset)[:self.section_size])
+        return serializer_class(queryset[:self.section_size], many=True, context={'request': self.request}).data
+    
+    def dashboard(self, request):
+        user_id = request.user.id
+        profile = optimize_queryset(Profile.objects.filter(user_id=user_id), ProfileSerializer).first()
+        return Response({
+            'profile': ProfileSerializer(profile).data if profile is not None else None,
+            'projects': {
+                'created': self.serialize(
+                    ProjectListing.objects.filter(creator_id=user_id).order_by('-created_at', '-id'),
+                    ProjectListingSerializer
+                ),
+                'assigned': self.serialize(
+                    ProjectListing.objects.filter(assigned_to_id=user_id).order_by('-created_at', '-id'),
+                    ProjectListingSerializer
+                ),
+            },
+            'services': self.serialize(
+                ServiceListing.objects.filter(provider_id=user_id).order_by('-created_at', '-id'),
+                ServiceListingSerializer
+            ),
+            'unread_count': UnreadCounter.objects.filter(user_id=user_id).values_list('count', flat=True).first() or 0,
+            'conversations': self.serialize(
+                Conversation.objects.filter(Q(user_a_id=user_id) | Q(user_b_id=user_id)).order_by('-last_activity'),
+                ConversationSerializer
+            ),
+        })
+
+class ProfileViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
+    queryset = Profile.objects.all().order_by('-date_joined')
     serializer_class = ProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [ProximityFilter]
+    query_budgets = {'list': 1, 'retrieve': 1, 'me': 1}
     
     def get_queryset(self):
-        queryset = Profile.objects.all()
+        queryset = Profile.objects.all().order_by('-date_joined')
         is_assembler = self.request.query_params.get('is_assembler')
         
         if is_assembler:
@@ -49,106 +191,151 @@ class ProfileViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def me(self, request):
-        profile = get_object_or_404(Profile, user=request.user)
+        profile = get_object_or_404(self.optimize_queryset(Profile.objects.all()), user=request.user)
         serializer = self.get_serializer(profile)
         return Response(serializer.data)
     
     @action(detail=False, methods=['put', 'patch'])
     def update_me(self, request):
-        profile = get_object_or_404(Profile, user=request.user)
+        profile = get_object_or_404(self.optimize_queryset(Profile.objects.all()), user=request.user)
         serializer = self.get_serializer(profile, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data)
 
-class ServiceListingViewSet(viewsets.ModelViewSet):
+class ServiceListingViewSet(CachedResponseMixin, ExportMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     queryset = ServiceListing.objects.all().order_by('-created_at')
     serializer_class = ServiceListingSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['hourly_rate', 'experience_years', 'is_available']
-    search_fields = ['title', 'description']
     ordering_fields = ['hourly_rate', 'experience_years', 'created_at']
+    query_budgets = {'list': 1, 'retrieve': 1, 'my_services': 1, 'export': 1}
+    throttle_policies = {'create': ('user:30/hour',), 'export': ('user:10/min',)}
+    cache_dependencies = [ServiceListing, User, Profile, Review]
     
     @action(detail=False, methods=['get'])
     def my_services(self, request):
         services = ServiceListing.objects.filter(provider=request.user).order_by('-created_at')
-        serializer = self.get_serializer(services, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(services)
     
     def perform_create(self, serializer):
         serializer.save(provider=self.request.user)
 
-class ProjectListingViewSet(viewsets.ModelViewSet):
+class ProjectListingViewSet(CachedResponseMixin, ExportMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     queryset = ProjectListing.objects.all().order_by('-created_at')
     serializer_class = ProjectListingSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, ProximityFilter, filters.OrderingFilter]
     filterset_fields = ['furniture_type', 'status', 'budget']
-    search_fields = ['title', 'description', 'location', 'furniture_type']
     ordering_fields = ['budget', 'created_at']
+    query_budgets = {
+        'list': 1, 'retrieve': 1, 'my_projects': 1, 'assigned_to_me': 1, 'candidates': 4, 'export': 1,
+        'assign': 1, 'update_status': 2,
+    }
+    # Optimistic retries when another request changes the status in between
+    status_update_attempts = 3
+    throttle_policies = {
+        'create': ('user:30/hour',),
+        'assign': ('user:60/min',),
+        'candidates': ('user:30/min',),
+        'export': ('user:10/min',),
+    }
+    cache_dependencies = [ProjectListing, User]
     
     @action(detail=False, methods=['get'])
     def my_projects(self, request):
         projects = ProjectListing.objects.filter(creator=request.user).order_by('-created_at')
-        serializer = self.get_serializer(projects, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(projects)
     
     @action(detail=False, methods=['get'])
     def assigned_to_me(self, request):
         projects = ProjectListing.objects.filter(assigned_to=request.user).order_by('-created_at')
-        serializer = self.get_serializer(projects, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(projects)
+    
+    @action(detail=True, methods=['get'])
+    def candidates(self, request, pk=None):
+        project = get_object_or_404(
+            ProjectListing.objects.only('id', 'creator_id', 'budget', 'latitude', 'longitude'), pk=pk
+        )
+        
+        if project.creator_id != request.user.id:
+            return Response(
+                {"detail": "Only the project creator can view candidates."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+            
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response(
+                {"detail": "limit must be a number."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+            
+        ranked = assembler_features.top_candidates(project, limit=limit, exclude=[project.creator_id])
+        usernames = dict(User.objects.filter(id__in=[user_id for _, user_id, _, _ in ranked]).values_list('id', 'username'))
+        results = []
+        for score, user_id, distance, details in ranked:
+            results.append({
+                'user': user_id,
+                'username': usernames.get(user_id),
+                'score': round(score, 4),
+                'distance_km': round(distance, 1) if distance is not None else None,
+                **details,
+            })
+        return Response(results)
     
     @action(detail=True, methods=['patch'])
     def assign(self, request, pk=None):
-        project = self.get_object()
-        
-        if project.status != 'open':
+        try:
+            assigned_to_id = int(request.data.get('assigned_to') or 0) or None
+        except (TypeError, ValueError):
+            assigned_to_id = -1
+            
+        # The checks below are folded into the UPDATE; they only run to
+        # explain why it matched nothing
+        if assigned_to_id is not None:
+            project = ProjectListing.transition(
+                pk, 'open', 'in_progress', creator_id=request.user.id, assigned_to_id=assigned_to_id
+            )
+            if project is not None:
+                return Response(self.get_serializer(project).data)
+            
+        project_status, creator_id = get_object_or_404(
+            ProjectListing.objects.values_list('status', 'creator_id'), pk=pk
+        )
+        if project_status != 'open':
             return Response(
                 {"detail": "This project is not open for assignment."},
                 status=status.HTTP_400_BAD_REQUEST
             )
             
         # Only the project creator can assign someone
-        if project.creator != request.user:
+        if creator_id != request.user.id:
             return Response(
                 {"detail": "Only the project creator can assign assemblers."},
                 status=status.HTTP_403_FORBIDDEN
             )
             
-        assigned_to_id = request.data.get('assigned_to')
-        if not assigned_to_id:
+        if assigned_to_id is None:
             return Response(
                 {"detail": "You must provide an assembler's user ID."},
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        try:
-            assigned_to = User.objects.get(id=assigned_to_id)
-            # Check if this user is an assembler
-            if not hasattr(assigned_to, 'profile') or not assigned_to.profile.is_assembler:
-                return Response(
-                    {"detail": "This user is not registered as an assembler."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-                
-            project.assigned_to = assigned_to
-            project.status = 'in_progress'
-            project.save()
-            
-            serializer = self.get_serializer(project)
-            return Response(serializer.data)
-            
-        except User.DoesNotExist:
+        if not User.objects.filter(id=assigned_to_id).exists():
             return Response(
                 {"detail": "User not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
+        return Response(
+            {"detail": "This user is not registered as an assembler."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
-        project = self.get_object()
         new_status = request.data.get('status')
         
         # Validate the status value
@@ -158,65 +345,73 @@ class ProjectListingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        # Only the creator can update to 'completed' or 'cancelled'
-        if new_status in ['completed', 'cancelled'] and project.creator != request.user:
-            return Response(
-                {"detail": "Only the project creator can mark a project as completed or cancelled."},
-                status=status.HTTP_403_FORBIDDEN
+        for _ in range(self.status_update_attempts):
+            previous, creator_id = get_object_or_404(
+                ProjectListing.objects.values_list('status', 'creator_id'), pk=pk
             )
             
-        project.status = new_status
-        project.save()
-        
-        serializer = self.get_serializer(project)
-        return Response(serializer.data)
+            # Only the creator can update to 'completed' or 'cancelled'
+            if new_status in ['completed', 'cancelled'] and creator_id != request.user.id:
+                return Response(
+                    {"detail": "Only the project creator can mark a project as completed or cancelled."},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+                
+            # Applies only if the status is still the one just read
+            project = ProjectListing.transition(pk, previous, new_status)
+            if project is not None:
+                return Response(self.get_serializer(project).data)
+            
+        return Response(
+            {"detail": "The project was changed by another request, please retry."},
+            status=status.HTTP_409_CONFLICT
+        )
     
     def perform_create(self, serializer):
         serializer.save(creator=self.request.user)
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(PaginatedActionMixin, viewsets.ModelViewSet):
     queryset = Message.objects.all().order_by('-created_at')
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budgets = {'list': 2, 'conversations': 1, 'with_user': 5, 'unread_count': 1}
+    throttle_policies = {'create': ('user:60/min', 'ip:120/min')}
     
     def get_queryset(self):
         user = self.request.user
         return Message.objects.filter(Q(sender=user) | Q(receiver=user)).order_by('-created_at')
     
+    def get_serializer_class(self):
+        if self.action == 'conversations':
+            return ConversationSerializer
+        return super().get_serializer_class()
+    
     @action(detail=False, methods=['get'])
     def conversations(self, request):
         user = request.user
-        sent_messages = Message.objects.filter(sender=user).values_list('receiver', flat=True).distinct()
-        received_messages = Message.objects.filter(receiver=user).values_list('sender', flat=True).distinct()
+        conversations = Conversation.objects.filter(
+            Q(user_a=user) | Q(user_b=user)
+        ).order_by('-last_activity')
         
-        # Combined unique users that this user has conversations with
-        conversation_users_ids = set(list(sent_messages) + list(received_messages))
-        conversation_users = User.objects.filter(id__in=conversation_users_ids)
-        
-        result = []
-        for other_user in conversation_users:
-            # Get the latest message in this conversation
-            latest_message = Message.objects.filter(
-                (Q(sender=user) & Q(receiver=other_user)) | 
-                (Q(sender=other_user) & Q(receiver=user))
-            ).order_by('-created_at').first()
-            
-            # Count unread messages from this user
-            unread_count = Message.objects.filter(
-                sender=other_user, 
-                receiver=user, 
-                is_read=False
-            ).count()
-            
-            result.append({
-                'user': UserSerializer(other_user).data,
-                'latest_message': MessageSerializer(latest_message).data if latest_message else None,
-                'unread_count': unread_count
-            })
-            
-        return Response(result)
+        return self.paginated_response(conversations)
     
     @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        # Polled for the badge on every page: one primary-key read, and a
+        # 304 when the count has not changed
+        count = UnreadCounter.objects.filter(user_id=request.user.id).values_list('count', flat=True).first() or 0
+        etag = f'W/"unread-{count}"'
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if '*' in etags or etag in etags:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({'unread_count': count})
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Authorization'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    
+    @action(detail=False, methods=['get'], pagination_class=MessageThreadPagination)
     def with_user(self, request):
         user_id = request.query_params.get('user_id')
         if not user_id:
@@ -232,14 +427,21 @@ class MessageViewSet(viewsets.ModelViewSet):
                 (Q(sender=other_user) & Q(receiver=request.user))
             ).order_by('created_at')
             
-            # Mark messages as read
-            unread_messages = messages.filter(receiver=request.user, is_read=False)
-            for msg in unread_messages:
-                msg.is_read = True
-                msg.save()
+            def mark_read(page):
+                # Move the read pointer only when the page reaches the newest
+                # message: not for older history, nor for an ``after`` page
+                # cut short by ``limit``
+                if 'before' in request.query_params:
+                    return
+                if page:
+                    newest = page[-1]
+                    seen_id = newest['id'] if isinstance(newest, dict) else newest.id
+                else:
+                    seen_id = self.paginator.after
+                if seen_id is not None:
+                    Conversation.mark_read(request.user.id, other_user.id, seen_id=seen_id)
                 
-            serializer = self.get_serializer(messages, many=True)
-            return Response(serializer.data)
+            return self.paginated_response(messages, on_page=mark_read)
             
         except User.DoesNotExist:
             return Response(
@@ -250,12 +452,16 @@ class MessageViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(sender=self.request.user)
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(CachedResponseMixin, ExportMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all().order_by('-created_at')
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    query_budgets = {'list': 1, 'retrieve': 1, 'for_user': 2, 'export': 1}
+    throttle_policies = {'create': ('user:20/hour',), 'export': ('user:10/min',)}
+    cache_dependencies = [Review, User, ProjectListing]
     
     @action(detail=False, methods=['get'])
+    @cache_response
     def for_user(self, request):
         user_id = request.query_params.get('user_id')
         if not user_id:
@@ -267,8 +473,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
         try:
             user = User.objects.get(id=user_id)
             reviews = Review.objects.filter(reviewee=user).order_by('-created_at')
-            serializer = self.get_serializer(reviews, many=True)
-            return Response(serializer.data)
+            return self.paginated_response(reviews)
             
         except User.DoesNotExist:
             return Response(
@@ -288,7 +493,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
                 )
                 
             # Only project creator or the assigned assembler can leave reviews
-            if request.user != project.creator and request.user != project.assigned_to:
+            if request.user.id not in (project.creator_id, project.assigned_to_id):
                 return Response(
                     {"detail": "Only the project creator or the assigned assembler can leave reviews."},
                     status=status.HTTP_403_FORBIDDEN
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -103,11 +104,87 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Rest Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    # Same output as JSONRenderer, faster when orjson is installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'PAGE_SIZE': 20,
+    # Token buckets declared per action in each view's throttle_policies
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.BucketThrottle',
+    ],
+    # Proxies in front of Django that append to X-Forwarded-For (nginx in
+    # production). Client addresses for throttling are read from the hop
+    # they appended, so a spoofed header is ignored; use 0 without a proxy.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '1')),
+}
+
+# Where throttle buckets live (api.throttling). memory:// is per process, so
+# each gunicorn worker would allow the full rate; use file:///path on a
+# single host or redis://host:port/db across hosts.
+API_THROTTLE_STORE = os.environ.get('API_THROTTLE_STORE', 'memory://')
+
+# Cursor pagination
+API_MAX_PAGE_SIZE = 100
+# Requests without a cursor/page_size parameter get a bare list (capped at
+# API_MAX_PAGE_SIZE, with Link headers) until the frontend has migrated.
+API_PAGINATION_LEGACY_LIST = True
+
+# Response cache for public reads (api.cache). Local memory is per process;
+# set API_CACHE_BACKEND to a shared store such as
+# django.core.cache.backends.redis.RedisCache in production.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': os.environ.get('API_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('API_CACHE_LOCATION', 'api-responses'),
+        'TIMEOUT': 300,
+    },
+    # One key per model and per user: sized so that generations are not culled
+    'api-generations': {
+        'BACKEND': os.environ.get('API_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('API_GENERATION_CACHE_LOCATION', 'api-generations'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('API_GENERATION_CACHE_MAX_ENTRIES', '1000000'))},
+    },
+}
+API_RESPONSE_CACHE = 'api'
+API_GENERATION_CACHE = 'api-generations'
+
+# Fan-out for WebSocket push (api.realtime). The in-process broker only
+# reaches clients connected to the same process.
+REALTIME_BROKER = 'api.realtime.InProcessBroker'
+
+# Per-request instrumentation (api.middleware): Server-Timing headers and a
+# sampled JSON log of query, serializer and render times.
+PERFORMANCE_SERVER_TIMING = True
+PERFORMANCE_LOG_SAMPLE_RATE = float(os.environ.get('PERFORMANCE_LOG_SAMPLE_RATE', '0'))
+
+# Prometheus metrics at /api/metrics/ (api.metrics). Under gunicorn, point
+# METRICS_MULTIPROCESS_DIR at a directory shared by the workers and empty it
+# before each start so that the endpoint reports totals for all of them.
+METRICS_MULTIPROCESS_DIR = os.environ.get('METRICS_MULTIPROCESS_DIR') or None
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.performance': {'handlers': ['console'], 'level': 'INFO'},
+    },
 }
 
 # JWT Settings
@@ -124,8 +201,21 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_OBTAIN_SERIALIZER': 'api.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.ClaimsTokenRefreshSerializer',
 }
 
+# Seconds a user's active/staff flags are trusted before JWT authentication
+# (api.authentication) reads them again; a deactivated user can keep using
+# an access token for up to this long in other processes.
+AUTH_USER_CACHE_TTL = 30
+
+# Revoked refresh and access tokens (api.revocation). Each process keeps a
+# Bloom filter sized for this many live revocations, and reads rows revoked
+# elsewhere at most every TOKEN_REVOCATION_SYNC_INTERVAL seconds.
+TOKEN_REVOCATION_CAPACITY = 100_000
+TOKEN_REVOCATION_SYNC_INTERVAL = 5
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # In production, specify exact origins
 
@@ -59,6 +59,9 @@ const apiService = {
   },
   updateProfile: profileData => api.put('/profiles/update_me/', profileData),
 
+  // Profile, own projects and services, unread total and latest conversations in one request
+  getDashboard: () => api.get('/dashboard/'),
+
   // Services
   getServices: params => api.get('/services/', { params }),
   getService: id => api.get(`/services/${id}/`),
@@ -75,12 +78,14 @@ const apiService = {
   deleteProject: id => api.delete(`/projects/${id}/`),
   getUserProjects: () => api.get('/projects/my_projects/'),
   getAssignedProjects: () => api.get('/projects/assigned_to_me/'),
+  getProjectCandidates: (id, params) => api.get(`/projects/${id}/candidates/`, { params }),
   assignProject: (id, userId) => api.patch(`/projects/${id}/assign/`, { assigned_to: userId }),
   updateProjectStatus: (id, status) => api.patch(`/projects/${id}/update_status/`, { status }),
 
   // Messages
   getConversations: () => api.get('/messages/conversations/'),
-  getMessages: userId => api.get('/messages/with_user/', { params: { user_id: userId } }),
+  getMessages: (userId, params) =>
+    api.get('/messages/with_user/', { params: { user_id: userId, ...params } }),
   sendMessage: messageData => api.post('/messages/', messageData),
 
   // Reviews
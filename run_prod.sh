@@ -11,6 +11,12 @@ python manage.py collectstatic --noinput
 echo "Running database migrations..."
 python manage.py migrate
 
-# Start Gunicorn server
+# Throttle buckets shared by the workers on this host
+export API_THROTTLE_STORE=${API_THROTTLE_STORE:-file:///tmp/assembleally-throttle}
+
+# Start Gunicorn with Uvicorn workers; the ASGI application also serves
+# WebSocket connections on /ws/ (api.realtime). With the in-process broker a
+# client only receives events written by the worker it is connected to.
 echo "Starting Gunicorn server..."
-gunicorn assembleally.wsgi:application --bind 0.0.0.0:8000 --workers 3 --timeout 120
\ No newline at end of file
+gunicorn assembleally.asgi:application --worker-class uvicorn_worker.UvicornWorker \
+    --bind 0.0.0.0:8000 --workers 3 --timeout 120
\ No newline at end of file